@@ -0,0 +1,111 @@
+"""
+STC Trading - Codificación compacta de respuestas con velas
+Negociación de contenido compartida por /api/data, /api/signals y /api/iq/candles:
+- json (por defecto): lista de dicts por vela, como siempre
+- columnar: ?format=columnar o Accept: application/vnd.stc.columnar+json
+  {"t": [unix], "o": [...], "h": [...], "l": [...], "c": [...], "v": [...], "live": bool}
+- msgpack: ?format=msgpack o Accept: application/msgpack (mismo esquema columnar, binario)
+"""
+import json
+from typing import Any, Dict, List, Optional
+
+from flask import Response, jsonify
+
+# Opcional: msgpack
+try:
+    import msgpack
+    _MSGPACK_AVAILABLE = True
+except Exception:
+    _MSGPACK_AVAILABLE = False
+
+COLUMNAR_MIMETYPE = 'application/vnd.stc.columnar+json'
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack')
+FORMATS = ('json', 'columnar', 'msgpack')
+
+# Claves de tiempo aceptadas (mt5_server usa unix_time; iq_client manda from)
+_TIME_KEYS = ('unix_time', 'from', 'time')
+
+
+def negotiate(req) -> str:
+    """Formato de respuesta: ?format= tiene prioridad sobre Accept; msgpack solo si está instalado"""
+    fmt = (req.args.get('format') or '').lower()
+    if fmt in FORMATS:
+        return fmt if fmt != 'msgpack' or _MSGPACK_AVAILABLE else 'columnar'
+    accept = req.headers.get('Accept', '')
+    if _MSGPACK_AVAILABLE and any(m in accept for m in MSGPACK_MIMETYPES):
+        return 'msgpack'
+    if COLUMNAR_MIMETYPE in accept:
+        return 'columnar'
+    return 'json'
+
+
+def candle_columns(candles: List[Dict]) -> Dict[str, Any]:
+    """Lista de velas (dicts) -> columnas paralelas; descarta timestamp ISO, *_ms, source, received_at"""
+    t, o, h, l, c, v = [], [], [], [], [], []
+    for bar in candles:
+        t.append(_bar_time(bar))
+        o.append(bar.get('open'))
+        h.append(bar.get('high', bar.get('max')))
+        l.append(bar.get('low', bar.get('min')))
+        c.append(bar.get('close'))
+        v.append(bar.get('volume', 0))
+    live = bool(candles) and candles[-1].get('closed', True) is False
+    return {"t": t, "o": o, "h": h, "l": l, "c": c, "v": v, "live": live}
+
+
+def merge_live(cols: Dict[str, Any], live: Optional[Dict]) -> Dict[str, Any]:
+    """Añade (o sustituye si coincide la hora) la vela viva al final de unas columnas"""
+    if not live:
+        return cols
+    ut = _bar_time(live)
+    row = (ut, live.get('open'), live.get('high'), live.get('low'), live.get('close'), live.get('volume', 0))
+    same = bool(cols['t']) and cols['t'][-1] == ut
+    for key, val in zip(('t', 'o', 'h', 'l', 'c', 'v'), row):
+        if same:
+            cols[key][-1] = val
+        else:
+            cols[key].append(val)
+    cols['live'] = not live.get('closed', False)
+    return cols
+
+
+def encode(payload: Any, fmt: str) -> bytes:
+    if fmt == 'msgpack' and _MSGPACK_AVAILABLE:
+        return msgpack.packb(payload, use_bin_type=True, default=str)
+    if fmt == 'columnar':
+        return json.dumps(payload, separators=(',', ':'), ensure_ascii=False, default=str).encode('utf-8')
+    return json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+
+
+def mimetype(fmt: str) -> str:
+    if fmt == 'msgpack' and _MSGPACK_AVAILABLE:
+        return MSGPACK_MIMETYPES[0]
+    if fmt == 'columnar':
+        return COLUMNAR_MIMETYPE
+    return 'application/json'
+
+
+def respond(payload: Any, fmt: str, status: int = 200) -> Response:
+    """Respuesta ya codificada en el formato negociado (Vary: Accept para cachés intermedias)"""
+    if fmt == 'json':
+        resp = jsonify(payload)
+        resp.status_code = status
+    else:
+        resp = Response(encode(payload, fmt), status=status, mimetype=mimetype(fmt))
+    resp.headers['Vary'] = 'Accept'
+    return resp
+
+
+def respond_candles(candles: List[Dict], fmt: str) -> Response:
+    """Ruta que devuelve una lista de velas: tal cual en json, columnas en columnar/msgpack"""
+    if fmt == 'json':
+        return respond(candles, fmt)
+    return respond(candle_columns(candles), fmt)
+
+
+def _bar_time(bar: Dict) -> Optional[int]:
+    for key in _TIME_KEYS:
+        val = bar.get(key)
+        if val is not None:
+            return int(val)
+    return None
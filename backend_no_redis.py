@@ -15,6 +15,7 @@ import threading
 from datetime import datetime, timedelta
 from collections import defaultdict, deque
 from flask import Flask, Blueprint, request, jsonify
+from response_compression import init_compression
 
 try:
     from flask_cors import CORS
@@ -86,6 +87,7 @@ class MemoryCache:
 cache = MemoryCache()
 
 app = Flask(__name__)
+init_compression(app)
 
 # Configurar CORS si está disponible
 if USE_CORS:
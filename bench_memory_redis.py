@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark de MemoryRedis: ops/s con 1, 4 y 16 clientes concurrentes, antes y después
+- antes: réplica del camino anterior (un lock global y print por SET/LPUSH/RPUSH/LPOP)
+- después: memory_redis_server.MemoryRedis (franjas de locks, sin print; auditoría opcional)
+Cada cliente repite SET + GET + RPUSH + LPOP sobre sus propias claves.
+
+El print del modo antes se mide de verdad: por defecto va a un fichero temporal (como el stdout
+redirigido del servidor); --legacy-print terminal lo manda a la consola y null a /dev/null
+(solo coste del formateo, no de la escritura).
+
+Cada medida es la mediana de --repeat pasadas. La columna "resultado" dice si el después es más
+rápido (mejora), más lento (regresión) o está dentro del ±5 % (igual). En proceso el GIL serializa
+los comandos: las franjas no dan paralelismo y con 16 hilos en pocas CPU el resultado puede ser
+una regresión; la ganancia esperable es quitar el print (sobre todo a una consola real).
+
+Uso:
+  python bench_memory_redis.py                    # en proceso (hilos)
+  python bench_memory_redis.py --resp             # por TCP/RESP con el cliente redis
+  python bench_memory_redis.py --audit stdout     # después, con auditoría asíncrona
+  python bench_memory_redis.py --legacy-print terminal
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict, deque
+
+import memory_redis_server
+
+
+class LegacyMemoryRedis:
+    """Camino caliente anterior: un único lock y un print síncrono por comando"""
+
+    def __init__(self):
+        self.data = {}
+        self.lists = defaultdict(deque)
+        self.lock = threading.Lock()
+
+    def set(self, key, value, **options):
+        with self.lock:
+            self.data[key] = str(value)
+            print(f"[MemoryRedis] SET {key} = {value}")
+
+    def get(self, key):
+        with self.lock:
+            return self.data.get(key)
+
+    def rpush(self, key, *values):
+        with self.lock:
+            for value in values:
+                self.lists[key].append(str(value))
+                print(f"[MemoryRedis] RPUSH {key} <- {value}")
+
+    def lpop(self, key):
+        with self.lock:
+            try:
+                value = self.lists[key].popleft()
+                print(f"[MemoryRedis] LPOP {key} -> {value}")
+                return value
+            except IndexError:
+                return None
+
+
+def _worker(db, cid, iterations, barrier):
+    barrier.wait()
+    for i in range(iterations):
+        key = f"bench:{cid}:{i % 100}"
+        db.set(key, i)
+        db.get(key)
+        db.rpush(f"bench:q:{cid}", i)
+        db.lpop(f"bench:q:{cid}")
+
+
+def run(make_client, clients, iterations):
+    """ops/s totales con `clients` hilos; make_client(cid) da el objeto de cada hilo"""
+    barrier = threading.Barrier(clients + 1)
+    threads = [threading.Thread(target=_worker, args=(make_client(c), c, iterations, barrier))
+               for c in range(clients)]
+    for t in threads:
+        t.start()
+    barrier.wait()
+    t0 = time.perf_counter()
+    for t in threads:
+        t.join()
+    return clients * iterations * 4 / (time.perf_counter() - t0)
+
+
+def _serve(db, port):
+    ready = threading.Event()
+
+    def main():
+        async def start():
+            loop = asyncio.get_running_loop()
+            server = await loop.create_server(lambda: memory_redis_server.RespConnection(db, loop), "127.0.0.1", port)
+            ready.set()
+            async with server:
+                await server.serve_forever()
+        asyncio.run(start())
+
+    threading.Thread(target=main, daemon=True).start()
+    ready.wait(5)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--clients", default="1,4,16")
+    ap.add_argument("--ops", type=int, default=20000, help="iteraciones por cliente (4 comandos cada una)")
+    ap.add_argument("--repeat", type=int, default=3, help="pasadas por medida (se muestra la mediana)")
+    ap.add_argument("--resp", action="store_true", help="medir por TCP/RESP (requiere el paquete redis)")
+    ap.add_argument("--port", type=int, default=6399)
+    ap.add_argument("--audit", default="", help="auditoría del modo después: stdout | ruta de fichero")
+    ap.add_argument("--legacy-print", choices=("file", "terminal", "null"), default="file",
+                    help="destino del print por comando del modo antes (por defecto un fichero temporal)")
+    args = ap.parse_args()
+    counts = [int(c) for c in args.clients.split(",") if c.strip()]
+
+    if args.legacy_print == "terminal":
+        quiet = contextlib.nullcontext()
+    elif args.legacy_print == "null":
+        quiet = contextlib.redirect_stdout(open(os.devnull, "w"))
+    else:
+        quiet = contextlib.redirect_stdout(tempfile.TemporaryFile("w"))
+
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        current = memory_redis_server.MemoryRedis(audit=args.audit or "")
+    print(f"MemoryRedis: {current.stripes} franjas, auditoría: {args.audit or 'no'}, "
+          f"{'RESP/TCP' if args.resp else 'en proceso'}, {args.ops} iteraciones x 4 comandos por cliente, "
+          f"print del modo antes: {args.legacy_print}")
+
+    if args.resp:
+        import redis
+        if args.ops > 5000:
+            args.ops = 5000
+        legacy_port, current_port = args.port, args.port + 1
+        _serve(LegacyMemoryRedis(), legacy_port)
+        _serve(current, current_port)
+
+        def client(port):
+            return lambda cid: redis.Redis(port=port, protocol=2)
+        makers = {"antes": client(legacy_port), "después": client(current_port)}
+    else:
+        legacy = LegacyMemoryRedis()
+        makers = {"antes": lambda cid: legacy, "después": lambda cid: current}
+
+    print(f"{'clientes':>9} {'antes ops/s':>14} {'después ops/s':>14} {'x':>6}  resultado")
+    for n in counts:
+        befores, afters = [], []
+        for _ in range(max(1, args.repeat)):
+            with quiet:
+                befores.append(run(makers["antes"], n, args.ops))
+            afters.append(run(makers["después"], n, args.ops))
+        before, after = statistics.median(befores), statistics.median(afters)
+        ratio = after / before
+        verdict = "mejora" if ratio > 1.05 else "regresión" if ratio < 0.95 else "igual"
+        print(f"{n:>9} {before:>14,.0f} {after:>14,.0f} {ratio:>6.2f}  {verdict}")
+    if current.audit:
+        current.audit.flush()
+        print(f"auditoría: {current.audit.dropped} entradas descartadas por búfer lleno", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
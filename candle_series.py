@@ -0,0 +1,296 @@
+"""
+STC Trading - Serie de velas en memoria
+Buffer columnar (numpy) ordenado por unix_time con capacidad acotada:
+- añadir una vela más nueva: O(1) amortizado
+- reemplazar una vela existente: O(log n) (búsqueda binaria sobre los tiempos)
+- al superar la capacidad se descartan las velas más antiguas
+- carga masiva (merge_columns): una sola fusión ordenada con máscaras vectorizadas
+- cada vela guarda el número de secuencia (clock) de su última escritura: changed_since(seq)
+  devuelve solo las velas modificadas desde un cursor
+Los dicts de cada vela solo se construyen al serializar (tail / iteración).
+"""
+import threading
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+INITIAL_SLOTS = 256
+
+# Tabla de fuentes: el código uint8 guardado por vela es el índice en SOURCES
+SOURCES: List[str] = ['']
+_SOURCE_CODES: Dict[str, int] = {'': 0}
+_SOURCES_LOCK = threading.Lock()
+
+
+def source_code(src: Optional[str]) -> int:
+    s = (src or '').lower()
+    code = _SOURCE_CODES.get(s)
+    if code is None:
+        with _SOURCES_LOCK:
+            code = _SOURCE_CODES.get(s)
+            if code is None:
+                if len(SOURCES) > 255:
+                    return 0
+                code = len(SOURCES)
+                SOURCES.append(s)
+                _SOURCE_CODES[s] = code
+    return code
+
+
+def source_codes(values: Sequence[Optional[str]]) -> np.ndarray:
+    """Códigos de fuente para un lote (pocas fuentes distintas: se resuelven una vez cada una)"""
+    seen: Dict[Optional[str], int] = {}
+    return np.array([seen[v] if v in seen else seen.setdefault(v, source_code(v)) for v in values], dtype=np.uint8)
+
+
+class CandleSeries:
+    PRICE_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, capacity: int, priority: Optional[Callable[[Optional[str]], int]] = None,
+                 clock: Optional[Callable[[], int]] = None):
+        self.capacity = capacity
+        self.priority = priority or (lambda src: 0)
+        self.clock = clock or (lambda: 0)
+        # Secuencia de la última modificación de la serie (0 = nunca)
+        self.seq = 0
+        self.symbol: Optional[str] = None
+        self.timeframe: Optional[str] = None
+        self.lock = threading.RLock()
+        # Ventana viva: posiciones [_start, _end) de los arrays
+        self._start = 0
+        self._end = 0
+        self._slots = 0
+        self._time = np.empty(0, dtype=np.int64)
+        self._prices = {col: np.empty(0, dtype=np.float64) for col in self.PRICE_COLUMNS}
+        self._source = np.empty(0, dtype=np.uint8)
+        self._closed = np.empty(0, dtype=np.uint8)
+        self._seq = np.empty(0, dtype=np.int64)
+        self._realloc(min(INITIAL_SLOTS, 2 * capacity))
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    def __iter__(self) -> Iterator[Dict]:
+        return iter(self.tail(len(self)))
+
+    def tail(self, n: int, columns: bool = False):
+        """Últimas n velas en orden ascendente, como dicts listos para JSON (o columnas t,o,h,l,c,v)"""
+        sel = slice(max(self._start, self._end - max(n, 0)), self._end)
+        return self._to_columns(sel) if columns else self._to_dicts(sel)
+
+    def changed_since(self, seq: int, limit: int, columns: bool = False):
+        """
+        Velas escritas después de la secuencia `seq`, en orden ascendente.
+        Devuelve None si son más de `limit` (al cliente le conviene recibir tail(limit)).
+        """
+        if self.seq <= seq:
+            return self._to_columns(slice(0, 0)) if columns else []
+        idx = np.flatnonzero(self._seq[self._start:self._end] > seq)
+        if len(idx) > limit:
+            return None
+        return self._to_columns(idx + self._start) if columns else self._to_dicts(idx + self._start)
+
+    def last(self) -> Optional[Dict]:
+        return self.tail(1)[0] if len(self) else None
+
+    def clear(self):
+        self._start = self._end = 0
+
+    def upsert(self, bar: Dict) -> bool:
+        """
+        Inserta o reemplaza la vela con el mismo unix_time.
+        Devuelve False si ya existe una vela de esa hora con fuente de mayor prioridad.
+        """
+        ut = int(bar['unix_time'])
+        if self.symbol is None:
+            self.symbol = bar.get('symbol')
+            self.timeframe = bar.get('timeframe')
+
+        if not len(self) or ut > self._time[self._end - 1]:
+            self._make_room()
+            self._write(self._end, ut, bar)
+            self._end += 1
+            self._evict()
+            return True
+
+        i = self._start + int(np.searchsorted(self._time[self._start:self._end], ut))
+        if self._time[i] == ut:
+            if self.priority(bar.get('source')) < self.priority(SOURCES[self._source[i]]):
+                return False
+            self._write(i, ut, bar)
+            return True
+
+        # Vela antigua que faltaba (backfill): desplaza la cola una posición
+        k = i - self._start
+        self._make_room()
+        i = self._start + k
+        for arr in self._arrays():
+            arr[i + 1:self._end + 1] = arr[i:self._end]
+        self._write(i, ut, bar)
+        self._end += 1
+        self._evict()
+        return True
+
+    def merge_columns(self, times: Any, prices: Dict[str, Any], sources: Any, closed: Any = None,
+                      symbol: Optional[str] = None, timeframe: Optional[str] = None,
+                      detailed: bool = False) -> Tuple[int, ...]:
+        """
+        Fusiona un lote columnar (times, prices[col], códigos de fuente, closed 0/1) en una sola pasada.
+        Aplica las mismas reglas que upsert: a igual unix_time gana la fuente de mayor prioridad
+        y, a igualdad, la más reciente; una vela idéntica a la guardada se omite (sin nuevo seq).
+        Devuelve (cargadas_o_reemplazadas, omitidas) o, con detailed=True,
+        (insertadas, reemplazadas, omitidas, unix_times escritos).
+        """
+        t = np.asarray(times, dtype=np.int64)
+        n_in = len(t)
+        if n_in == 0:
+            return (0, 0, 0, t) if detailed else (0, 0)
+        seq = self.clock()
+        if self.symbol is None:
+            self.symbol, self.timeframe = symbol, timeframe
+        src = np.broadcast_to(np.asarray(sources, dtype=np.uint8), (n_in,))
+        cl = np.ones(n_in, dtype=np.uint8) if closed is None else np.broadcast_to(np.asarray(closed, dtype=np.uint8), (n_in,))
+        px = {col: np.broadcast_to(np.asarray(prices.get(col, 0.0), dtype=np.float64), (n_in,)) for col in self.PRICE_COLUMNS}
+        prio = np.array([self.priority(name) for name in SOURCES], dtype=np.int64)
+        pr = prio[src]
+
+        # 1) Dentro del lote: una vela por unix_time (mayor prioridad; a igualdad, la última)
+        order = np.lexsort((np.arange(n_in), pr, t))
+        keep = np.ones(n_in, dtype=bool)
+        keep[:-1] = t[order][1:] != t[order][:-1]
+        idx = order[keep]
+        t, src, cl, pr = t[idx], src[idx], cl[idx], pr[idx]
+        px = {col: arr[idx] for col, arr in px.items()}
+
+        # 2) Contra la ventana actual: reemplazo solo si la prioridad no es menor
+        s, e = self._start, self._end
+        old_t = self._time[s:e]
+        if len(old_t):
+            pos = np.searchsorted(old_t, t)
+            pos_c = np.minimum(pos, len(old_t) - 1)
+            exists = old_t[pos_c] == t
+            at = s + pos_c
+            win = ~exists | (pr >= prio[self._source[at]])
+            # Reenvío sin cambios (misma fuente, estado y OHLCV): no cuenta como reemplazo
+            same = exists & (self._source[at] == src) & (self._closed[at] == cl)
+            for col in self.PRICE_COLUMNS:
+                same &= self._prices[col][at] == px[col]
+            win &= ~same
+        else:
+            pos_c = np.zeros(len(t), dtype=np.int64)
+            exists = np.zeros(len(t), dtype=bool)
+            win = np.ones(len(t), dtype=bool)
+        loaded = int(win.sum())
+        if loaded:
+            self.seq = seq
+
+        rep = exists & win
+        if rep.any():
+            at = s + pos_c[rep]
+            self._source[at] = src[rep]
+            self._closed[at] = cl[rep]
+            self._seq[at] = seq
+            for col in self.PRICE_COLUMNS:
+                self._prices[col][at] = px[col][rep]
+
+        ins = ~exists
+        if ins.any():
+            cols = {
+                'time': np.concatenate([old_t, t[ins]]),
+                'source': np.concatenate([self._source[s:e], src[ins]]),
+                'closed': np.concatenate([self._closed[s:e], cl[ins]]),
+                'seq': np.concatenate([self._seq[s:e], np.full(int(ins.sum()), seq, dtype=np.int64)]),
+            }
+            for col in self.PRICE_COLUMNS:
+                cols[col] = np.concatenate([self._prices[col][s:e], px[col][ins]])
+            order = np.argsort(cols['time'], kind='stable')[-self.capacity:]
+            n = len(order)
+            self._slots = max(INITIAL_SLOTS, min(2 * n, 2 * self.capacity + 1))
+            self._time = _placed(cols['time'][order], self._slots)
+            self._source = _placed(cols['source'][order], self._slots)
+            self._closed = _placed(cols['closed'][order], self._slots)
+            self._seq = _placed(cols['seq'][order], self._slots)
+            self._prices = {col: _placed(cols[col][order], self._slots) for col in self.PRICE_COLUMNS}
+            self._start, self._end = 0, n
+
+        if detailed:
+            return (int(ins.sum()), int(rep.sum()), n_in - loaded, t[win])
+        return (loaded, n_in - loaded)
+
+    def _write(self, i: int, ut: int, bar: Dict):
+        self._time[i] = ut
+        for col in self.PRICE_COLUMNS:
+            self._prices[col][i] = bar.get(col) or 0.0
+        self._source[i] = source_code(bar.get('source'))
+        self._closed[i] = 1 if bar.get('closed', True) else 0
+        self.seq = self._seq[i] = self.clock()
+
+    def _arrays(self):
+        return [self._time, self._source, self._closed, self._seq] + [self._prices[col] for col in self.PRICE_COLUMNS]
+
+    def _make_room(self):
+        """Garantiza un hueco al final: compacta al inicio o duplica el tamaño (hasta 2*capacity)"""
+        if self._end < self._slots:
+            return
+        n = len(self)
+        if self._start > 0 and n <= self._slots // 2:
+            for arr in self._arrays():
+                arr[:n] = arr[self._start:self._end]
+            self._start, self._end = 0, n
+        else:
+            self._realloc(max(INITIAL_SLOTS, min(2 * self._slots, 2 * self.capacity + 1)))
+
+    def _realloc(self, slots: int):
+        n = len(self)
+        s, e = self._start, self._end
+        self._time = _resized(self._time, s, e, slots)
+        self._prices = {col: _resized(arr, s, e, slots) for col, arr in self._prices.items()}
+        self._source = _resized(self._source, s, e, slots)
+        self._closed = _resized(self._closed, s, e, slots)
+        self._seq = _resized(self._seq, s, e, slots)
+        self._start, self._end, self._slots = 0, n, slots
+
+    def _evict(self):
+        if len(self) > self.capacity:
+            self._start = self._end - self.capacity
+
+    def _to_columns(self, sel) -> Dict[str, Any]:
+        """Formato columnar (api_encoding): sin timestamps ISO ni campos repetidos por vela"""
+        return {
+            "t": self._time[sel].tolist(),
+            "o": self._prices['open'][sel].tolist(), "h": self._prices['high'][sel].tolist(),
+            "l": self._prices['low'][sel].tolist(), "c": self._prices['close'][sel].tolist(),
+            "v": self._prices['volume'][sel].tolist(),
+            "live": False,
+        }
+
+    def _to_dicts(self, sel) -> List[Dict]:
+        """sel: slice o array de posiciones"""
+        times = self._time[sel].tolist()
+        cols = [self._prices[col][sel].tolist() for col in self.PRICE_COLUMNS]
+        sources = self._source[sel].tolist()
+        closed = self._closed[sel].tolist()
+        out = []
+        for k, ut in enumerate(times):
+            out.append({
+                "symbol": self.symbol,
+                "timeframe": self.timeframe,
+                "open": cols[0][k], "high": cols[1][k], "low": cols[2][k], "close": cols[3][k], "volume": cols[4][k],
+                "timestamp": datetime.fromtimestamp(ut, tz=timezone.utc).isoformat(),
+                "unix_time": ut, "unix_time_ms": ut * 1000,
+                "closed": bool(closed[k]), "source": SOURCES[sources[k]],
+            })
+        return out
+
+
+def _resized(arr, start: int, end: int, slots: int):
+    out = np.empty(slots, dtype=arr.dtype)
+    out[:end - start] = arr[start:end]
+    return out
+
+
+def _placed(values, slots: int):
+    out = np.empty(slots, dtype=values.dtype)
+    out[:len(values)] = values
+    return out
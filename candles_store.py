@@ -1,37 +1,116 @@
 """
 STC Trading - Candles Storage System
 Almacena y recupera velas históricas en CSV
+o en formato binario columnar (mmap + numpy)
 """
 import os
+import io
 import csv
 import json
-from datetime import datetime
-from typing import List, Dict, Any
-import pandas as pd
+import time
+import zlib
+import struct
+import atexit
+import threading
+from collections import OrderedDict
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional
+
+# Opcional: numpy (backend binario columnar)
+try:
+    import numpy as np
+    _NP_AVAILABLE = True
+except Exception:
+    _NP_AVAILABLE = False
+
+# Lock entre procesos (servidor vs. job de compactación): fcntl en POSIX, msvcrt en Windows
+try:
+    import fcntl
+    _FCNTL_AVAILABLE = True
+except Exception:
+    import msvcrt
+    _FCNTL_AVAILABLE = False
+
+# Opcional: zstandard (códec del almacenamiento frío; por defecto zlib)
+try:
+    import zstandard as zstd
+    _ZSTD_AVAILABLE = True
+except Exception:
+    _ZSTD_AVAILABLE = False
+
+CSV_FIELDNAMES = ['timestamp', 'datetime', 'open', 'high', 'low', 'close', 'volume', 'symbol', 'timeframe']
+
+# Lectura desde el final del archivo: tamaño de bloque y tope de filas
+# que se leen si la cola del CSV no está en orden temporal
+TAIL_BLOCK_SIZE = int(os.getenv('CANDLES_TAIL_BLOCK_SIZE', str(64 * 1024)))
+TAIL_FALLBACK_ROWS = int(os.getenv('CANDLES_TAIL_FALLBACK_ROWS', '20000'))
+
+# Backend de get_store() / store_batch / read_last / read_range: csv (CandlesStore) o binary
+# (BinaryCandlesStore: columnas en {csv_dir}/bin leídas por mmap; requiere numpy)
+CANDLES_BACKEND = os.getenv('CANDLES_BACKEND', 'csv').lower()
+
+# Formato binario: un archivo por columna, little-endian de ancho fijo
+BINARY_COLUMNS = [('timestamp', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'), ('volume', '<f8')]
+
+# Filas recientes por CSV que se indexan en memoria para deduplicar store_batch
+RECENT_INDEX_ROWS = int(os.getenv('CANDLES_RECENT_INDEX_ROWS', '2000'))
+
+# Escritura diferida: handles de append abiertos (LRU) y flush por tiempo o por tamaño
+MAX_OPEN_FILES = int(os.getenv('CANDLES_MAX_OPEN_FILES', '64'))
+FLUSH_INTERVAL = float(os.getenv('CANDLES_FLUSH_INTERVAL', '1.0'))
+FLUSH_BYTES = int(os.getenv('CANDLES_FLUSH_BYTES', str(64 * 1024)))
+
+# Particionado opcional por día o por mes: {symbol}_{timeframe}/{YYYY-MM-DD}.csv + manifest.json
+CANDLES_PARTITION = os.getenv('CANDLES_PARTITION', '').lower() or None
+PARTITION_FORMATS = {'day': '%Y-%m-%d', 'month': '%Y-%m'}
+MANIFEST_FILE = 'manifest.json'
+LOCK_FILE = '.candles.lock'
+
+# Almacenamiento frío: particiones cerradas y antiguas comprimidas por bloques ({clave}.cbk)
+COLD_AFTER_DAYS = int(os.getenv('CANDLES_COLD_AFTER_DAYS', '30'))
+COLD_BLOCK_ROWS = int(os.getenv('CANDLES_COLD_BLOCK_ROWS', '4096'))
+COLD_CODEC = os.getenv('CANDLES_COLD_CODEC', 'zlib').lower()
+COLD_SUFFIX = '.cbk'
+COLD_MAGIC = b'STCCBK1\n'
 
 class CandlesStore:
-    def __init__(self, csv_dir: str = "data"):
+    def __init__(self, csv_dir: str = "data", partition: Optional[str] = CANDLES_PARTITION):
+        if partition is not None and partition not in PARTITION_FORMATS:
+            raise ValueError(f"partition inválida: {partition} (day|month)")
         self.csv_dir = csv_dir
+        self.partition = partition
+        self._manifests = {}           # directorio de serie -> manifest en memoria
+        self._manifest_stamps = {}     # directorio de serie -> (mtime_ns, tamaño) del manifest leído/escrito
+        self._dirty_manifests = set()
+        self._cold_indexes = {}        # ruta .cbk -> índice de bloques
+        self._tail_index = {}
+        self._handles = OrderedDict()  # filename -> handle 'ab' (orden LRU)
+        self._pending = {}             # filename -> [bytes] aún sin escribir
+        self._pending_bytes = 0
+        self._flusher = None
+        self._lock = threading.RLock()
         os.makedirs(csv_dir, exist_ok=True)
+        # Modo particionado: escrituras, lecturas y compactación (también desde otro proceso) bajo este lock
+        self._file_lock = _FileLock(os.path.join(csv_dir, LOCK_FILE))
         
     def get_csv_filename(self, symbol: str, timeframe: str) -> str:
         """Genera nombre de archivo CSV para símbolo y timeframe"""
         return os.path.join(self.csv_dir, f"{symbol}_{timeframe}.csv")
+
+    def get_series_dir(self, symbol: str, timeframe: str) -> str:
+        """Directorio de particiones de la serie (modo particionado)"""
+        return os.path.join(self.csv_dir, f"{symbol}_{timeframe}")
     
     def store_batch(self, symbol: str, timeframe: str, candles: List[Dict]) -> Dict[str, Any]:
-        """Almacena lote de velas en CSV"""
-        if not candles:
-            return {"inserted": 0, "size": 0}
-            
-        filename = self.get_csv_filename(symbol, timeframe)
-        
-        # Preparar datos para CSV
-        rows = []
-        for candle in candles:
+        """Almacena lote de velas en CSV: solo añade velas nuevas y reemplaza las recientes que cambiaron"""
+        rows = {}
+        for candle in candles or []:
             if isinstance(candle, dict):
-                row = {
-                    'timestamp': candle.get('time', 0),
-                    'datetime': datetime.fromtimestamp(candle.get('time', 0)).isoformat(),
+                ts = int(float(candle.get('time', 0) or 0))
+                rows[ts] = {
+                    'timestamp': ts,
+                    'datetime': _iso_from_timestamp(ts),
                     'open': candle.get('open', 0),
                     'high': candle.get('high', 0),
                     'low': candle.get('low', 0),
@@ -40,55 +119,952 @@ class CandlesStore:
                     'symbol': symbol,
                     'timeframe': timeframe
                 }
-                rows.append(row)
-        
-        # Escribir al CSV
-        file_exists = os.path.exists(filename)
-        with open(filename, 'a', newline='', encoding='utf-8') as csvfile:
-            fieldnames = ['timestamp', 'datetime', 'open', 'high', 'low', 'close', 'volume', 'symbol', 'timeframe']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            
-            if not file_exists:
-                writer.writeheader()
+        if not rows:
+            return {"inserted": 0, "replaced": 0, "skipped": 0, "size": 0, "csv_written": False}
             
-            writer.writerows(rows)
+        with self._lock:
+            if not self.partition:
+                return self._store_rows(self.get_csv_filename(symbol, timeframe), rows)
+
+            with self._file_lock:
+                series_dir = self.get_series_dir(symbol, timeframe)
+                os.makedirs(series_dir, exist_ok=True)
+                manifest = self._get_manifest(series_dir)
+                groups = {}
+                for ts, row in rows.items():
+                    groups.setdefault(_partition_key(ts, self.partition), {})[ts] = row
+                result = {"inserted": 0, "replaced": 0, "skipped": 0, "size": len(rows), "csv_written": False}
+                written = []
+                for key, group in sorted(groups.items()):
+                    meta = manifest['partitions'].get(key)
+                    if meta is not None and meta['file'].endswith(COLD_SUFFIX):
+                        info = self._store_cold(series_dir, meta, group)
+                    else:
+                        meta = manifest['partitions'].setdefault(key, {"file": f"{key}.csv", "min_ts": min(group), "max_ts": max(group), "rows": 0})
+                        filename = os.path.join(series_dir, meta['file'])
+                        info = self._store_rows(filename, group)
+                        meta['min_ts'] = min(meta['min_ts'], min(group))
+                        meta['max_ts'] = max(meta['max_ts'], max(group))
+                        meta['rows'] += info['inserted']
+                        written.append(filename)
+                    for k in ("inserted", "replaced", "skipped"):
+                        result[k] += info[k]
+                    result["csv_written"] = result["csv_written"] or info["csv_written"]
+                # Sin escritura diferida: al soltar el lock no quedan filas pendientes de un CSV que
+                # otro proceso pueda compactar
+                for filename in written:
+                    self._flush_file(filename)
+                if result["csv_written"]:
+                    self._dirty_manifests.add(series_dir)
+                    self._write_manifests()
+                return result
+
+    def _store_rows(self, filename: str, rows: Dict[int, Dict]) -> Dict[str, Any]:
+        """Deduplica contra el índice de cola de filename y escribe solo lo nuevo o modificado"""
+        index = self._get_tail_index(filename)
+        last_line = {ts: line for _, ts, line in index.entries}
+        low = min(last_line, default=None)
         
-        return {"inserted": len(rows), "size": len(rows)}
-    
-    def read_last(self, symbol: str, timeframe: str, limit: int = 200) -> List[Dict]:
-        """Lee las últimas N velas del CSV"""
-        filename = self.get_csv_filename(symbol, timeframe)
+        appended = []
+        changed = {}   # ya en la ventana con otro contenido
+        missing = {}   # hueco dentro de la ventana indexada
+        older = False
+        skipped = 0
+        for ts in sorted(rows):
+            line = _render_row(rows[ts])
+            if index.hwm is None or ts > index.hwm:
+                appended.append((ts, line))
+            elif ts in last_line:
+                if last_line[ts] != line:
+                    changed[ts] = line
+                else:
+                    skipped += 1  # idéntica
+            elif index.complete or ts >= low:
+                missing[ts] = line
+            else:
+                older = True
         
+        if older:
+            # Filas anteriores a la ventana indexada: se reescribe el archivo completo
+            return self._rewrite_file(filename, rows)
+        
+        if changed or missing:
+            self._flush_file(filename)
+            if os.path.getsize(filename) != index.size:
+                # Escritura ajena desde la validación: no se trunca con offsets obsoletos
+                self._tail_index.pop(filename, None)
+                return self._store_rows(filename, rows)
+            # La cola se reescribe en orden desde la primera fila afectada
+            gap = min(missing, default=index.hwm)
+            first = min((i for i, (_, ts, _) in enumerate(index.entries) if ts in changed or ts > gap),
+                        default=len(index.entries))
+            tail = {ts: line for _, ts, line in index.entries[first:]}
+            tail.update(changed)
+            tail.update(missing)
+            tail.update(appended)
+            self._write_tail(filename, index, first, sorted(tail.items()))
+        elif appended:
+            self._write_tail(filename, index, len(index.entries), appended)
+        
+        return {
+            "inserted": len(appended) + len(missing),
+            "replaced": len(changed),
+            "skipped": skipped,
+            "size": len(rows),
+            "csv_written": bool(appended or changed or missing)
+        }
+
+    def _rewrite_file(self, filename: str, rows: Dict[int, Dict]) -> Dict[str, Any]:
+        """Fusiona rows con todo el CSV y lo reescribe ordenado (relleno de huecos antiguos)"""
+        self._release(filename)
+        lines = {}
+        with open(filename, 'rb') as f:
+            header = next(csv.reader([f.readline().decode('utf-8-sig')]), [])
+            col = header.index('timestamp') if 'timestamp' in header else 0
+            for line in f:
+                try:
+                    lines[int(float(next(csv.reader([line.decode('utf-8')]))[col]))] = line
+                except (IndexError, ValueError, StopIteration):
+                    continue
+        inserted = replaced = skipped = 0
+        for ts, row in rows.items():
+            line = _render_row(row)
+            old = lines.get(ts)
+            if old is None:
+                inserted += 1
+            elif old == line:
+                skipped += 1
+                continue
+            else:
+                replaced += 1
+            lines[ts] = line
+        if inserted or replaced:
+            tmp = filename + '.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(_render_row({k: k for k in CSV_FIELDNAMES}))
+                f.writelines(lines[ts] for ts in sorted(lines))
+            os.replace(tmp, filename)
+        return {"inserted": inserted, "replaced": replaced, "skipped": skipped,
+                "size": len(rows), "csv_written": bool(inserted or replaced)}
+
+    def _get_manifest(self, series_dir: str) -> Dict[str, Any]:
+        """
+        Manifest {partitions: {clave: {file, min_ts, max_ts, rows}}}; se reconstruye si falta y se
+        relee si otro proceso lo reescribió (compactación), soltando los handles que quedaron obsoletos
+        """
+        path = os.path.join(series_dir, MANIFEST_FILE)
+        stamp = _file_stamp(path)
+        cached = self._manifests.get(series_dir)
+        if cached is not None and stamp is not None and stamp == self._manifest_stamps.get(series_dir):
+            return cached
+        manifest = None
+        if stamp is not None:
+            try:
+                with open(path, encoding='utf-8') as f:
+                    manifest = json.load(f)
+            except Exception as e:
+                print(f"Manifest ilegible {path}, se reconstruye: {e}")
+        if manifest is None:
+            manifest = self._scan_partitions(series_dir)
+        if cached is not None:
+            for key, meta in cached['partitions'].items():
+                if manifest['partitions'].get(key) != meta:
+                    old_path = os.path.join(series_dir, meta['file'])
+                    self._release(old_path)
+                    self._cold_indexes.pop(old_path, None)
+        self._manifests[series_dir] = manifest
+        self._manifest_stamps[series_dir] = stamp
+        if series_dir in self._dirty_manifests:
+            self._write_manifests()
+        return manifest
+
+    def _scan_partitions(self, series_dir: str) -> Dict[str, Any]:
+        manifest = {"partition": self.partition, "partitions": {}}
+        if not os.path.isdir(series_dir):
+            return manifest
+        # Los .cbk primero: si quedó el CSV de una compactación interrumpida, prevalece el CSV
+        names = sorted(os.listdir(series_dir), key=lambda n: (not n.endswith(COLD_SUFFIX), n))
+        for name in names:
+            key, ext = os.path.splitext(name)
+            if ext == COLD_SUFFIX:
+                blocks = self._cold_index(os.path.join(series_dir, name))['blocks']
+                if blocks:
+                    manifest['partitions'][key] = {"file": name, "min_ts": min(b['min_ts'] for b in blocks),
+                                                   "max_ts": max(b['max_ts'] for b in blocks), "rows": sum(b['rows'] for b in blocks)}
+                continue
+            if ext != '.csv':
+                continue
+            with open(os.path.join(series_dir, name), newline='', encoding='utf-8') as f:
+                times = [c['time'] for c in (_row_to_candle(rec) for rec in csv.DictReader(f)) if c is not None]
+            if times:
+                manifest['partitions'][key] = {"file": name, "min_ts": min(times), "max_ts": max(times), "rows": len(times)}
+        self._dirty_manifests.add(series_dir)
+        return manifest
+
+    def _write_manifests(self):
+        for series_dir in list(self._dirty_manifests):
+            os.makedirs(series_dir, exist_ok=True)
+            path = os.path.join(series_dir, MANIFEST_FILE)
+            tmp = path + '.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self._manifests[series_dir], f, indent=1, sort_keys=True)
+            os.replace(tmp, path)
+            self._manifest_stamps[series_dir] = _file_stamp(path)
+            self._dirty_manifests.discard(series_dir)
+
+    def _series_files(self, symbol: str, timeframe: str, start: Optional[int] = None, end: Optional[int] = None) -> List[str]:
+        """Archivos de la serie en orden cronológico, limitados a las particiones que solapan [start, end]"""
+        if not self.partition:
+            return [self.get_csv_filename(symbol, timeframe)]
+        series_dir = self.get_series_dir(symbol, timeframe)
+        files = []
+        for key, meta in sorted(self._get_manifest(series_dir)['partitions'].items()):
+            if start is not None and meta['max_ts'] < start:
+                continue
+            if end is not None and meta['min_ts'] > end:
+                continue
+            files.append(os.path.join(series_dir, meta['file']))
+        return files
+
+    def migrate_to_partitions(self, symbol: str, timeframe: str) -> Dict[str, Any]:
+        """Reparte el CSV único {symbol}_{timeframe}.csv en particiones"""
+        if not self.partition:
+            raise ValueError("El store no está particionado")
+        filename = self.get_csv_filename(symbol, timeframe)
         if not os.path.exists(filename):
+            return {"inserted": 0, "replaced": 0, "skipped": 0, "size": 0, "csv_written": False}
+        with open(filename, newline='', encoding='utf-8') as f:
+            candles = [c for c in (_row_to_candle(rec) for rec in csv.DictReader(f)) if c is not None]
+        return self.store_batch(symbol, timeframe, candles)
+
+    def compact(self, symbol: str, timeframe: str, older_than_days: int = COLD_AFTER_DAYS,
+                codec: str = COLD_CODEC) -> Dict[str, Any]:
+        """Reescribe las particiones cerradas con más de N días en formato comprimido por bloques"""
+        if not self.partition:
+            raise ValueError("La compactación requiere un store particionado")
+        if codec == 'zstd' and not _ZSTD_AVAILABLE:
+            raise RuntimeError("zstandard no instalado: pip install zstandard")
+        cutoff = time.time() - older_than_days * 86400
+        current = _partition_key(int(time.time()), self.partition)
+        result = {"compacted": [], "bytes_before": 0, "bytes_after": 0}
+        series_dir = self.get_series_dir(symbol, timeframe)
+        with self._lock:
+            with self._file_lock:
+                keys = sorted(self._get_manifest(series_dir)['partitions'])
+            for key in keys:
+                # Lock por partición: el servidor sigue escribiendo y leyendo entre una y otra
+                with self._file_lock:
+                    manifest = self._get_manifest(series_dir)
+                    meta = manifest['partitions'].get(key)
+                    if (meta is None or meta['file'].endswith(COLD_SUFFIX) or key >= current
+                            or _ts_seconds(meta['max_ts']) >= cutoff):
+                        continue
+                    csv_path = os.path.join(series_dir, meta['file'])
+                    self._release(csv_path)
+                    if not os.path.exists(csv_path):
+                        continue
+                    with open(csv_path, newline='', encoding='utf-8') as f:
+                        by_time = {c['time']: c for c in (_row_to_candle(rec) for rec in csv.DictReader(f)) if c is not None}
+                    candles = [by_time[ts] for ts in sorted(by_time)]
+                    if not candles:
+                        continue
+                    cold_path = os.path.join(series_dir, f"{key}{COLD_SUFFIX}")
+                    _write_cold_file(cold_path, candles, codec)
+                    self._cold_indexes.pop(cold_path, None)
+                    result["bytes_before"] += os.path.getsize(csv_path)
+                    result["bytes_after"] += os.path.getsize(cold_path)
+                    meta.update({"file": os.path.basename(cold_path), "rows": len(candles),
+                                 "min_ts": candles[0]['time'], "max_ts": candles[-1]['time']})
+                    # El manifest apunta al .cbk antes de borrar el CSV
+                    self._dirty_manifests.add(series_dir)
+                    self._write_manifests()
+                    os.remove(csv_path)
+                    result["compacted"].append(key)
+        return result
+
+    def compact_all(self, older_than_days: int = COLD_AFTER_DAYS, codec: str = COLD_CODEC) -> Dict[str, Any]:
+        """Compacta todas las series particionadas de csv_dir"""
+        results = {}
+        for name in sorted(os.listdir(self.csv_dir)):
+            if not os.path.isdir(os.path.join(self.csv_dir, name)) or '_' not in name:
+                continue
+            symbol, timeframe = name.rsplit('_', 1)
+            results[name] = self.compact(symbol, timeframe, older_than_days, codec)
+        return results
+
+    def _store_cold(self, series_dir: str, meta: Dict[str, Any], rows: Dict[int, Dict]) -> Dict[str, Any]:
+        """Escribe en una partición comprimida: fusiona las filas y la vuelve a congelar"""
+        cold_path = os.path.join(series_dir, meta['file'])
+        index = self._cold_index(cold_path)
+        by_time = {c['time']: c for c in _read_cold_blocks(cold_path, index, index['blocks'])}
+        inserted = replaced = skipped = 0
+        for ts, row in rows.items():
+            candle = _row_to_candle(row)
+            old = by_time.get(ts)
+            if candle is None or old == candle:
+                skipped += 1
+                continue
+            if old is None:
+                inserted += 1
+            else:
+                replaced += 1
+            by_time[ts] = candle
+        if inserted or replaced:
+            candles = [by_time[ts] for ts in sorted(by_time)]
+            _write_cold_file(cold_path, candles, index['codec'])
+            self._cold_indexes.pop(cold_path, None)
+            meta.update({"rows": len(candles), "min_ts": candles[0]['time'], "max_ts": candles[-1]['time']})
+        return {"inserted": inserted, "replaced": replaced, "skipped": skipped,
+                "size": len(rows), "csv_written": bool(inserted or replaced)}
+
+    def _series_lock(self):
+        return self._file_lock if self.partition else nullcontext()
+
+    def _release(self, filename: str):
+        """Vacía y cierra el handle de filename y descarta su índice de cola"""
+        if filename in self._handles:
+            self._flush_file(filename)
+            self._handles.pop(filename).close()
+        self._tail_index.pop(filename, None)
+
+    def _cold_index(self, path: str) -> Dict[str, Any]:
+        index = self._cold_indexes.get(path)
+        if index is None:
+            index = self._cold_indexes[path] = _read_cold_index(path)
+        return index
+
+    def _get_tail_index(self, filename: str) -> "_TailIndex":
+        """
+        Índice de las últimas filas del CSV, validado contra el tamaño real en cada llamada:
+        iq_client y la API escriben en los mismos data/*.csv desde procesos distintos.
+        """
+        index = self._tail_index.get(filename)
+        size = os.path.getsize(filename) if os.path.exists(filename) else 0
+        if index is not None and index.size - self._pending_size(filename) == size:
+            return index
+        if self._pending.get(filename):
+            # Otro proceso escribió: lo pendiente se añade detrás de sus filas y se reindexa
+            self._flush_file(filename)
+            size = os.path.getsize(filename)
+        index = self._tail_index[filename] = _TailIndex.load(filename, size)
+        return index
+
+    def _pending_size(self, filename: str) -> int:
+        return sum(len(c) for c in self._pending.get(filename, ()))
+
+    def _write_tail(self, filename: str, index: "_TailIndex", first: int, lines: List[tuple]):
+        """Trunca el CSV en la fila indexada `first` y encola `lines` a continuación"""
+        cut = index.entries[first][0] if first < len(index.entries) else index.size
+        chunks = []
+        if cut < index.size or cut == 0:
+            # Reemplazo en sitio: lo pendiente se escribe antes de truncar
+            self._flush_file(filename)
+            self._handle(filename).truncate(cut)
+        if cut == 0:
+            header = _render_row({k: k for k in CSV_FIELDNAMES})
+            chunks.append(header)
+            cut = len(header)
+        entries = index.entries[:first]
+        offset = cut
+        for ts, line in lines:
+            chunks.append(line)
+            entries.append((offset, ts, line))
+            offset += len(line)
+        index.entries = entries[-RECENT_INDEX_ROWS:]
+        index.complete = index.complete and len(entries) <= RECENT_INDEX_ROWS
+        index.size = offset
+        index.hwm = max([ts for ts, _ in lines] + ([index.hwm] if index.hwm is not None else []))
+
+        self._handle(filename)
+        self._pending.setdefault(filename, []).extend(chunks)
+        self._pending_bytes += sum(len(c) for c in chunks)
+        if self._pending_bytes >= FLUSH_BYTES or FLUSH_INTERVAL <= 0:
+            self.flush()
+        else:
+            self._start_flusher()
+
+    def _handle(self, filename: str):
+        """Handle de append abierto para filename; cierra el menos usado si se supera MAX_OPEN_FILES"""
+        f = self._handles.get(filename)
+        if f is not None:
+            self._handles.move_to_end(filename)
+            return f
+        f = open(filename, 'ab')
+        self._handles[filename] = f
+        while len(self._handles) > MAX_OPEN_FILES:
+            oldest = next(iter(self._handles))
+            self._flush_file(oldest)
+            self._handles.pop(oldest).close()
+        return f
+
+    def _flush_file(self, filename: str):
+        chunks = self._pending.pop(filename, None)
+        if not chunks:
+            return
+        self._pending_bytes -= sum(len(c) for c in chunks)
+        f = self._handles[filename]
+        if _replaced(f, filename):
+            # Archivo sustituido por otro proceso (reescritura completa): se reabre y se reindexa
+            self._handles.pop(filename).close()
+            self._tail_index.pop(filename, None)
+            f = self._handle(filename)
+            if f.tell() == 0 and not chunks[0].startswith(b'timestamp,'):
+                chunks.insert(0, _render_row({k: k for k in CSV_FIELDNAMES}))
+        f.write(b''.join(chunks))
+        f.flush()
+
+    def flush(self):
+        """Escribe a disco todas las filas pendientes y los manifests modificados"""
+        with self._lock:
+            for filename in list(self._pending):
+                self._flush_file(filename)
+            self._write_manifests()
+
+    def close(self):
+        """Vacía lo pendiente y cierra los handles abiertos"""
+        with self._lock:
+            self.flush()
+            for f in self._handles.values():
+                f.close()
+            self._handles.clear()
+            self._file_lock.close()
+
+    def _start_flusher(self):
+        if self._flusher is not None:
+            return
+
+        def flusher():
+            while True:
+                time.sleep(FLUSH_INTERVAL)
+                try:
+                    self.flush()
+                except Exception as e:
+                    print(f"Error vaciando CSV pendientes en {self.csv_dir}: {e}")
+
+        self._flusher = threading.Thread(target=flusher, name="candles-store-flush", daemon=True)
+        self._flusher.start()
+    
+    def read_last(self, symbol: str, timeframe: str, limit: int = 200) -> List[Dict]:
+        """Lee las últimas N velas del CSV sin parsear el archivo completo"""
+        if limit <= 0:
             return []
         
-        try:
-            df = pd.read_csv(filename)
-            df = df.sort_values('timestamp').tail(limit)
-            
+        with self._lock, self._series_lock():
             candles = []
-            for _, row in df.iterrows():
-                candle = {
-                    'time': int(row['timestamp']),
-                    'open': float(row['open']),
-                    'high': float(row['high']),
-                    'low': float(row['low']),
-                    'close': float(row['close']),
-                    'volume': float(row.get('volume', 0))
-                }
-                candles.append(candle)
-            
+            # De la partición más reciente hacia atrás hasta completar limit
+            for filename in reversed(self._series_files(symbol, timeframe)):
+                self._flush_file(filename)
+                if not os.path.exists(filename):
+                    continue
+                try:
+                    candles = self._read_last_file(filename, limit - len(candles)) + candles
+                except Exception as e:
+                    print(f"Error leyendo CSV {filename}: {e}")
+                    return []
+                if len(candles) >= limit:
+                    break
+            return candles[-limit:]
+
+    def read_range(self, symbol: str, timeframe: str, start: int, end: int) -> List[Dict]:
+        """Velas con start <= time <= end; en modo particionado solo abre las particiones que solapan"""
+        with self._lock, self._series_lock():
+            candles = []
+            for filename in self._series_files(symbol, timeframe, start, end):
+                self._flush_file(filename)
+                if not os.path.exists(filename):
+                    continue
+                try:
+                    candles.extend(self._read_range_file(filename, start, end))
+                except Exception as e:
+                    print(f"Error leyendo CSV {filename}: {e}")
+                    return []
+            candles.sort(key=lambda c: c['time'])
             return candles
-        except Exception as e:
-            print(f"Error leyendo CSV {filename}: {e}")
+
+    def _read_range_file(self, filename: str, start: int, end: int) -> List[Dict]:
+        if filename.endswith(COLD_SUFFIX):
+            # Solo se descomprimen los bloques cuyo rango de tiempo solapa [start, end]
+            index = self._cold_index(filename)
+            blocks = [b for b in index['blocks'] if b['max_ts'] >= start and b['min_ts'] <= end]
+            return [c for c in _read_cold_blocks(filename, index, blocks) if start <= c['time'] <= end]
+        with open(filename, newline='', encoding='utf-8') as f:
+            return [c for c in (_row_to_candle(rec) for rec in csv.DictReader(f))
+                    if c is not None and start <= c['time'] <= end]
+
+    def _read_last_file(self, filename: str, limit: int) -> List[Dict]:
+        if filename.endswith(COLD_SUFFIX):
+            index = self._cold_index(filename)
+            blocks = []
+            rows = 0
+            for b in reversed(index['blocks']):
+                blocks.insert(0, b)
+                rows += b['rows']
+                if rows >= limit:
+                    break
+            return _read_cold_blocks(filename, index, blocks)[-limit:]
+        candles = self._read_tail(filename, limit)
+        if not _is_sorted(candles):
+            # Cola desordenada: se amplía la ventana hasta un máximo acotado y se ordena
+            candles = self._read_tail(filename, max(limit, TAIL_FALLBACK_ROWS))
+            candles.sort(key=lambda c: c['time'])
+        return candles[-limit:]
+
+    def _read_tail(self, filename: str, n: int) -> List[Dict]:
+        """Decodifica las últimas n filas leyendo bloques desde el final del archivo"""
+        with open(filename, 'rb') as f:
+            header = next(csv.reader([f.readline().decode('utf-8-sig')]), None)
+            data_start = f.tell()
+            if not header:
+                return []
+            lines = _tail_lines(f, n, data_start)
+        
+        candles = []
+        for rec in csv.DictReader(io.StringIO(b''.join(lines).decode('utf-8')), fieldnames=header):
+            candle = _row_to_candle(rec)
+            if candle is not None:
+                candles.append(candle)
+        return candles
+
+class _FileLock:
+    """Lock exclusivo entre procesos sobre un archivo (fcntl / msvcrt); reentrante dentro del proceso"""
+    def __init__(self, path: str):
+        self.path = path
+        self._f = None
+        self._depth = 0
+        self._guard = threading.RLock()
+
+    def __enter__(self):
+        self._guard.acquire()
+        try:
+            if self._depth == 0:
+                if self._f is None:
+                    self._f = open(self.path, 'a+b')
+                _lock_file(self._f)
+            self._depth += 1
+        except BaseException:
+            self._guard.release()
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0:
+            _unlock_file(self._f)
+        self._guard.release()
+
+    def close(self):
+        with self._guard:
+            if self._depth == 0 and self._f is not None:
+                self._f.close()
+                self._f = None
+
+def _lock_file(f):
+    if _FCNTL_AVAILABLE:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        return
+    f.seek(0)
+    while True:
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            continue  # LK_LOCK se rinde tras 10 s; la compactación de una partición puede tardar más
+
+def _unlock_file(f):
+    if _FCNTL_AVAILABLE:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+class BinaryCandlesStore:
+    """
+    Almacena velas como arrays columnares binarios ({symbol}_{timeframe}/{columna}.bin)
+    y las lee vía mmap como vistas NumPy, sin parsear texto (CANDLES_BACKEND=binary en get_store).
+    Las vistas de columns()/slice_* son válidas hasta la siguiente escritura de la serie;
+    read_last/read_range devuelven copias.
+    Escrituras y lecturas bajo el mismo lock que CandlesStore ({bin_dir}/.candles.lock): varios
+    escritores, también de otros procesos, no dejan columnas de distinta longitud.
+    """
+    def __init__(self, bin_dir: str = os.path.join("data", "bin"), csv_dir: Optional[str] = None):
+        if not _NP_AVAILABLE:
+            raise RuntimeError("numpy no instalado: pip install numpy")
+        self.bin_dir = bin_dir
+        self.csv_dir = csv_dir          # CSV de CandlesStore que se importa la primera vez que se toca una serie
+        self._imported = set()
+        self._lock = threading.RLock()
+        os.makedirs(bin_dir, exist_ok=True)
+        self._file_lock = _FileLock(os.path.join(bin_dir, LOCK_FILE))
+
+    def get_series_dir(self, symbol: str, timeframe: str) -> str:
+        return os.path.join(self.bin_dir, f"{symbol}_{timeframe}")
+
+    def _column_path(self, symbol: str, timeframe: str, column: str) -> str:
+        return os.path.join(self.get_series_dir(symbol, timeframe), f"{column}.bin")
+
+    def count(self, symbol: str, timeframe: str) -> int:
+        """Número de velas completas (mínimo entre columnas por si una escritura quedó a medias)"""
+        sizes = []
+        for col, dtype in BINARY_COLUMNS:
+            path = self._column_path(symbol, timeframe, col)
+            if not os.path.exists(path):
+                return 0
+            sizes.append(os.path.getsize(path) // np.dtype(dtype).itemsize)
+        return min(sizes)
+
+    def columns(self, symbol: str, timeframe: str) -> Dict[str, Any]:
+        """Vistas mmap de solo lectura sobre cada columna"""
+        with self._lock, self._file_lock:
+            self._ensure_imported(symbol, timeframe)
+            return self._columns(symbol, timeframe)
+
+    def _columns(self, symbol: str, timeframe: str) -> Dict[str, Any]:
+        n = self.count(symbol, timeframe)
+        if n == 0:
+            return {col: np.empty(0, dtype=dtype) for col, dtype in BINARY_COLUMNS}
+        return {
+            col: np.memmap(self._column_path(symbol, timeframe, col), dtype=dtype, mode='r', shape=(n,))
+            for col, dtype in BINARY_COLUMNS
+        }
+
+    def slice_last(self, symbol: str, timeframe: str, limit: int = 200) -> Dict[str, Any]:
+        cols = self.columns(symbol, timeframe)
+        start = max(0, len(cols['timestamp']) - max(0, limit))
+        return {col: arr[start:] for col, arr in cols.items()}
+
+    def slice_range(self, symbol: str, timeframe: str, start: int, end: int) -> Dict[str, Any]:
+        """Velas con start <= timestamp <= end (búsqueda binaria sobre la columna de tiempo)"""
+        cols = self.columns(symbol, timeframe)
+        ts = cols['timestamp']
+        i = int(np.searchsorted(ts, start, side='left'))
+        j = int(np.searchsorted(ts, end, side='right'))
+        return {col: arr[i:j] for col, arr in cols.items()}
+
+    def read_last(self, symbol: str, timeframe: str, limit: int = 200) -> List[Dict]:
+        if limit <= 0:
             return []
+        # Se convierte con el lock tomado: ninguna escritura cambia las columnas a medio leer
+        with self._lock, self._file_lock:
+            return _columns_to_candles(self.slice_last(symbol, timeframe, limit))
+
+    def read_range(self, symbol: str, timeframe: str, start: int, end: int) -> List[Dict]:
+        with self._lock, self._file_lock:
+            return _columns_to_candles(self.slice_range(symbol, timeframe, start, end))
+
+    def store_batch(self, symbol: str, timeframe: str, candles: List[Dict]) -> Dict[str, Any]:
+        """Inserta velas manteniendo la serie ordenada y sin timestamps repetidos"""
+        rows = [c for c in candles or [] if isinstance(c, dict)]
+        if not rows:
+            return {"inserted": 0, "replaced": 0, "skipped": 0, "size": 0, "csv_written": False}
+        new = {
+            'timestamp': np.array([int(float(c.get('time', 0) or 0)) for c in rows], dtype='<i8'),
+            'open': np.array([float(c.get('open', 0) or 0) for c in rows], dtype='<f8'),
+            'high': np.array([float(c.get('high', 0) or 0) for c in rows], dtype='<f8'),
+            'low': np.array([float(c.get('low', 0) or 0) for c in rows], dtype='<f8'),
+            'close': np.array([float(c.get('close', 0) or 0) for c in rows], dtype='<f8'),
+            'volume': np.array([float(c.get('volume', 0) or 0) for c in rows], dtype='<f8'),
+        }
+        return self.store_columns(symbol, timeframe, new)
+
+    def store_columns(self, symbol: str, timeframe: str, new: Dict[str, Any]) -> Dict[str, Any]:
+        """Mismas claves de resultado que CandlesStore.store_batch (csv_written = hubo escritura)"""
+        new = _dedupe_sorted({col: np.asarray(new[col], dtype=dtype) for col, dtype in BINARY_COLUMNS})
+        size = len(new['timestamp'])
+        if not size:
+            return {"inserted": 0, "replaced": 0, "skipped": 0, "size": 0, "csv_written": False}
+        with self._lock, self._file_lock:
+            self._ensure_imported(symbol, timeframe)
+            os.makedirs(self.get_series_dir(symbol, timeframe), exist_ok=True)
+            cols = self._columns(symbol, timeframe)
+            # Solo se reescribe la cola a partir del primer timestamp que se solapa
+            cut = int(np.searchsorted(cols['timestamp'], new['timestamp'][0], side='left'))
+            old_tail = {col: np.array(arr[cut:]) for col, arr in cols.items()}
+            del cols
+
+            # Velas ya presentes: idénticas (skipped) o con otro contenido (replaced)
+            pos = np.searchsorted(old_tail['timestamp'], new['timestamp'])
+            found = pos < len(old_tail['timestamp'])
+            found[found] = old_tail['timestamp'][pos[found]] == new['timestamp'][found]
+            same = found.copy()
+            for col, _ in BINARY_COLUMNS[1:]:
+                same[found] &= old_tail[col][pos[found]] == new[col][found]
+            replaced = int(found.sum() - same.sum())
+            skipped = int(same.sum())
+            inserted = size - replaced - skipped
+            if not (inserted or replaced):
+                return {"inserted": 0, "replaced": 0, "skipped": skipped, "size": size, "csv_written": False}
+
+            merged = _dedupe_sorted({col: np.concatenate([old_tail[col], new[col]]) for col, _ in BINARY_COLUMNS})
+            for col, dtype in BINARY_COLUMNS:
+                # La fusión nunca es más corta que la cola anterior: el archivo no encoge y las vistas
+                # mmap ya abiertas siguen siendo válidas (truncate solo recorta restos de una escritura
+                # interrumpida)
+                path = self._column_path(symbol, timeframe, col)
+                with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+                    f.seek(cut * np.dtype(dtype).itemsize)
+                    f.write(merged[col].tobytes())
+                    f.truncate()
+        return {"inserted": inserted, "replaced": replaced, "skipped": skipped, "size": size, "csv_written": True}
+
+    def _ensure_imported(self, symbol: str, timeframe: str):
+        # Requiere los locks: la primera vez que se toca una serie vacía se importa su CSV
+        key = (symbol, timeframe)
+        if self.csv_dir is None or key in self._imported:
+            return
+        self._imported.add(key)
+        if self.count(symbol, timeframe) == 0:
+            self.import_csv(CandlesStore(self.csv_dir, partition=None), symbol, timeframe)
+
+    def import_csv(self, csv_store: "CandlesStore", symbol: str, timeframe: str) -> Dict[str, Any]:
+        """Convierte el CSV existente de csv_store al formato binario"""
+        filename = csv_store.get_csv_filename(symbol, timeframe)
+        if not os.path.exists(filename):
+            return {"inserted": 0, "replaced": 0, "skipped": 0, "size": 0, "csv_written": False}
+        with open(filename, newline='', encoding='utf-8') as f:
+            candles = [c for c in (_row_to_candle(rec) for rec in csv.DictReader(f)) if c is not None]
+        return self.store_batch(symbol, timeframe, candles)
+
+    def export_csv(self, symbol: str, timeframe: str, path: Optional[str] = None) -> str:
+        """Exporta la serie al mismo formato CSV que CandlesStore"""
+        if path is None:
+            path = self.get_series_dir(symbol, timeframe) + ".csv"
+        with self._lock, self._file_lock:
+            cols = self.columns(symbol, timeframe)
+            with open(path, 'w', newline='', encoding='utf-8') as csvfile:
+                writer = csv.writer(csvfile)
+                writer.writerow(CSV_FIELDNAMES)
+                for ts, o, h, l, c, v in zip(cols['timestamp'].tolist(), cols['open'].tolist(), cols['high'].tolist(),
+                                             cols['low'].tolist(), cols['close'].tolist(), cols['volume'].tolist()):
+                    writer.writerow([ts, _iso_from_timestamp(ts), o, h, l, c, v, symbol, timeframe])
+        return path
+
+    def flush(self):
+        pass  # sin escritura diferida: store_columns escribe antes de volver
+
+    def close(self):
+        self._file_lock.close()
+
+def _dedupe_sorted(cols: Dict[str, Any]) -> Dict[str, Any]:
+    """Ordena por timestamp y conserva la última aparición de cada uno"""
+    ts = cols['timestamp']
+    order = np.argsort(ts, kind='stable')
+    ts_sorted = ts[order]
+    keep = np.ones(len(ts_sorted), dtype=bool)
+    keep[:-1] = ts_sorted[1:] != ts_sorted[:-1]
+    idx = order[keep]
+    return {col: arr[idx] for col, arr in cols.items()}
+
+def _columns_to_candles(cols: Dict[str, Any]) -> List[Dict]:
+    return [
+        {'time': ts, 'open': o, 'high': h, 'low': l, 'close': c, 'volume': v}
+        for ts, o, h, l, c, v in zip(cols['timestamp'].tolist(), cols['open'].tolist(), cols['high'].tolist(),
+                                     cols['low'].tolist(), cols['close'].tolist(), cols['volume'].tolist())
+    ]
+
+class _TailIndex:
+    """Marca de agua (timestamp máximo) y offsets de las últimas filas de un CSV"""
+    def __init__(self, size: int, entries: List[tuple], complete: bool = True):
+        self.size = size
+        self.entries = entries  # (offset, timestamp, línea) en orden de archivo
+        self.complete = complete  # True si entries cubre todas las filas del archivo
+        self.hwm = max((ts for _, ts, _ in entries), default=None)
+
+    @classmethod
+    def load(cls, filename: str, size: int) -> "_TailIndex":
+        if size == 0:
+            return cls(0, [])
+        with open(filename, 'rb') as f:
+            header = next(csv.reader([f.readline().decode('utf-8-sig')]), [])
+            data_start = f.tell()
+            lines = _tail_lines(f, RECENT_INDEX_ROWS, data_start, with_offsets=True)
+        col = header.index('timestamp') if 'timestamp' in header else 0
+        entries = []
+        for offset, line in lines:
+            try:
+                ts = int(float(next(csv.reader([line.decode('utf-8')]))[col]))
+            except (IndexError, ValueError, StopIteration):
+                continue
+            entries.append((offset, ts, line))
+        return cls(size, entries, complete=not lines or lines[0][0] == data_start)
+
+def _tail_lines(f, n: int, data_start: int, with_offsets: bool = False) -> List:
+    """Devuelve las últimas n líneas no vacías entre data_start y el final del archivo"""
+    end = f.seek(0, os.SEEK_END)
+    pos = end
+    buf = b''
+    while pos > data_start:
+        step = min(TAIL_BLOCK_SIZE, pos - data_start)
+        pos -= step
+        f.seek(pos)
+        buf = f.read(step) + buf
+        # n+1 saltos garantizan n líneas completas aunque la primera esté cortada
+        if buf.count(b'\n') > n:
+            break
+    lines = []
+    offset = pos
+    for ln in buf.splitlines(keepends=True):
+        if ln.strip():
+            lines.append((offset, ln))
+        offset += len(ln)
+    if pos > data_start and lines and lines[0][0] == pos:
+        lines = lines[1:]  # primera línea posiblemente incompleta
+    lines = lines[-n:]
+    return lines if with_offsets else [ln for _, ln in lines]
+
+def _file_stamp(path: str) -> Optional[tuple]:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def _replaced(f, path: str) -> bool:
+    """True si path ya no es el archivo abierto en f (borrado o sustituido con os.replace)"""
+    try:
+        return os.fstat(f.fileno()).st_ino != os.stat(path).st_ino
+    except FileNotFoundError:
+        return True
+
+def _render_row(row: Dict[str, Any]) -> bytes:
+    out = io.StringIO()
+    csv.DictWriter(out, fieldnames=CSV_FIELDNAMES).writerow(row)
+    return out.getvalue().encode('utf-8')
+
+def _ts_seconds(ts: int) -> float:
+    # Los clientes IQ envían 'time' en milisegundos
+    return ts / 1000 if ts > 10**11 else ts
+
+def _iso_from_timestamp(ts: int) -> str:
+    return datetime.fromtimestamp(_ts_seconds(ts)).isoformat()
+
+def _partition_key(ts: int, partition: str) -> str:
+    return datetime.fromtimestamp(_ts_seconds(ts), tz=timezone.utc).strftime(PARTITION_FORMATS[partition])
+
+def _row_to_candle(rec: Dict[str, Any]) -> Optional[Dict]:
+    try:
+        return {
+            'time': int(float(rec['timestamp'])),
+            'open': float(rec['open']),
+            'high': float(rec['high']),
+            'low': float(rec['low']),
+            'close': float(rec['close']),
+            'volume': float(rec.get('volume') or 0)
+        }
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def _is_sorted(candles: List[Dict]) -> bool:
+    return all(a['time'] <= b['time'] for a, b in zip(candles, candles[1:]))
+
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == 'zstd':
+        return zstd.ZstdCompressor(level=10).compress(data)
+    return zlib.compress(data, 6)
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == 'zstd':
+        return zstd.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+def _write_cold_file(path: str, candles: List[Dict], codec: str):
+    """
+    Formato .cbk: MAGIC | bloques comprimidos | índice JSON | len(índice) <Q | MAGIC
+    Cada bloque guarda columnas little-endian: deltas de timestamp (<q) y open/high/low/close/volume (<d).
+    """
+    blocks = []
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(COLD_MAGIC)
+        for i in range(0, len(candles), COLD_BLOCK_ROWS):
+            chunk = candles[i:i + COLD_BLOCK_ROWS]
+            n = len(chunk)
+            times = [c['time'] for c in chunk]
+            deltas = [times[0]] + [b - a for a, b in zip(times, times[1:])]
+            payload = struct.pack(f'<{n}q', *deltas) + b''.join(
+                struct.pack(f'<{n}d', *[float(c[col]) for c in chunk]) for col in ('open', 'high', 'low', 'close', 'volume'))
+            data = _compress(payload, codec)
+            blocks.append({"offset": f.tell(), "length": len(data), "rows": n, "min_ts": times[0], "max_ts": times[-1]})
+            f.write(data)
+        footer = json.dumps({"codec": codec, "blocks": blocks}).encode('utf-8')
+        f.write(footer)
+        f.write(struct.pack('<Q', len(footer)))
+        f.write(COLD_MAGIC)
+    os.replace(tmp, path)
+
+def _read_cold_index(path: str) -> Dict[str, Any]:
+    with open(path, 'rb') as f:
+        f.seek(-(8 + len(COLD_MAGIC)), os.SEEK_END)
+        tail = f.read()
+        if tail[8:] != COLD_MAGIC:
+            raise ValueError(f"Archivo frío corrupto: {path}")
+        (footer_len,) = struct.unpack('<Q', tail[:8])
+        f.seek(-(8 + len(COLD_MAGIC) + footer_len), os.SEEK_END)
+        return json.loads(f.read(footer_len).decode('utf-8'))
+
+def _read_cold_blocks(path: str, index: Dict[str, Any], blocks: List[Dict]) -> List[Dict]:
+    candles = []
+    with open(path, 'rb') as f:
+        for b in blocks:
+            f.seek(b['offset'])
+            payload = _decompress(f.read(b['length']), index['codec'])
+            n = b['rows']
+            deltas = struct.unpack_from(f'<{n}q', payload, 0)
+            cols = [struct.unpack_from(f'<{n}d', payload, 8 * n * (k + 1)) for k in range(5)]
+            ts = 0
+            for i in range(n):
+                ts += deltas[i]
+                candles.append({'time': ts, 'open': cols[0][i], 'high': cols[1][i], 'low': cols[2][i],
+                                'close': cols[3][i], 'volume': cols[4][i]})
+    return candles
+
+_STORES = {}
+_STORES_LOCK = threading.Lock()
+
+def get_store(csv_dir: str = "data", backend: str = CANDLES_BACKEND):
+    """
+    Instancia compartida por directorio y backend (thread-safe): CandlesStore (csv) o
+    BinaryCandlesStore en {csv_dir}/bin (binary), que importa el CSV de cada serie al tocarla
+    """
+    with _STORES_LOCK:
+        store = _STORES.get((backend, csv_dir))
+        if store is None:
+            if backend == 'binary':
+                store = BinaryCandlesStore(os.path.join(csv_dir, 'bin'), csv_dir=csv_dir)
+            elif backend == 'csv':
+                store = CandlesStore(csv_dir)
+            else:
+                raise ValueError(f"CANDLES_BACKEND inválido: {backend} (csv|binary)")
+            _STORES[(backend, csv_dir)] = store
+        return store
+
+@atexit.register
+def _close_stores():
+    with _STORES_LOCK:
+        for store in _STORES.values():
+            try:
+                store.close()
+            except Exception:
+                pass
 
 def store_batch(symbol: str, timeframe: str, candles: List[Dict]) -> Dict[str, Any]:
     """Función de conveniencia para almacenar velas"""
-    store = CandlesStore()
-    return store.store_batch(symbol, timeframe, candles)
+    return get_store().store_batch(symbol, timeframe, candles)
 
 def read_last(symbol: str, timeframe: str, limit: int = 200) -> List[Dict]:
     """Función de conveniencia para leer velas"""
-    store = CandlesStore()
-    return store.read_last(symbol, timeframe, limit)
\ No newline at end of file
+    return get_store().read_last(symbol, timeframe, limit)
+
+def read_range(symbol: str, timeframe: str, start: int, end: int) -> List[Dict]:
+    """Función de conveniencia para leer un rango de velas"""
+    return get_store().read_range(symbol, timeframe, start, end)
+
+if __name__ == "__main__":
+    # Job de compactación: python candles_store.py [dias] [csv_dir]
+    # Se coordina con el servidor mediante {csv_dir}/.candles.lock (una partición cada vez)
+    import sys
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else COLD_AFTER_DAYS
+    csv_dir = sys.argv[2] if len(sys.argv) > 2 else "data"
+    store = CandlesStore(csv_dir, partition=CANDLES_PARTITION or 'day')
+    for series, info in store.compact_all(days).items():
+        print(f"[COMPACT] {series}: {len(info['compacted'])} particiones, {info['bytes_before']} -> {info['bytes_after']} bytes")
+    store.close()
@@ -15,12 +15,14 @@ import threading
 from datetime import datetime, timezone, timedelta
 from collections import defaultdict, deque
 from flask import Flask, request, jsonify, render_template, redirect, url_for, send_file
+from response_compression import init_compression
 
 # Configuración de logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger("stc-dashboard")
 
 app = Flask(__name__)
+init_compression(app)
 app.config['TEMPLATES_AUTO_RELOAD'] = True
 app.jinja_env.auto_reload = True
 
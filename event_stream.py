@@ -0,0 +1,129 @@
+"""
+STC Trading - Difusión de eventos en vivo (Server-Sent Events)
+- EventBroker.publish(): un evento (tick, live, candle, history, signal) se reparte a los suscriptores interesados
+- cada suscriptor tiene una cola acotada propia: ticks y velas vivas se fusionan por símbolo
+  (solo interesa el último), el resto se descarta por antigüedad si el cliente no da abasto
+- coste por evento: O(suscriptores), independiente del tamaño del snapshot
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from itertools import count
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+# Eventos que se fusionan por (evento, fuente, símbolo): solo se entrega el más reciente
+COALESCE_EVENTS = ('tick', 'live')
+STREAM_QUEUE_SIZE = 500
+HEARTBEAT_SECONDS = 15.0
+
+
+class Subscriber:
+    def __init__(self, symbols: Optional[Set[str]] = None, sources: Optional[Set[str]] = None,
+                 events: Optional[Set[str]] = None, maxlen: int = STREAM_QUEUE_SIZE):
+        self.symbols = symbols
+        self.sources = sources
+        self.events = events
+        self.maxlen = maxlen
+        self.dropped = 0
+        self._queue: "OrderedDict[Any, Tuple[int, str, Dict]]" = OrderedDict()
+        self._cond = threading.Condition()
+        self._ids = count()
+        self.closed = False
+
+    def wants(self, event: str, source: Optional[str], symbol: Optional[str]) -> bool:
+        if self.events is not None and event not in self.events:
+            return False
+        if self.sources is not None and source is not None and source not in self.sources:
+            return False
+        if self.symbols is not None and symbol is not None and symbol not in self.symbols:
+            return False
+        return True
+
+    def put(self, seq: int, event: str, data: Dict, source: Optional[str], symbol: Optional[str]):
+        key = (event, source, symbol) if event in COALESCE_EVENTS else next(self._ids)
+        with self._cond:
+            # Fusionado: conserva el puesto en la cola pero con el dato más nuevo
+            self._queue[key] = (seq, event, data)
+            while len(self._queue) > self.maxlen:
+                self._queue.popitem(last=False)
+                self.dropped += 1
+            self._cond.notify()
+
+    def drain(self, timeout: float) -> Tuple[List[Tuple[int, str, Dict]], int]:
+        """Espera hasta `timeout` y devuelve (eventos pendientes, descartados desde el último drain)"""
+        with self._cond:
+            if not self._queue and not self.closed:
+                self._cond.wait(timeout)
+            items = list(self._queue.values())
+            self._queue.clear()
+            dropped, self.dropped = self.dropped, 0
+            return items, dropped
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class EventBroker:
+    def __init__(self):
+        self._subs: List[Subscriber] = []
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def subscribe(self, **kwargs) -> Subscriber:
+        sub = Subscriber(**kwargs)
+        with self._lock:
+            self._subs = self._subs + [sub]
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        sub.close()
+        with self._lock:
+            self._subs = [s for s in self._subs if s is not sub]
+
+    def publish(self, event: str, data: Dict, source: Optional[str] = None,
+                symbol: Optional[str] = None, seq: int = 0):
+        # Lista inmutable (copy-on-write): publicar no toma el lock del broker
+        subs = self._subs
+        if not subs:
+            return
+        self.published += 1
+        for sub in subs:
+            if sub.wants(event, source, symbol):
+                sub.put(seq, event, data, source, symbol)
+
+    def __len__(self) -> int:
+        return len(self._subs)
+
+    def sse(self, sub: Subscriber, hello: Optional[Dict] = None,
+            heartbeat: float = HEARTBEAT_SECONDS) -> Iterator[str]:
+        """Generador de texto SSE para un suscriptor; se desuscribe al cerrarse la conexión"""
+        try:
+            yield f"event: hello\ndata: {json.dumps(dict(hello or {}, server_time=time.time()))}\n\n"
+            while not sub.closed:
+                items, dropped = sub.drain(heartbeat)
+                if dropped:
+                    # El cliente perdió eventos: que resincronice con /api/data?since=
+                    yield f"event: dropped\ndata: {json.dumps({'dropped': dropped})}\n\n"
+                if not items:
+                    if not dropped:
+                        yield ": ping\n\n"
+                    continue
+                yield ''.join(_format(seq, event, data) for seq, event, data in items)
+        finally:
+            self.unsubscribe(sub)
+
+
+def parse_filter(value: Optional[str], normalize=lambda v: v) -> Optional[Set[str]]:
+    """'a,b,c' -> {'a','b','c'}; vacío -> None (sin filtro)"""
+    if not value:
+        return None
+    out = {normalize(v.strip()) for v in value.split(',') if v.strip()}
+    return out or None
+
+
+def _format(seq: int, event: str, data: Dict) -> str:
+    head = f"id: {seq}\n" if seq else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
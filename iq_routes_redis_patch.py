@@ -7,7 +7,10 @@ iq_routes_redis_patch.py - IQ API (puerto 5002)
 """
 
 from flask import request, jsonify
-from candles_store import store_batch, read_last
+from candles_store import store_batch, read_last, read_range
+from api_encoding import negotiate, respond_candles
+from response_compression import init_compression
+from memory_redis_server import MemoryRedis as BaseMemoryRedis
 
 import os, json, time, uuid, random
 from flask import Flask, Blueprint, request, jsonify
@@ -61,59 +64,18 @@ def get_candles_v2():
     arr = read_last(symbol, tf, limit=limit)
     # Para distinguir que estás en la ruta nueva, puedes añadir meta si quieres:
     # return jsonify({"source":"v2","data":arr})
-    return jsonify(arr)
+    return respond_candles(arr, negotiate(request))
 
 # Cache en memoria que simula Redis
-class MemoryRedis:
+class MemoryRedis(BaseMemoryRedis):
+    """MemoryRedis de memory_redis_server (TTL, listas, BLPOP/BRPOP, pub/sub) + datos propios de la API IQ"""
     def __init__(self):
-        self.data = {}
-        self.lists = defaultdict(deque)
-        self.lock = threading.Lock()
+        super().__init__()
         self.candles_data = {}
         self.symbols_data = []
         self.balance_data = {"balance": 10000.0, "currency": "USD"}
         print("[MemoryRedis] Inicializado - Cache en memoria")
 
-
-    def setex(self, key, time, value):
-        """Simula SETEX de Redis: guarda con expiración en segundos"""
-        self.set(key, value)
-        print(f"[MemoryRedis] SETEX {key} = {value} (TTL: {time}s)")
-
-
-    def setex(self, key, time, value):
-        """Simula SETEX de Redis: guarda con expiración en segundos"""
-        self.set(key, value)
-        print(f"[MemoryRedis] SETEX {key} = {value} (TTL: {time}s)")
-
-    
-    def get(self, key):
-        with self.lock:
-            return self.data.get(key)
-    
-    def set(self, key, value):
-        with self.lock:
-            self.data[key] = value
-    
-    def lpush(self, key, value):
-        with self.lock:
-            self.lists[key].appendleft(value)
-    
-    def rpush(self, key, value):
-        with self.lock:
-            self.lists[key].append(value)
-    
-    def lpop(self, key):
-        with self.lock:
-            try:
-                return self.lists[key].popleft()
-            except IndexError:
-                return None
-    
-    def llen(self, key):
-        with self.lock:
-            return len(self.lists[key])
-
 try:
     # CORS es opcional pero recomendado cuando el dashboard está en 5001
     from flask_cors import CORS
@@ -122,6 +84,7 @@ except Exception:
     USE_CORS = False
 
 app = Flask(__name__)
+init_compression(app)
 
 # Añadir soporte para CORS solo si está disponible
 if USE_CORS:
@@ -228,7 +191,8 @@ def iq_session():
                 session_info = json.loads(session_data)
                 return jsonify({
                     "active": True,
-                    "session": session_info
+                    "session": session_info,
+                    "expires_in": r.ttl(session_key)
                 })
             except json.JSONDecodeError:
                 pass
@@ -311,12 +275,16 @@ def iq_trade_alias():
 
 @bp.route("/order_results", methods=["GET"])
 def iq_order_results():
-    """Endpoint para obtener resultados de órdenes ejecutadas"""
+    """Endpoint para obtener resultados de órdenes ejecutadas (?wait=s: espera hasta s segundos al primero)"""
     try:
+        # Long-poll opcional: BLPOP despierta en cuanto llega un resultado, sin sondear
+        wait = min(max(float(request.args.get("wait", 0) or 0), 0.0), 30.0)
+        first = r.blpop("order_results", wait) if wait > 0 else None
         # Obtener todos los resultados
         results = []
         while True:
-            result_data = r.lpop("order_results")
+            result_data = first[1] if first else r.lpop("order_results")
+            first = None
             if not result_data:
                 break
             try:
@@ -428,13 +396,24 @@ def iq_candles():
     timeframe = request.args.get("timeframe", "M5")
     limit = int(request.args.get("limit", 200))
     
+    # Histórico: ?from= y/o ?to= (mismas unidades que 'time') se leen del almacén CSV;
+    # con CANDLES_PARTITION=day|month solo se abren las particiones que solapan el rango
+    if request.args.get("from") or request.args.get("to"):
+        try:
+            start = int(request.args.get("from") or 0)
+            end = int(request.args.get("to") or 2 ** 63 - 1)
+        except ValueError:
+            return jsonify({"error": "from y to deben ser enteros"}), 400
+        history = read_range(symbol, timeframe.upper(), start, end)
+        return respond_candles(history[-limit:] if limit > 0 else history, negotiate(request))
+    
     # Intentar obtener velas desde cache en memoria
     candles_key = f"{symbol}_{timeframe}"
     real_candles = r.candles_data.get(candles_key)
     
     if real_candles:
         print(f"🔄 Sirviendo {len(real_candles)} velas: {symbol}")
-        return jsonify(real_candles)
+        return respond_candles(real_candles, negotiate(request))
     
     # No hay velas reales disponibles - generar velas mock
     print(f"📊 Generando velas mock para {symbol} {timeframe}")
@@ -471,7 +450,7 @@ def iq_candles():
         })
     
     r.candles_data[candles_key] = mock_candles
-    return jsonify(mock_candles)
+    return respond_candles(mock_candles, negotiate(request))
 
 @app.route("/health")
 def health():
@@ -2,86 +2,1329 @@
 """
 Servidor Redis en memoria simple para pruebas
 Simula las funciones básicas de Redis que necesita el sistema
+- Modo TCP (asyncio) con protocolo RESP2 en el puerto 6380: compatible con el cliente `redis`
+  (redis://127.0.0.1:6380), con pipelining (se responden todos los comandos de cada lectura de golpe);
+  HELLO 3 activa RESP3 en la conexión (los clientes redis-py recientes lo piden por defecto)
+- Expiración de claves (SETEX, SET EX/PX, EXPIRE/PEXPIRE, TTL/PTTL, PERSIST): comprobación perezosa
+  en cada acceso + hilo barrendero que duerme hasta el siguiente vencimiento (montículo de plazos)
+- BLPOP/BRPOP con timeout: el push entrega el valor directamente al primer cliente bloqueado
+  (sin sondeo); PUBLISH/SUBSCRIBE por canal, en proceso (subscribe()) y por RESP
+- MULTI/EXEC/DISCARD/WATCH por conexión: EXEC ejecuta lo encolado con todas las franjas tomadas
+  (el pipeline() por defecto de redis-py es una transacción)
+- KEYS/SCAN con patrones glob de Redis (*, ?, [a-z], [^x], \\); índice ordenado de claves (altas y
+  bajas anotadas sin lock y aplicadas al consultar o, si se acumulan, por un hilo aparte): los patrones con prefijo literal
+  (candles:EURUSD*) solo recorren su rango. Cursor de SCAN acotado (generación del índice + posición)
+- Espacio de claves en franjas con lock propio (MEMORY_REDIS_STRIPES); sin print por comando:
+  registro de auditoría opcional y asíncrono en búfer circular (MEMORY_REDIS_AUDIT=stdout|ruta)
+- RedisHandler: comandos JSON por HTTP ({"command","args"}), misma tabla de comandos
 """
 
+import asyncio
+import heapq
+import os
+import queue
+import re
+import sys
 import time
 import threading
 import json
 from datetime import datetime
-from collections import defaultdict, deque
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, defaultdict, deque
+from contextlib import contextmanager
+from functools import lru_cache
 from http.server import HTTPServer, BaseHTTPRequestHandler
 import urllib.parse as urlparse
 
-class MemoryRedis:
+DEFAULT_STRIPES = 16      # franjas (locks) del espacio de claves
+AUDIT_CAPACITY = 65536    # entradas del búfer circular de auditoría
+AUDIT_INTERVAL = 0.5      # segundos entre volcados del registro de auditoría
+INDEX_LOG_MAX = 65536     # altas/bajas anotadas antes de despertar al hilo que actualiza el índice
+SCAN_COUNT = 10           # COUNT por defecto de SCAN (entradas del índice examinadas por llamada)
+SCAN_RESUME_MAX = 65536   # cursores de SCAN recientes con su última clave (reanudación tras cambiar el índice)
+
+
+# ================= Patrones glob (semántica de stringmatch de Redis) =================
+@lru_cache(maxsize=256)
+def glob_regex(pattern):
+    """Compila un patrón glob de Redis: * ? [abc] [^a] [a-z] y \\ para escapar"""
+    out, i, n = [], 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == "*":
+            while i + 1 < n and pattern[i + 1] == "*":
+                i += 1
+            out.append(".*")
+        elif c == "?":
+            out.append(".")
+        elif c == "\\" and i + 1 < n:
+            i += 1
+            out.append(re.escape(pattern[i]))
+        elif c == "[":
+            end, cls = _glob_class(pattern, i + 1)
+            if end is None:
+                out.append(re.escape(c))
+            else:
+                out.append(cls)
+                i = end
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return re.compile("".join(out), re.DOTALL)
+
+
+def _glob_class(pattern, i):
+    """[...] desde la posición i (tras el '['): (índice del ']', clase regex) o (None, None) si no cierra"""
+    n = len(pattern)
+    negate = i < n and pattern[i] == "^"
+    if negate:
+        i += 1
+    items = []
+    while i < n and pattern[i] != "]":
+        c = pattern[i]
+        if c == "\\" and i + 1 < n:
+            i += 1
+            c = pattern[i]
+        if i + 2 < n and pattern[i + 1] == "-" and pattern[i + 2] != "]":
+            lo, hi = c, pattern[i + 2]
+            if lo > hi:
+                lo, hi = hi, lo
+            items.append(f"{re.escape(lo)}-{re.escape(hi)}")
+            i += 2
+        else:
+            items.append(re.escape(c))
+        i += 1
+    if i >= n:
+        return None, None
+    if not items:
+        return i, "[^\\s\\S]" if not negate else "[\\s\\S]"
+    return i, ("[^" if negate else "[") + "".join(items) + "]"
+
+
+def glob_match(pattern, key):
+    return pattern == "*" or glob_regex(pattern).fullmatch(key) is not None
+
+
+def glob_prefix(pattern):
+    """Prefijo literal del patrón (hasta el primer comodín) y si el resto es solo '*'"""
+    out, i, n = [], 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c in "*?[":
+            return "".join(out), pattern[i:].strip("*") == "" and c == "*"
+        if c == "\\" and i + 1 < n:
+            i += 1
+            c = pattern[i]
+        out.append(c)
+        i += 1
+    return "".join(out), False
+
+
+class _Waiter:
+    """Cliente bloqueado en BLPOP/BRPOP: lo sirve el primer push sobre cualquiera de sus claves"""
+    __slots__ = ("keys", "left", "deliver", "done")
+
+    def __init__(self, keys, left, deliver):
+        self.keys = keys
+        self.left = left
+        self.deliver = deliver  # deliver(key, value), se llama con el lock de la franja tomado
+        self.done = False
+
+
+class Subscription:
+    """Suscripción pub/sub: los mensajes van a una cola (get_message) o a un callback(channel, message)"""
+
+    def __init__(self, db, callback=None):
+        self.db = db
+        self.channels = set()
+        self._queue = queue.SimpleQueue()
+        self._callback = callback or (lambda channel, message: self._queue.put((channel, message)))
+
+    def subscribe(self, *channels):
+        with self.db._pubsub_lock:
+            for channel in channels:
+                self.channels.add(channel)
+                self.db._channels[channel].add(self)
+            return len(self.channels)
+
+    def unsubscribe(self, *channels):
+        with self.db._pubsub_lock:
+            for channel in (channels or list(self.channels)):
+                self.channels.discard(channel)
+                subs = self.db._channels.get(channel)
+                if subs is not None:
+                    subs.discard(self)
+                    if not subs:
+                        del self.db._channels[channel]
+            return len(self.channels)
+
+    def deliver(self, channel, message):
+        self._callback(channel, message)
+
+    def get_message(self, timeout=None):
+        """(canal, mensaje) o None si no llega nada en `timeout` segundos (None = espera indefinida)"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.unsubscribe()
+
+
+class AuditLog:
+    """
+    Registro de comandos opcional y asíncrono: record() solo añade a un búfer circular (deque con
+    maxlen, sin lock); un hilo lo vuelca por lotes a stdout o a un fichero. Si el escritor no da
+    abasto se pierden las entradas más antiguas (contador `dropped`), nunca se frena a los clientes.
+    """
+
+    def __init__(self, target="stdout", capacity=AUDIT_CAPACITY, interval=AUDIT_INTERVAL):
+        self.target = target
+        self.interval = interval
+        self.dropped = 0
+        self._buf = deque(maxlen=capacity)
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._writer, name="memory-redis-audit", daemon=True)
+        self._thread.start()
+
+    def record(self, op, key, value=None):
+        buf = self._buf
+        if len(buf) == buf.maxlen:
+            self.dropped += 1
+        buf.append((time.time(), op, key, value))
+        if len(buf) > buf.maxlen // 2:
+            self._wake.set()
+
+    def flush(self):
+        buf = self._buf
+        lines = []
+        sec, clock = None, ""
+        while buf:
+            try:
+                ts, op, key, value = buf.popleft()
+            except IndexError:
+                break
+            if int(ts) != sec:
+                sec = int(ts)
+                clock = time.strftime("%H:%M:%S", time.localtime(sec))
+            suffix = "" if value is None else f" {value}"
+            lines.append(f"[MemoryRedis] {clock}.{int((ts - sec) * 1000):03d} {op} {key}{suffix}\n")
+        if not lines:
+            return
+        if self.target == "stdout":
+            print("".join(lines), end="", flush=True)
+        else:
+            with open(self.target, "a", encoding="utf-8") as f:
+                f.writelines(lines)
+
+    def _writer(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[MemoryRedis] audit: {e}")
+
+
+class _Shard:
+    """Una franja del espacio de claves con su propio lock (reentrante: EXEC las toma todas)"""
+    __slots__ = ("lock", "data", "lists", "expires", "version")
+
     def __init__(self):
+        self.lock = threading.RLock()
         self.data = {}
         self.lists = defaultdict(deque)
-        self.lock = threading.Lock()
-        print(f"[MemoryRedis] Servidor iniciado - {datetime.now()}")
-    
-    def set(self, key, value):
-        with self.lock:
-            self.data[key] = str(value)
-            print(f"[MemoryRedis] SET {key} = {value}")
-    
+        self.expires = {}  # clave -> plazo (time.monotonic)
+        self.version = 0   # sube con cada escritura en la franja (WATCH)
+
+
+class MemoryRedis:
+    """
+    Espacio de claves repartido en `stripes` franjas por hash de la clave: comandos sobre claves
+    distintas no compiten por el mismo lock. Las operaciones multiclave (BLPOP, DEL, KEYS) toman
+    las franjas en orden de índice; MULTI/EXEC las toma todas (transaction()).
+    Orden de locks: franja(s) -> _block_lock / _expiry_lock.
+    """
+
+    def __init__(self, stripes=None, audit=None):
+        self.stripes = int(stripes or os.getenv("MEMORY_REDIS_STRIPES", str(DEFAULT_STRIPES)))
+        self._shards = [_Shard() for _ in range(self.stripes)]
+        self._blocked = defaultdict(deque)  # clave -> clientes bloqueados, en orden de llegada
+        self._block_lock = threading.Lock()
+        self._channels = defaultdict(set)   # canal -> suscripciones
+        self._pubsub_lock = threading.Lock()
+        self._index = []                    # todas las claves, ordenadas (KEYS/SCAN por prefijo)
+        self._index_log = deque()           # claves creadas/borradas pendientes de aplicar al índice
+        self._index_lock = threading.Lock()
+        self._index_gen = 0                 # sube cada vez que cambia el índice (cursores de SCAN)
+        self._scan_resume = OrderedDict()   # cursor emitido -> última clave devuelta (LRU)
+        self._index_due = threading.Event()
+        self._indexer = None
+        self._indexer_lock = threading.Lock()
+        self._deadlines = []                # montículo (plazo, clave); entradas obsoletas se saltan
+        self._expiry_lock = threading.Lock()
+        self._expiry_cond = threading.Condition(self._expiry_lock)
+        self._compact_at = 1024
+        self._sweeper = None
+        audit = audit if audit is not None else os.getenv("MEMORY_REDIS_AUDIT", "")
+        self.audit = AuditLog(audit) if audit else None
+        print(f"[MemoryRedis] Servidor iniciado - {datetime.now()} ({self.stripes} franjas"
+              f"{', auditoría: ' + audit if audit else ''})")
+
+    def _shard(self, key):
+        return self._shards[hash(key) % self.stripes]
+
+    @contextmanager
+    def _locked(self, keys):
+        """Toma las franjas de varias claves en orden de índice (sin interbloqueos)"""
+        idx = sorted({hash(k) % self.stripes for k in keys})
+        for i in idx:
+            self._shards[i].lock.acquire()
+        try:
+            yield
+        finally:
+            for i in reversed(idx):
+                self._shards[i].lock.release()
+
+    @contextmanager
+    def transaction(self):
+        """Toma todas las franjas en orden: los comandos de dentro se ejecutan sin intercalarse (EXEC)"""
+        for sh in self._shards:
+            sh.lock.acquire()
+        try:
+            yield
+        finally:
+            for sh in reversed(self._shards):
+                sh.lock.release()
+
+    def watch(self, key):
+        """(franja, versión) de la clave para WATCH: EXEC aborta si la franja cambió desde entonces"""
+        i = hash(key) % self.stripes
+        with self._shards[i].lock:
+            return i, self._shards[i].version
+
+    def unchanged(self, watched):
+        # Requiere transaction(): ninguna franja vigilada ha cambiado de versión
+        return all(self._shards[i].version == v for i, v in watched.items())
+
+    # ---------- cadenas ----------
+    def set(self, key, value, ex=None, px=None, nx=False, xx=False):
+        """SET con opciones de redis-py: ex/px (segundos/ms), nx (solo si no existe), xx (solo si existe)"""
+        sh = self._shards[hash(key) % self.stripes]
+        with sh.lock:
+            if sh.expires:
+                self._check(sh, key)
+            if (nx and key in sh.data) or (xx and key not in sh.data):
+                return None
+            created = key not in sh.data
+            sh.data[key] = str(value)
+            sh.version += 1
+            if created:
+                self._index_touch(key)
+            if ex is not None or px is not None:
+                self._set_deadline(sh, key, ex if ex is not None else px / 1000.0)
+            else:
+                sh.expires.pop(key, None)
+        if self.audit:
+            self.audit.record("SET", key, value)
+        return True
+
+    def setex(self, key, seconds, value):
+        """SETEX: guarda con expiración en segundos"""
+        if int(seconds) <= 0:
+            raise ValueError("invalid expire time in 'setex' command")
+        return self.set(key, value, ex=int(seconds))
+
     def get(self, key):
-        with self.lock:
-            return self.data.get(key)
-    
-    def lpush(self, key, *values):
-        with self.lock:
-            for value in values:
-                self.lists[key].appendleft(str(value))
-                print(f"[MemoryRedis] LPUSH {key} <- {value}")
-    
-    def lpop(self, key):
-        with self.lock:
+        sh = self._shards[hash(key) % self.stripes]
+        with sh.lock:
+            if sh.expires:
+                self._check(sh, key)
+            return sh.data.get(key)
+
+    # ---------- expiración ----------
+    def expire(self, key, seconds):
+        """Fija el TTL (segundos); 1 si la clave existe, 0 si no. Un TTL <= 0 la borra ya"""
+        sh = self._shard(key)
+        with sh.lock:
+            self._check(sh, key)
+            if not self._exists(sh, key):
+                return 0
+            if seconds <= 0:
+                self._delete_key(sh, key)
+            else:
+                self._set_deadline(sh, key, seconds)
+            return 1
+
+    def pexpire(self, key, milliseconds):
+        return self.expire(key, milliseconds / 1000.0)
+
+    def ttl(self, key):
+        """Segundos restantes; -1 sin expiración, -2 si la clave no existe"""
+        ms = self.pttl(key)
+        return ms if ms < 0 else (ms + 500) // 1000
+
+    def pttl(self, key):
+        sh = self._shard(key)
+        with sh.lock:
+            self._check(sh, key)
+            if not self._exists(sh, key):
+                return -2
+            deadline = sh.expires.get(key)
+            if deadline is None:
+                return -1
+            return max(0, int((deadline - time.monotonic()) * 1000))
+
+    def persist(self, key):
+        sh = self._shard(key)
+        with sh.lock:
+            self._check(sh, key)
+            if self._exists(sh, key) and sh.expires.pop(key, None) is not None:
+                sh.version += 1
+                return 1
+            return 0
+
+    def exists(self, *keys):
+        n = 0
+        for key in keys:
+            sh = self._shard(key)
+            with sh.lock:
+                self._check(sh, key)
+                n += self._exists(sh, key)
+        return n
+
+    @staticmethod
+    def _exists(sh, key):
+        return key in sh.data or bool(sh.lists.get(key))
+
+    def _check(self, sh, key):
+        # Requiere el lock de la franja: expiración perezosa al acceder a la clave
+        deadline = sh.expires.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            self._delete_key(sh, key)
+
+    def _delete_key(self, sh, key):
+        # Requiere el lock de la franja
+        count = 0
+        if sh.data.pop(key, None) is not None:
+            count += 1
+        if sh.lists.pop(key, None) is not None:
+            count += 1
+        sh.expires.pop(key, None)
+        if count:
+            sh.version += 1
+            self._index_touch(key)
+        return count
+
+    def _drop_list(self, sh, key):
+        # Requiere el lock de la franja: una lista vacía deja de existir (y su TTL con ella)
+        del sh.lists[key]
+        if key not in sh.data:
+            sh.expires.pop(key, None)
+            self._index_touch(key)
+
+    def _index_touch(self, key):
+        # Tras crear o borrar la clave: solo se anota (deque.append, sin lock); KEYS/SCAN lo aplican.
+        # Se llama bajo el lock de la franja: un registro muy largo lo vacía el hilo indexador, no aquí
+        self._index_log.append(key)
+        if len(self._index_log) > INDEX_LOG_MAX and not self._index_due.is_set():
+            if self._indexer is None:
+                with self._indexer_lock:
+                    if self._indexer is None:
+                        self._indexer = threading.Thread(target=self._index_worker,
+                                                         name="memory-redis-index", daemon=True)
+                        self._indexer.start()
+            self._index_due.set()
+
+    def _index_worker(self):
+        """Hilo indexador: aplica el registro de altas/bajas fuera de los locks de franja"""
+        while True:
+            self._index_due.wait()
+            self._index_due.clear()
             try:
-                value = self.lists[key].popleft()
-                print(f"[MemoryRedis] LPOP {key} -> {value}")
-                return value
-            except IndexError:
-                return None
-    
+                self._sync_index()
+            except Exception as e:
+                print(f"[MemoryRedis] Error actualizando el índice de claves: {e}")
+
+    def _sync_index(self):
+        """Aplica al índice ordenado las claves anotadas, según su estado actual"""
+        with self._index_lock:
+            log, index = self._index_log, self._index
+            touched = set()
+            while log:
+                try:
+                    touched.add(log.popleft())
+                except IndexError:
+                    break
+            adds, drops = [], set()
+            for key in touched:
+                sh = self._shard(key)
+                alive = key in sh.data or bool(sh.lists.get(key))
+                i = bisect_left(index, key)
+                present = i < len(index) and index[i] == key
+                if alive and not present:
+                    adds.append(key)
+                elif present and not alive:
+                    drops.add(key)
+            if adds or drops:
+                self._index_gen += 1
+            if len(adds) + len(drops) <= 64:
+                for key in drops:
+                    del index[bisect_left(index, key)]
+                for key in adds:
+                    index.insert(bisect_left(index, key), key)
+            elif adds or drops:
+                # Lote grande (carga inicial, barrido de TTL): una mezcla lineal en lugar de n inserciones
+                kept = [k for k in index if k not in drops] if drops else index
+                self._index = list(heapq.merge(kept, sorted(adds)))
+
+    def _set_deadline(self, sh, key, seconds):
+        # Requiere el lock de la franja
+        deadline = time.monotonic() + seconds
+        sh.expires[key] = deadline
+        sh.version += 1
+        with self._expiry_cond:
+            heapq.heappush(self._deadlines, (deadline, key))
+            # Compacta el montículo si se llenó de plazos obsoletos (TTL renovados / claves borradas)
+            if len(self._deadlines) > self._compact_at:
+                self._deadlines = [(d, k) for d, k in self._deadlines if self._shard(k).expires.get(k) == d]
+                heapq.heapify(self._deadlines)
+                self._compact_at = max(1024, 2 * len(self._deadlines))
+            if self._sweeper is None:
+                self._sweeper = threading.Thread(target=self._sweep, name="memory-redis-expiry", daemon=True)
+                self._sweeper.start()
+            elif self._deadlines[0][0] == deadline:
+                self._expiry_cond.notify()
+
+    def _sweep(self):
+        """Hilo barrendero: borra las claves vencidas aunque nadie vuelva a leerlas"""
+        while True:
+            with self._expiry_cond:
+                now = time.monotonic()
+                due = []
+                while self._deadlines and self._deadlines[0][0] <= now and len(due) < 1000:
+                    due.append(heapq.heappop(self._deadlines))
+                if not due:
+                    self._expiry_cond.wait(self._deadlines[0][0] - now if self._deadlines else None)
+                    continue
+            # Fuera del lock del montículo: cada clave se borra bajo el lock de su franja
+            for deadline, key in due:
+                sh = self._shard(key)
+                with sh.lock:
+                    if sh.expires.get(key) == deadline:
+                        self._delete_key(sh, key)
+
+    # ---------- listas ----------
+    def lpush(self, key, *values):
+        return self._push(key, values, True)
+
     def rpush(self, key, *values):
-        with self.lock:
-            for value in values:
-                self.lists[key].append(str(value))
-                print(f"[MemoryRedis] RPUSH {key} <- {value}")
-    
+        return self._push(key, values, False)
+
+    def _push(self, key, values, left):
+        sh = self._shards[hash(key) % self.stripes]
+        with sh.lock:
+            if sh.expires:
+                self._check(sh, key)
+            created = key not in sh.lists
+            lst = sh.lists[key]
+            if left:
+                for value in values:
+                    lst.appendleft(str(value))
+            else:
+                for value in values:
+                    lst.append(str(value))
+            sh.version += 1
+            if created:
+                self._index_touch(key)
+            n = len(lst)
+            if self._blocked:
+                self._serve(sh, key)
+        if self.audit:
+            self.audit.record("LPUSH" if left else "RPUSH", key, values[0] if len(values) == 1 else list(values))
+        return n
+
+    def lpop(self, key):
+        return self._pop(key, True)
+
+    def rpop(self, key):
+        return self._pop(key, False)
+
+    def _pop(self, key, left):
+        sh = self._shards[hash(key) % self.stripes]
+        with sh.lock:
+            hit = self._pop_from(sh, key, left)
+        if hit is not None and self.audit:
+            self.audit.record("LPOP" if left else "RPOP", key, hit)
+        return hit
+
+    def _pop_from(self, sh, key, left):
+        # Requiere el lock de la franja
+        if sh.expires:
+            self._check(sh, key)
+        lst = sh.lists.get(key)
+        if not lst:
+            return None
+        value = lst.popleft() if left else lst.pop()
+        sh.version += 1
+        if not lst:
+            self._drop_list(sh, key)
+        return value
+
+    def blpop(self, keys, timeout=0):
+        """(clave, valor) del primer elemento disponible en `keys`, esperando hasta `timeout` s (0 = sin límite)"""
+        return self._bpop(keys, timeout, True)
+
+    def brpop(self, keys, timeout=0):
+        return self._bpop(keys, timeout, False)
+
+    def _bpop(self, keys, timeout, left):
+        keys = [keys] if isinstance(keys, str) else list(keys)
+        box, ready = [], threading.Event()
+
+        def deliver(key, value):
+            box.append((key, value))
+            ready.set()
+
+        hit, waiter = self._pop_or_block(keys, left, deliver)
+        if hit is not None:
+            return hit
+        ready.wait(timeout or None)
+        if self._unblock(waiter):
+            return None
+        return box[0]
+
+    def _pop_or_block(self, keys, left, deliver):
+        """Primer elemento disponible en `keys` o, si no hay ninguno, registra al cliente como bloqueado"""
+        with self._locked(keys):
+            for key in keys:
+                value = self._pop_from(self._shard(key), key, left)
+                if value is not None:
+                    return (key, value), None
+            waiter = _Waiter(keys, left, deliver)
+            with self._block_lock:
+                for key in keys:
+                    self._blocked[key].append(waiter)
+            return None, waiter
+
+    def _unblock(self, waiter):
+        """Retira un cliente bloqueado (timeout/desconexión); False si ya fue servido"""
+        with self._block_lock:
+            if waiter.done:
+                return False
+            waiter.done = True
+            self._detach(waiter)
+            return True
+
+    def _detach(self, waiter, served_key=None):
+        # Requiere _block_lock: quita al cliente de las colas de espera de sus demás claves
+        for key in waiter.keys:
+            if key == served_key:
+                continue
+            waiters = self._blocked.get(key)
+            if waiters:
+                try:
+                    waiters.remove(waiter)
+                except ValueError:
+                    pass
+                if not waiters:
+                    del self._blocked[key]
+
+    def _requeue(self, key, value, left):
+        """Devuelve a la lista un valor entregado a un cliente que ya no puede recibirlo"""
+        sh = self._shard(key)
+        with sh.lock:
+            if left:
+                sh.lists[key].appendleft(value)
+            else:
+                sh.lists[key].append(value)
+            sh.version += 1
+            self._index_touch(key)
+            self._serve(sh, key)
+
+    def _serve(self, sh, key):
+        # Requiere el lock de la franja: entrega elementos de `key` a los clientes bloqueados en orden de llegada
+        with self._block_lock:
+            waiters = self._blocked.get(key)
+            if not waiters:
+                return
+            lst = sh.lists.get(key)
+            while waiters and lst:
+                waiter = waiters.popleft()
+                if waiter.done:
+                    continue
+                waiter.done = True
+                if len(waiter.keys) > 1:
+                    self._detach(waiter, key)
+                value = lst.popleft() if waiter.left else lst.pop()
+                sh.version += 1
+                waiter.deliver(key, value)
+            if not waiters:
+                del self._blocked[key]
+        if lst is not None and not lst:
+            self._drop_list(sh, key)
+
     def llen(self, key):
-        with self.lock:
-            return len(self.lists[key])
-    
+        sh = self._shard(key)
+        with sh.lock:
+            self._check(sh, key)
+            lst = sh.lists.get(key)
+            return len(lst) if lst else 0
+
+    # ---------- pub/sub ----------
+    def publish(self, channel, message):
+        """Entrega `message` a los suscriptores de `channel`; devuelve cuántos lo recibieron"""
+        with self._pubsub_lock:
+            subs = list(self._channels.get(channel, ()))
+        for sub in subs:
+            sub.deliver(channel, str(message))
+        return len(subs)
+
+    def subscribe(self, *channels, callback=None):
+        sub = Subscription(self, callback)
+        sub.subscribe(*channels)
+        return sub
+
+    # ---------- espacio de claves ----------
     def keys(self, pattern="*"):
-        with self.lock:
-            all_keys = list(self.data.keys()) + list(self.lists.keys())
-            if pattern == "*":
-                return all_keys
-            # Implementación simple de pattern matching
-            return [k for k in all_keys if pattern.replace("*", "") in k]
-    
+        """Claves que cumplen el patrón glob, en orden; con prefijo literal solo se recorre su rango"""
+        prefix, prefix_only = glob_prefix(pattern)
+        self._sync_index()
+        with self._index_lock:
+            lo, hi = self._prefix_range(prefix)
+            candidates = self._index[lo:hi]
+        if not prefix_only:
+            rx = glob_regex(pattern)
+            candidates = [k for k in candidates if rx.fullmatch(k)]
+        return self._live(candidates)
+
+    def scan(self, cursor=0, match=None, count=None, _type=None):
+        """
+        SCAN: (siguiente_cursor, claves). Examina hasta `count` entradas del índice ordenado; 0 al
+        terminar. El cursor cabe en 64 bits: generación del índice (31 bits) y posición siguiente
+        (32 bits). Si el índice cambió desde que se emitió, se reanuda tras la última clave devuelta
+        (tabla de los SCAN_RESUME_MAX cursores más recientes): toda clave presente durante el
+        recorrido completo aparece al menos una vez.
+        """
+        pattern = match or "*"
+        count = max(1, int(count or SCAN_COUNT))
+        prefix, prefix_only = glob_prefix(pattern)
+        cursor = int(cursor)
+        if cursor < 0 or cursor >= 1 << 63:
+            raise ValueError("invalid cursor")
+        self._sync_index()
+        with self._index_lock:
+            lo, hi = self._prefix_range(prefix)
+            if cursor:
+                lo = max(lo, self._resume_position(cursor))
+            batch = self._index[lo:min(hi, lo + count)]
+            done = lo + count >= hi
+            next_cursor = 0 if done or not batch else self._issue_cursor(lo + len(batch), batch[-1])
+        if not prefix_only:
+            rx = glob_regex(pattern)
+            found = [k for k in batch if rx.fullmatch(k)]
+        else:
+            found = batch
+        found = self._live(found)
+        if _type:
+            found = [k for k in found if self.type(k) == _type.lower()]
+        return next_cursor, found
+
+    def scan_iter(self, match=None, count=None, _type=None):
+        cursor = 0
+        while True:
+            cursor, found = self.scan(cursor, match, count, _type)
+            yield from found
+            if not cursor:
+                break
+
+    def type(self, key):
+        sh = self._shard(key)
+        with sh.lock:
+            self._check(sh, key)
+            if key in sh.data:
+                return "string"
+            return "list" if sh.lists.get(key) else "none"
+
+    def _issue_cursor(self, pos, last_key):
+        # Requiere _index_lock
+        cursor = ((self._index_gen & 0x7FFFFFFF) << 32) | pos
+        resume = self._scan_resume
+        resume[cursor] = last_key
+        resume.move_to_end(cursor)
+        if len(resume) > SCAN_RESUME_MAX:
+            resume.popitem(last=False)
+        return cursor
+
+    def _resume_position(self, cursor):
+        # Requiere _index_lock: posición del índice donde sigue el recorrido del cursor
+        gen, pos = cursor >> 32, cursor & 0xFFFFFFFF
+        if gen == self._index_gen & 0x7FFFFFFF:
+            return pos  # índice sin cambios: la posición sigue siendo exacta
+        last_key = self._scan_resume.get(cursor)
+        if last_key is not None:
+            return bisect_right(self._index, last_key)
+        return min(pos, len(self._index))  # cursor olvidado: mejor esfuerzo por posición
+
+    def _prefix_range(self, prefix):
+        # Requiere _index_lock
+        if not prefix:
+            return 0, len(self._index)
+        lo = bisect_left(self._index, prefix)
+        if ord(prefix[-1]) == sys.maxunicode:
+            hi = lo
+            while hi < len(self._index) and self._index[hi].startswith(prefix):
+                hi += 1
+            return lo, hi
+        hi = bisect_left(self._index, prefix[:-1] + chr(ord(prefix[-1]) + 1), lo)
+        return lo, hi
+
+    def _live(self, keys):
+        # Descarta las claves vencidas que el barrendero aún no ha borrado
+        now = time.monotonic()
+        out = []
+        for key in keys:
+            deadline = self._shard(key).expires.get(key)
+            if deadline is None or deadline > now:
+                out.append(key)
+        return out
+
     def delete(self, *keys):
-        with self.lock:
-            count = 0
+        count = 0
+        with self._locked(keys):
             for key in keys:
-                if key in self.data:
-                    del self.data[key]
-                    count += 1
-                if key in self.lists:
-                    del self.lists[key]
-                    count += 1
-            return count
-    
+                sh = self._shard(key)
+                self._check(sh, key)
+                count += self._delete_key(sh, key)
+        if count and self.audit:
+            self.audit.record("DEL", " ".join(keys))
+        return count
+
     def flushall(self):
-        with self.lock:
-            self.data.clear()
-            self.lists.clear()
-            print("[MemoryRedis] FLUSHALL - Base de datos limpiada")
+        for sh in self._shards:
+            with sh.lock:
+                sh.data.clear()
+                sh.lists.clear()
+                sh.expires.clear()
+                sh.version += 1
+        with self._index_lock:
+            self._index.clear()
+            self._index_log.clear()
+            self._index_gen += 1
+        with self._expiry_cond:
+            self._deadlines.clear()
+        print("[MemoryRedis] FLUSHALL - Base de datos limpiada")
 
 # Instancia global de Redis
 memory_redis = MemoryRedis()
 
+# ================= Tabla de comandos =================
+class CommandError(Exception):
+    """Error de comando; se devuelve al cliente como respuesta de error (-ERR ...)"""
+
+
+class Status(str):
+    """Respuesta de estado (+OK, +PONG) en lugar de cadena (bulk)"""
+
+
+OK = Status("OK")
+
+
+def _int_arg(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise CommandError("ERR value is not an integer or out of range")
+
+
+def _expire_arg(value, command):
+    n = _int_arg(value)
+    if n <= 0:
+        raise CommandError(f"ERR invalid expire time in '{command}' command")
+    return n
+
+
+def _cmd_set(db, key, value, *opts):
+    ex = px = None
+    nx = xx = False
+    it = iter(opts)
+    for opt in it:
+        opt = opt.upper()
+        if opt in ("EX", "PX") and ex is None and px is None:
+            n = _expire_arg(next(it, None), "set")
+            ex, px = (n, None) if opt == "EX" else (None, n)
+        elif opt == "NX" and not xx:
+            nx = True
+        elif opt == "XX" and not nx:
+            xx = True
+        else:
+            raise CommandError("ERR syntax error")
+    return OK if db.set(key, value, ex=ex, px=px, nx=nx, xx=xx) else None
+
+
+def _cmd_flushall(db, *opts):
+    db.flushall()
+    return OK
+
+
+def _timeout_arg(value):
+    try:
+        timeout = float(value)
+    except (TypeError, ValueError):
+        raise CommandError("ERR timeout is not a float or out of range")
+    if timeout < 0:
+        raise CommandError("ERR timeout is negative")
+    return timeout
+
+
+def _cmd_bpop(db, args, left):
+    keys, timeout = args[:-1], _timeout_arg(args[-1])
+    hit = db.blpop(keys, timeout) if left else db.brpop(keys, timeout)
+    return list(hit) if hit else None
+
+
+def _cmd_scan(db, cursor, *opts):
+    match, count, type_ = None, None, None
+    it = iter(opts)
+    for opt in it:
+        opt = opt.upper()
+        value = next(it, None)
+        if value is None:
+            raise CommandError("ERR syntax error")
+        if opt == "MATCH":
+            match = value
+        elif opt == "COUNT":
+            count = _int_arg(value)
+            if count < 1:
+                raise CommandError("ERR syntax error")
+        elif opt == "TYPE":
+            type_ = value
+        else:
+            raise CommandError("ERR syntax error")
+    try:
+        next_cursor, keys = db.scan(cursor, match, count, type_)
+    except ValueError:
+        raise CommandError("ERR invalid cursor")
+    return [str(next_cursor), keys]
+
+
+def _cmd_select(db, index):
+    if _int_arg(index) != 0:
+        raise CommandError("ERR DB index is out of range")
+    return OK
+
+
+def _cmd_client(db, sub, *args):
+    # CLIENT SETNAME / SETINFO (lo envía redis-py al conectar) / GETNAME / ID: sin estado real
+    sub = sub.upper()
+    if sub == "GETNAME":
+        return None
+    if sub == "ID":
+        return 1
+    return OK
+
+
+# nombre -> (función(db, *args), mínimo de argumentos, máximo o None)
+COMMANDS = {
+    "PING": (lambda db, msg=None: Status("PONG") if msg is None else msg, 0, 1),
+    "ECHO": (lambda db, msg: msg, 1, 1),
+    "SELECT": (_cmd_select, 1, 1),
+    "CLIENT": (_cmd_client, 1, None),
+    "SET": (_cmd_set, 2, None),
+    "GET": (lambda db, key: db.get(key), 1, 1),
+    "SETEX": (lambda db, key, seconds, value: OK if db.set(key, value, ex=_expire_arg(seconds, "setex")) else None, 3, 3),
+    "PSETEX": (lambda db, key, ms, value: OK if db.set(key, value, px=_expire_arg(ms, "psetex")) else None, 3, 3),
+    "EXPIRE": (lambda db, key, seconds: db.expire(key, _int_arg(seconds)), 2, 2),
+    "PEXPIRE": (lambda db, key, ms: db.pexpire(key, _int_arg(ms)), 2, 2),
+    "TTL": (lambda db, key: db.ttl(key), 1, 1),
+    "PTTL": (lambda db, key: db.pttl(key), 1, 1),
+    "PERSIST": (lambda db, key: db.persist(key), 1, 1),
+    "EXISTS": (lambda db, *keys: db.exists(*keys), 1, None),
+    "LPUSH": (lambda db, key, *values: db.lpush(key, *values), 2, None),
+    "RPUSH": (lambda db, key, *values: db.rpush(key, *values), 2, None),
+    "LPOP": (lambda db, key: db.lpop(key), 1, 1),
+    "RPOP": (lambda db, key: db.rpop(key), 1, 1),
+    "BLPOP": (lambda db, *args: _cmd_bpop(db, args, True), 2, None),
+    "BRPOP": (lambda db, *args: _cmd_bpop(db, args, False), 2, None),
+    "PUBLISH": (lambda db, channel, message: db.publish(channel, message), 2, 2),
+    "LLEN": (lambda db, key: db.llen(key), 1, 1),
+    "KEYS": (lambda db, pattern: db.keys(pattern), 1, 1),
+    "SCAN": (_cmd_scan, 1, None),
+    "TYPE": (lambda db, key: Status(db.type(key)), 1, 1),
+    "DEL": (lambda db, *keys: db.delete(*keys), 1, None),
+    "FLUSHALL": (_cmd_flushall, 0, 1),
+}
+
+
+def check_command(name, args):
+    """Función del comando si existe y el número de argumentos es válido; si no, CommandError"""
+    entry = COMMANDS.get(name.upper())
+    if entry is None:
+        raise CommandError(f"ERR unknown command '{name}'")
+    func, lo, hi = entry
+    if len(args) < lo or (hi is not None and len(args) > hi):
+        raise CommandError(f"ERR wrong number of arguments for '{name.lower()}' command")
+    return func
+
+
+def execute_command(db, name, args):
+    """Ejecuta un comando de la tabla; errores de uso como CommandError"""
+    return check_command(name, args)(db, *args)
+
+
+def execute_transaction(db, commands, watched=None):
+    """
+    EXEC: ejecuta los comandos encolados tras MULTI con todas las franjas tomadas, sin que se
+    intercale ningún otro cliente. Un error en un comando va en su posición y no detiene el resto.
+    None si alguna franja vigilada con WATCH cambió (la transacción no se ejecuta).
+    """
+    out = []
+    with db.transaction():
+        if watched and not db.unchanged(watched):
+            return None
+        for name, args in commands:
+            try:
+                if name in ("BLPOP", "BRPOP"):
+                    # Dentro de una transacción no se bloquea: se comporta como LPOP/RPOP sobre las claves
+                    out.append(_bpop_now(db, args, name == "BLPOP"))
+                else:
+                    out.append(execute_command(db, name, args))
+            except CommandError as e:
+                out.append(e)
+            except Exception as e:
+                out.append(CommandError(f"ERR {e}"))
+    return out
+
+
+def _bpop_now(db, args, left):
+    keys = args[:-1]
+    _timeout_arg(args[-1])
+    for key in keys:
+        value = db.lpop(key) if left else db.rpop(key)
+        if value is not None:
+            return [key, value]
+    return None
+
+
+# ================= Protocolo RESP2 =================
+class ProtocolError(Exception):
+    pass
+
+
+class RespParser:
+    """Parser incremental: feed() con lo recibido, commands() devuelve los comandos completos"""
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._pos = 0
+
+    def feed(self, data: bytes):
+        self._buf += data
+
+    def commands(self):
+        out = []
+        while True:
+            cmd = self._parse()
+            if cmd is None:
+                break
+            if cmd:
+                out.append(cmd)
+        # Descarta lo ya consumido (una vez por lectura, no por comando)
+        if self._pos:
+            del self._buf[:self._pos]
+            self._pos = 0
+        return out
+
+    def _line(self, pos):
+        end = self._buf.find(b"\r\n", pos)
+        if end < 0:
+            return None, pos
+        return bytes(self._buf[pos:end]), end + 2
+
+    def _parse(self):
+        buf, pos = self._buf, self._pos
+        if pos >= len(buf):
+            return None
+        if buf[pos] != 0x2A:  # comando inline (p. ej. "PING\r\n" desde telnet / redis-cli)
+            line, nxt = self._line(pos)
+            if line is None:
+                return None
+            self._pos = nxt
+            return [w.decode("utf-8", "surrogateescape") for w in line.split()]
+        line, pos = self._line(pos + 1)
+        if line is None:
+            return None
+        try:
+            n = int(line)
+        except ValueError:
+            raise ProtocolError("Protocol error: invalid multibulk length")
+        args = []
+        for _ in range(n):
+            if pos >= len(buf):
+                return None
+            if buf[pos] != 0x24:
+                raise ProtocolError(f"Protocol error: expected '$', got '{chr(buf[pos])}'")
+            line, pos = self._line(pos + 1)
+            if line is None:
+                return None
+            size = int(line)
+            if len(buf) < pos + size + 2:
+                return None
+            args.append(bytes(buf[pos:pos + size]).decode("utf-8", "surrogateescape"))
+            pos += size + 2
+        self._pos = pos
+        return args
+
+
+def encode_reply(value, proto: int = 2) -> bytes:
+    if value is None:
+        return b"_\r\n" if proto == 3 else b"$-1\r\n"
+    if isinstance(value, Status):
+        return b"+" + value.encode() + b"\r\n"
+    if isinstance(value, CommandError):
+        return b"-" + str(value).encode() + b"\r\n"
+    if isinstance(value, bool):
+        return b":1\r\n" if value else b":0\r\n"
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, dict):
+        items = [x for kv in value.items() for x in kv]
+        if proto == 3:
+            return b"%%%d\r\n" % len(value) + b"".join(encode_reply(v, proto) for v in items)
+        value = items
+    if isinstance(value, (list, tuple)):
+        return b"*%d\r\n" % len(value) + b"".join(encode_reply(v, proto) for v in value)
+    if not isinstance(value, bytes):
+        value = str(value).encode("utf-8", "surrogateescape")
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def encode_push(items, proto: int = 2) -> bytes:
+    """Mensaje pub/sub: array en RESP2, tipo push (>) en RESP3"""
+    head = b">%d\r\n" if proto == 3 else b"*%d\r\n"
+    return head % len(items) + b"".join(encode_reply(v, proto) for v in items)
+
+
+NULL_ARRAY = {2: b"*-1\r\n", 3: b"_\r\n"}
+PUBSUB_ALLOWED = ("SUBSCRIBE", "UNSUBSCRIBE", "PSUBSCRIBE", "PUNSUBSCRIBE", "PING", "QUIT", "RESET")
+MULTI_IMMEDIATE = ("EXEC", "DISCARD", "MULTI", "WATCH", "UNWATCH", "QUIT")
+
+
+class RespConnection(asyncio.Protocol):
+    """
+    Una conexión RESP. Los comandos de cada lectura se responden con una sola escritura (pipelining).
+    BLPOP/BRPOP no ocupan hilos: la conexión queda en espera y el push la despierta en el bucle;
+    los comandos que lleguen mientras tanto se encolan y se ejecutan después, en orden.
+    MULTI encola los comandos de la conexión (+QUEUED) y EXEC los ejecuta de forma atómica;
+    WATCH vigila la franja de cada clave (una escritura en otra clave de la franja también aborta).
+    """
+
+    def __init__(self, db, loop):
+        self.db = db
+        self.loop = loop
+        self.parser = RespParser()
+        self.proto = 2
+        self.transport = None
+        self.closed = False
+        self.subscription = None
+        self._pending = deque()
+        self._waiter = None
+        self._timer = None
+        self._quit = False
+        self._multi = None    # comandos encolados tras MULTI (None = fuera de transacción)
+        self._dirty = False   # algún comando encolado era inválido: EXEC responde EXECABORT
+        self._watched = {}    # franja -> versión al hacer WATCH
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def connection_lost(self, exc):
+        self.closed = True
+        if self._timer is not None:
+            self._timer.cancel()
+        if self._waiter is not None:
+            self.db._unblock(self._waiter)
+        if self.subscription is not None:
+            self.subscription.close()
+
+    def data_received(self, data):
+        self.parser.feed(data)
+        try:
+            self._pending.extend(self.parser.commands())
+        except (ProtocolError, ValueError) as e:
+            self.transport.write(b"-ERR " + str(e).encode() + b"\r\n")
+            self.transport.close()
+            return
+        self._run()
+
+    def _run(self):
+        out = []
+        while self._pending and self._waiter is None and not self._quit:
+            reply = self._dispatch(self._pending.popleft())
+            if reply is not None:  # None: bloqueado, la respuesta llega en _wake / _expire
+                out.append(reply)
+        if out:
+            self.transport.write(b"".join(out))
+        if self._quit:
+            self._pending.clear()
+            self.transport.close()
+
+    def _dispatch(self, cmd):
+        name, args = cmd[0].upper(), cmd[1:]
+        try:
+            subscribed = self.subscription is not None and self.subscription.channels
+            if subscribed and self.proto == 2 and name not in PUBSUB_ALLOWED:
+                raise CommandError(f"ERR Can't execute '{name.lower()}': only (P|S)SUBSCRIBE / "
+                                   "(P|S)UNSUBSCRIBE / PING / QUIT / RESET are allowed in this context")
+            if self._multi is not None and name not in MULTI_IMMEDIATE:
+                return self._queue(name, args)
+            if name == "QUIT":
+                self._quit = True
+                return encode_reply(OK)
+            if name in ("MULTI", "EXEC", "DISCARD", "WATCH", "UNWATCH"):
+                return self._transaction(name, args)
+            if name == "HELLO":
+                return encode_reply(_hello(self, args), self.proto)
+            if name in ("BLPOP", "BRPOP"):
+                return self._bpop(args, name == "BLPOP")
+            if name == "SUBSCRIBE":
+                return self._subscribe(args)
+            if name == "UNSUBSCRIBE":
+                return self._unsubscribe(args)
+            if name == "PING" and subscribed and self.proto == 2:
+                return encode_reply(["pong", args[0] if args else ""])
+            return encode_reply(execute_command(self.db, name, args), self.proto)
+        except CommandError as e:
+            return encode_reply(e)
+        except Exception as e:
+            return encode_reply(CommandError(f"ERR {e}"))
+
+    # ---------- MULTI / EXEC ----------
+    def _queue(self, name, args):
+        if name in ("HELLO", "SUBSCRIBE", "UNSUBSCRIBE"):
+            self._dirty = True
+            raise CommandError("ERR Command not allowed inside a transaction")
+        try:
+            check_command(name, args)
+        except CommandError:
+            self._dirty = True
+            raise
+        self._multi.append((name, args))
+        return encode_reply(Status("QUEUED"))
+
+    def _transaction(self, name, args):
+        if name == "MULTI":
+            if args:
+                raise CommandError("ERR wrong number of arguments for 'multi' command")
+            if self._multi is not None:
+                raise CommandError("ERR MULTI calls can not be nested")
+            self._multi, self._dirty = [], False
+            return encode_reply(OK)
+        if name == "WATCH":
+            if not args:
+                raise CommandError("ERR wrong number of arguments for 'watch' command")
+            if self._multi is not None:
+                raise CommandError("ERR WATCH inside MULTI is not allowed")
+            for key in args:
+                i, version = self.db.watch(key)
+                self._watched.setdefault(i, version)
+            return encode_reply(OK)
+        if name == "UNWATCH":
+            self._watched = {}
+            return encode_reply(OK)
+        if self._multi is None:
+            raise CommandError(f"ERR {name} without MULTI")
+        commands, dirty, watched = self._multi, self._dirty, self._watched
+        self._multi, self._dirty, self._watched = None, False, {}
+        if name == "DISCARD":
+            return encode_reply(OK)
+        if dirty:
+            raise CommandError("EXECABORT Transaction discarded because of previous errors.")
+        results = execute_transaction(self.db, commands, watched)
+        return NULL_ARRAY[self.proto] if results is None else encode_reply(results, self.proto)
+
+    # ---------- BLPOP / BRPOP ----------
+    def _bpop(self, args, left):
+        if len(args) < 2:
+            raise CommandError(f"ERR wrong number of arguments for '{'blpop' if left else 'brpop'}' command")
+        keys, timeout = args[:-1], _timeout_arg(args[-1])
+
+        def deliver(key, value):
+            self.loop.call_soon_threadsafe(self._wake, key, value, left)
+
+        hit, self._waiter = self.db._pop_or_block(keys, left, deliver)
+        if hit is not None:
+            return encode_reply(list(hit), self.proto)
+        if timeout:
+            self._timer = self.loop.call_later(timeout, self._expire)
+        return None
+
+    def _wake(self, key, value, left):
+        if self.closed:
+            self.db._requeue(key, value, left)
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._waiter = None
+        self.transport.write(encode_reply([key, value], self.proto))
+        self._run()
+
+    def _expire(self):
+        self._timer = None
+        # Si ya fue servido, el valor está de camino (_wake)
+        if self._waiter is not None and self.db._unblock(self._waiter):
+            self._waiter = None
+            self.transport.write(NULL_ARRAY[self.proto])
+            self._run()
+
+    # ---------- pub/sub ----------
+    def _subscribe(self, channels):
+        if not channels:
+            raise CommandError("ERR wrong number of arguments for 'subscribe' command")
+        if self.subscription is None:
+            self.subscription = Subscription(self.db, self._on_message)
+        return b"".join(encode_push(["subscribe", ch, self.subscription.subscribe(ch)], self.proto)
+                        for ch in channels)
+
+    def _unsubscribe(self, channels):
+        sub = self.subscription
+        channels = list(channels) or (sorted(sub.channels) if sub else [])
+        if not channels:
+            return encode_push(["unsubscribe", None, 0], self.proto)
+        return b"".join(encode_push(["unsubscribe", ch, sub.unsubscribe(ch) if sub else 0], self.proto)
+                        for ch in channels)
+
+    def _on_message(self, channel, message):
+        self.loop.call_soon_threadsafe(self._push_message, channel, message)
+
+    def _push_message(self, channel, message):
+        if not self.closed:
+            self.transport.write(encode_push(["message", channel, message], self.proto))
+
+
+def _hello(conn, args):
+    if args:
+        proto = _int_arg(args[0])
+        if proto not in (2, 3):
+            raise CommandError("NOPROTO unsupported protocol version")
+        conn.proto = proto
+    return {"server": "redis", "version": "6.2.0", "proto": conn.proto, "id": 1,
+            "mode": "standalone", "role": "master", "modules": []}
+
+
+async def serve_resp(db=None, host=None, port=None):
+    """Servidor RESP2 (asyncio); corre hasta que se cancele"""
+    db = db or memory_redis
+    host = host or os.getenv("MEMORY_REDIS_HOST", "127.0.0.1")
+    port = int(port or os.getenv("MEMORY_REDIS_PORT", "6380"))
+    loop = asyncio.get_running_loop()
+    server = await loop.create_server(lambda: RespConnection(db, loop), host, port)
+    async with server:
+        await server.serve_forever()
+
 class RedisHandler(BaseHTTPRequestHandler):
     def do_POST(self):
         try:
@@ -93,30 +1336,10 @@ class RedisHandler(BaseHTTPRequestHandler):
             command = data.get('command', '').upper()
             args = data.get('args', [])
             
-            result = None
-            
-            if command == 'SET' and len(args) >= 2:
-                memory_redis.set(args[0], args[1])
-                result = "OK"
-            elif command == 'GET' and len(args) >= 1:
-                result = memory_redis.get(args[0])
-            elif command == 'LPUSH' and len(args) >= 2:
-                result = memory_redis.lpush(args[0], *args[1:])
-            elif command == 'LPOP' and len(args) >= 1:
-                result = memory_redis.lpop(args[0])
-            elif command == 'RPUSH' and len(args) >= 2:
-                result = memory_redis.rpush(args[0], *args[1:])
-            elif command == 'LLEN' and len(args) >= 1:
-                result = memory_redis.llen(args[0])
-            elif command == 'KEYS' and len(args) >= 1:
-                result = memory_redis.keys(args[0])
-            elif command == 'DEL' and len(args) >= 1:
-                result = memory_redis.delete(*args)
-            elif command == 'FLUSHALL':
-                memory_redis.flushall()
-                result = "OK"
-            else:
-                result = f"ERR unknown command '{command}'"
+            try:
+                result = execute_command(memory_redis, command, args)
+            except CommandError as e:
+                result = str(e)
             
             self.send_response(200)
             self.send_header('Content-type', 'application/json')
@@ -136,8 +1359,10 @@ class RedisHandler(BaseHTTPRequestHandler):
 def start_memory_redis_server():
     """Inicia el servidor Redis en memoria"""
     print("🗄️ Iniciando servidor Redis en memoria...")
-    print("   Puerto: 6380 (simulado)")
-    print("   Funciones: SET, GET, LPUSH, LPOP, RPUSH, LLEN, KEYS, DEL")
+    host = os.getenv("MEMORY_REDIS_HOST", "127.0.0.1")
+    port = int(os.getenv("MEMORY_REDIS_PORT", "6380"))
+    print(f"   Puerto: {port} (RESP2, redis://{host}:{port})")
+    print(f"   Funciones: {', '.join(COMMANDS)}")
     
     # Simular datos iniciales
     memory_redis.set("server_status", "running")
@@ -146,10 +1371,8 @@ def start_memory_redis_server():
     print("✅ Servidor Redis en memoria iniciado correctamente")
     print("   Datos de prueba creados")
     
-    # Mantener el servidor corriendo
     try:
-        while True:
-            time.sleep(1)
+        asyncio.run(serve_resp(memory_redis, host, port))
     except KeyboardInterrupt:
         print("\n🛑 Deteniendo servidor Redis en memoria...")
 
@@ -3,10 +3,15 @@
 """
 STC Trading Platform Server (Dual Source: MT5 | IQ)
 - CSV base local (historical_data/csv/{SYMBOL}_{TF}.csv)
-- Bootstrap: carga CSV + sincroniza 1mo desde yfinance (incremental)
+- Bootstrap: carga CSV + sincroniza 1mo desde yfinance (incremental), en paralelo y en segundo plano
+  (progreso en /api/bootstrap/status)
 - Upsert por unix_time con prioridad: ea/mt5 > csv > yfinance > iq (por defecto)
-- /api/data: entrega 300 velas cerradas por símbolo de la fuente solicitada (?source=mt5|iq)
+- /api/data: entrega 300 velas cerradas por símbolo de la fuente solicitada (?source=mt5|iq);
+  con ?since=<cursor> solo lo cambiado desde la respuesta anterior (delta)
 - Selector de fuente vía /api/source (GET/POST) y desde el dashboard
+- /api/mt5/ticks, /api/iq/ticks: ingesta de ticks por lotes (una firma y una pasada por lote)
+- /api/mt5/history: importación masiva del histórico del EA (cuerpo gzip/deflate, una fusión ordenada)
+- /api/stream: push SSE de ticks, velas vivas/cerradas y señales (filtros por símbolo/fuente)
 - MT5: alineado por huso del bróker (BROKER_TZ_OFFSET_MINUTES)
 - IQ: login desde dashboard, estado y envío de órdenes (binarias/digitales)
 """
@@ -17,15 +22,28 @@ import json
 import time
 import ssl
 import logging
+import queue
 import threading
+import zlib
+from contextlib import contextmanager
 from datetime import datetime, timezone, timedelta
 from collections import defaultdict, deque
+from itertools import islice
 from iq_routes import init_iq_routes
 import os, sys
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))  # garantiza que se pueda importar 'iq_routes'
 
 from iq_routes import init_iq_routes
-from flask import Flask, request, jsonify, render_template, redirect, url_for, send_file
+from flask import Flask, request, jsonify, render_template, redirect, url_for, send_file, Response, stream_with_context
+from candle_series import CandleSeries, source_codes
+from candles_store import CandlesStore
+from event_stream import EventBroker, parse_filter
+from snapshot_cache import SnapshotCache
+from signal_index import SignalIndex
+from signal_journal import SignalJournal
+import api_encoding
+from response_compression import init_compression, choose_encoding
+import numpy as np
 
 # Opcional: yfinance/pandas
 try:
@@ -62,6 +80,7 @@ logger = logging.getLogger("stc-server")
 
 app = Flask(__name__)
 init_iq_routes(app)
+init_compression(app)
 app.config['TEMPLATES_AUTO_RELOAD'] = True
 app.jinja_env.auto_reload = True
 
@@ -78,7 +97,8 @@ API_SECRET = "tu_clave_secreta_muy_segura_2024"
 HTTPS_PORT = 5001
 HTTP_PORT = 5002
 
-MAX_BUFFER_SIZE = int(os.getenv('MAX_BUFFER_SIZE', '2000'))
+MAX_BUFFER_SIZE = int(os.getenv('MAX_BUFFER_SIZE', '100000'))
+TICK_BUFFER_SIZE = int(os.getenv('TICK_BUFFER_SIZE', '2000'))
 FRONTEND_CLOSED_LIMIT = int(os.getenv('FRONTEND_CLOSED_LIMIT', '300'))
 
 # Offset del huso del bróker (para MT5). Ej: UTC+3 -> 180
@@ -92,19 +112,85 @@ if ACTIVE_SOURCE not in ('mt5', 'iq'):
 TIMEFRAME_MIN = 5
 TF_MINUTES = {'M1':1,'M5':5,'M15':15,'M30':30,'H1':60,'H4':240,'D1':1440}
 BOOTSTRAP_PAIRS = [('EURUSD','M5')]
+# Ej: BOOTSTRAP_PAIRS="EURUSD:M5,GBPUSD:M5,USDJPY:M15"
+if os.getenv('BOOTSTRAP_PAIRS'):
+    BOOTSTRAP_PAIRS = [tuple(p.strip().upper().split(':', 1)) if ':' in p else (p.strip().upper(), 'M5')
+                       for p in os.getenv('BOOTSTRAP_PAIRS', '').split(',') if p.strip()]
+BOOTSTRAP_WORKERS = int(os.getenv('BOOTSTRAP_WORKERS', '4'))
+
+# Máximo de ticks por petición en /api/mt5/ticks y /api/iq/ticks
+TICK_BATCH_MAX = int(os.getenv('TICK_BATCH_MAX', '5000'))
+
+# Máximo de velas por petición en /api/mt5/history
+HISTORY_BATCH_MAX = int(os.getenv('HISTORY_BATCH_MAX', '200000'))
+# Tamaño máximo del cuerpo de /api/mt5/history ya descomprimido (límite ante bombas gzip/deflate)
+HISTORY_BODY_MAX = int(os.getenv('HISTORY_BODY_MAX', str(64 * 1024 * 1024)))
+# Series de /api/mt5/history pendientes de escribir a disco; con la cola llena la petición espera
+HISTORY_CSV_QUEUE_MAX = int(os.getenv('HISTORY_CSV_QUEUE_MAX', '32'))
+
+# /api/data?since=: con un cursor más atrasado que esto (en nº de cambios) se envía snapshot completo
+DELTA_MAX_LAG = int(os.getenv('DELTA_MAX_LAG', '50000'))
+
+# ================= Secuencia de cambios =================
+# Cada vela/tick/señal escrita recibe un número creciente; /api/data?since=N devuelve solo lo posterior a N.
+# SERVER_EPOCH cambia en cada arranque: un cursor de otra época fuerza snapshot completo.
+# El cursor que se entrega es committed_seq(): nunca adelanta a un elemento aún no publicado.
+SERVER_EPOCH = f"{int(time.time() * 1000):x}"
+_seq = 0
+_seq_lock = threading.Lock()
+_inflight = set()   # primera secuencia de cada bloque reservado cuyo elemento aún no es visible
+
+def next_seq() -> int:
+    """Secuencia para CandleSeries: se asigna y se guarda bajo series.lock, que /api/data también toma"""
+    global _seq
+    with _seq_lock:
+        _seq += 1
+        return _seq
+
+@contextmanager
+def publish_seqs(n: int = 1):
+    """Reserva n secuencias consecutivas (devuelve la primera) mientras se publican ticks o la vela viva"""
+    global _seq
+    with _seq_lock:
+        first = _seq + 1
+        _seq += n
+        _inflight.add(first)
+    try:
+        yield first
+    finally:
+        with _seq_lock:
+            _inflight.discard(first)
+
+def committed_seq() -> int:
+    """Mayor secuencia con todo lo anterior ya visible: cursor de /api/data y /api/stream"""
+    with _seq_lock:
+        return min(_inflight) - 1 if _inflight else _seq
 
 # ================= Memoria =================
+# Velas cerradas: CandleSeries columnar (numpy) por símbolo; los dicts se arman al responder
 # MT5
-tick_data_mt5 = defaultdict(lambda: deque(maxlen=MAX_BUFFER_SIZE))
-candle_data_mt5 = defaultdict(lambda: deque(maxlen=MAX_BUFFER_SIZE))
+tick_data_mt5 = defaultdict(lambda: deque(maxlen=TICK_BUFFER_SIZE))
+candle_data_mt5 = defaultdict(lambda: CandleSeries(MAX_BUFFER_SIZE, _src_priority, next_seq))
 live_candle_mt5 = dict()
 
 # IQ
-tick_data_iq = defaultdict(lambda: deque(maxlen=MAX_BUFFER_SIZE))
-candle_data_iq = defaultdict(lambda: deque(maxlen=MAX_BUFFER_SIZE))
+tick_data_iq = defaultdict(lambda: deque(maxlen=TICK_BUFFER_SIZE))
+candle_data_iq = defaultdict(lambda: CandleSeries(MAX_BUFFER_SIZE, _src_priority, next_seq))
 live_candle_iq = dict()
 
-signals_store = deque(maxlen=1000)
+# Señales indexadas por símbolo, id, seq y tiempo (más nueva primero al iterar)
+signals_store = SignalIndex(maxlen=1000, per_symbol=200, key=lambda s: normalize_symbol(s))
+
+# Push en vivo (/api/stream): ticks, velas vivas/cerradas y señales a medida que se ingieren
+STREAM_QUEUE_SIZE = int(os.getenv('STREAM_QUEUE_SIZE', '500'))
+events = EventBroker()
+
+# Snapshots de /api/data ya codificados; cada ingesta incrementa la versión de su fuente
+snapshots = SnapshotCache(SERVER_EPOCH)
+
+# Progreso del bootstrap (consultable en /api/bootstrap/status mientras el servidor ya atiende)
+bootstrap_state = {'state': 'idle', 'workers': BOOTSTRAP_WORKERS, 'started_at': None, 'finished_at': None, 'pairs': {}}
+_bootstrap_lock = threading.Lock()
 
 stats = {
     'total_ticks': 0,
@@ -119,27 +205,26 @@ stats = {
 HIST_DIR = os.path.join(os.getcwd(), "historical_data")
 os.makedirs(HIST_DIR, exist_ok=True)
 CSV_STORE = csv_store.CsvStore(HIST_DIR)
-SIGNALS_FILE = os.path.join(HIST_DIR, "_signals.jsonl")
-_persist_lock = threading.Lock()
+# Histórico del EA (/api/mt5/history): CSV por lotes con CandlesStore en historical_data/history/
+HISTORY_STORE = CandlesStore(os.path.join(HIST_DIR, "history"))
+SIGNALS_FILE = os.path.join(HIST_DIR, "_signals.jsonl")  # formato antiguo: se migra al diario
+# Diario segmentado de señales (historical_data/signals/); escritura agrupada con fsync por lote
+SIGNALS_JOURNAL = SignalJournal(os.path.join(HIST_DIR, "signals"), legacy_file=SIGNALS_FILE,
+                                fsync=os.getenv('SIGNALS_FSYNC', '1') != '0')
 
 # ================= Utilidades base =================
 def persist_signal(sig: dict):
     try:
-        with _persist_lock, open(SIGNALS_FILE, "a", encoding="utf-8") as f:
-            f.write(json.dumps(sig, ensure_ascii=False) + "\n")
+        SIGNALS_JOURNAL.append(sig)
     except Exception:
         pass
 
 def load_signals(max_rows: int = 1000):
     try:
-        if not os.path.isfile(SIGNALS_FILE):
-            return
-        with open(SIGNALS_FILE, "r", encoding="utf-8") as f:
-            lines = f.readlines()[-max_rows:]
-        for ln in reversed(lines):
+        for s in SIGNALS_JOURNAL.tail(max_rows):
             try:
-                s = json.loads(ln)
-                signals_store.appendleft(s)
+                s.pop('seq', None)  # secuencia de un arranque anterior
+                signals_store.add(s)
                 stats['total_signals'] = max(stats['total_signals'], int(s.get('id', 0)))
             except Exception:
                 continue
@@ -223,7 +308,11 @@ def parse_mt5_timestamp_with_broker_tz(ts: str, tf_minutes: int) -> datetime:
         return floor_to_tf_broker(datetime.now(timezone.utc), tf_minutes)
 
 # ====== Upsert en memoria por fuente ======
-def upsert_candles_into_memory(store: defaultdict, candles: list):
+def _store_source(store) -> str:
+    return 'iq' if store is candle_data_iq else 'mt5'
+
+def upsert_candles_into_memory(store: defaultdict, candles: list, accepted: list = None):
+    """Upsert vela a vela; si se pasa accepted, recibe (vela, seq) de las que no rechazó la prioridad de fuente"""
     if not candles: return (0,0)
     by_sym = defaultdict(list)
     for c in candles:
@@ -234,48 +323,73 @@ def upsert_candles_into_memory(store: defaultdict, candles: list):
     total_skipped = 0
 
     for symbol, seq in by_sym.items():
-        arr = list(store[symbol])
-        index_by_time = { c.get('unix_time'): i for i,c in enumerate(arr) if c and c.get('unix_time') is not None }
+        series = store[symbol]
         loaded_or_replaced = 0
         skipped = 0
 
-        for c in sorted(seq, key=lambda x: x.get('unix_time', 0)):
-            if not c:
-                skipped += 1
-                continue
-            ut = c.get('unix_time')
-            if ut is None:
-                skipped += 1
-                continue
-            new_pr = _src_priority(c.get('source'))
-            if ut in index_by_time:
-                i = index_by_time[ut]
-                cur = arr[i]
-                cur_pr = _src_priority(cur.get('source'))
-                if new_pr >= cur_pr:
-                    arr[i] = c
+        with series.lock:
+            for c in sorted(seq, key=lambda x: x.get('unix_time', 0)):
+                if c.get('unix_time') is None:
+                    skipped += 1
+                    continue
+                if series.upsert(c):
                     loaded_or_replaced += 1
+                    if accepted is not None:
+                        accepted.append((c, series.seq))
                 else:
                     skipped += 1
-            else:
-                arr.append(c)
-                index_by_time[ut] = len(arr)-1
-                loaded_or_replaced += 1
 
-        try:
-            arr.sort(key=lambda x: x.get('unix_time', 0))
-        except Exception:
-            pass
+        total_loaded_or_replaced += loaded_or_replaced
+        total_skipped += skipped
 
-        store[symbol].clear()
-        for c in arr[-MAX_BUFFER_SIZE:]:
-            store[symbol].append(c)
+    stats['total_candles'] += total_loaded_or_replaced
+    stats['last_activity'] = time.time()
+    if total_loaded_or_replaced:
+        snapshots.bump(_store_source(store))
+    return (total_loaded_or_replaced, total_skipped)
 
-        total_loaded_or_replaced += loaded_or_replaced
+def bulk_upsert_into_memory(store: defaultdict, candles) -> tuple:
+    """
+    Carga masiva (CSV / yfinance): convierte el lote a columnas y lo fusiona por símbolo
+    con CandleSeries.merge_columns en lugar del bucle vela a vela.
+    Acepta una lista de dicts o un DataFrame con las mismas columnas.
+    """
+    if candles is None or len(candles) == 0: return (0,0)
+    if hasattr(candles, 'columns'):
+        df = candles[candles['symbol'].notna() & candles['unix_time'].notna()]
+        total_skipped = len(candles) - len(df)
+        symbols = df['symbol'].astype(str).to_numpy()
+        times = df['unix_time'].to_numpy(dtype=np.int64)
+        prices = {col: df[col].to_numpy(dtype=np.float64) if col in df else 0.0 for col in CandleSeries.PRICE_COLUMNS}
+        sources = source_codes(df['source'].tolist() if 'source' in df else [None] * len(df))
+        closed = df['closed'].to_numpy(dtype=np.uint8) if 'closed' in df else None
+        timeframes = df['timeframe'].astype(str).to_numpy() if 'timeframe' in df else None
+    else:
+        rows = [c for c in candles if c and c.get('symbol') and c.get('unix_time') is not None]
+        total_skipped = len(candles) - len(rows)
+        symbols = np.array([c['symbol'] for c in rows], dtype=object)
+        times = np.array([int(c['unix_time']) for c in rows], dtype=np.int64)
+        prices = {col: np.array([c.get(col) or 0.0 for c in rows], dtype=np.float64) for col in CandleSeries.PRICE_COLUMNS}
+        sources = source_codes([c.get('source') for c in rows])
+        closed = np.array([bool(c.get('closed', True)) for c in rows], dtype=np.uint8)
+        timeframes = np.array([c.get('timeframe') for c in rows], dtype=object)
+
+    total_loaded_or_replaced = 0
+    for symbol in set(symbols.tolist()):
+        mask = symbols == symbol
+        series = store[symbol]
+        with series.lock:
+            loaded, skipped = series.merge_columns(
+                times[mask], {col: (arr[mask] if isinstance(arr, np.ndarray) else arr) for col, arr in prices.items()},
+                sources[mask], closed[mask] if closed is not None else None,
+                symbol=symbol, timeframe=timeframes[mask][0] if timeframes is not None else None)
+        total_loaded_or_replaced += loaded
         total_skipped += skipped
 
     stats['total_candles'] += total_loaded_or_replaced
     stats['last_activity'] = time.time()
+    if total_loaded_or_replaced:
+        snapshots.bump(_store_source(store))
     return (total_loaded_or_replaced, total_skipped)
 
 # ================= Rutas Dashboard =================
@@ -306,9 +420,13 @@ def api_info():
         "last_activity": stats['last_activity'],
         "frontend_closed_limit": FRONTEND_CLOSED_LIMIT,
         "max_buffer_size": MAX_BUFFER_SIZE,
+        "tick_buffer_size": TICK_BUFFER_SIZE,
         "broker_tz_offset_minutes": BROKER_TZ_OFFSET_MINUTES,
         "active_source": ACTIVE_SOURCE,
         "iq_available": _IQ_AVAILABLE,
+        "stream_clients": len(events),
+        "snapshot_cache": snapshots.stats(),
+        "bootstrap": bootstrap_state['state'],
     })
 
 @app.route('/health', methods=['GET'])
@@ -349,20 +467,81 @@ def receive_tick_mt5():
         sig = request.headers.get('X-Signature', '')
         if not verify_hmac_signature(request.get_data(as_text=True), sig, API_SECRET):
             return jsonify({"error":"Invalid signature"}), 401
-        tick = request.get_json()
-        symbol = normalize_symbol(tick.get('symbol','UNKNOWN'))
-        tick['symbol'] = symbol
-        tick['received_at'] = time.time()
-        tick['server_timestamp'] = datetime.now(timezone.utc).isoformat()
-        tick_data_mt5[symbol].append(tick)
-        stats['total_ticks'] += 1
-        stats['last_activity'] = time.time()
-        stats['active_symbols'].add(symbol)
+        ingest_ticks('mt5', [request.get_json()])
         return jsonify({"status":"success"})
     except Exception as e:
         logger.error(f"/mt5/tick error: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/mt5/ticks', methods=['POST'])
+def receive_ticks_mt5():
+    """Lote de ticks (uno o varios símbolos): {"ticks":[{...}, ...]} o una lista; una sola firma por lote"""
+    try:
+        sig = request.headers.get('X-Signature', '')
+        if not verify_hmac_signature(request.get_data(as_text=True), sig, API_SECRET):
+            return jsonify({"error":"Invalid signature"}), 401
+        ticks = _tick_batch(request.get_json(force=True, silent=False))
+        if ticks is None:
+            return jsonify({"error": f"lote vacío o mayor que {TICK_BATCH_MAX}"}), 400
+        n = ingest_ticks('mt5', ticks)
+        return jsonify({"status":"success","ticks_processed": n})
+    except Exception as e:
+        logger.error(f"/mt5/ticks error: {e}")
+        return jsonify({"error": str(e)}), 500
+
+def _tick_batch(payload):
+    ticks = payload.get('ticks') if isinstance(payload, dict) else payload
+    if not isinstance(ticks, list) or not ticks or len(ticks) > TICK_BATCH_MAX:
+        return None
+    return ticks
+
+def ingest_ticks(source: str, raw_ticks: list) -> int:
+    """
+    Ingesta de ticks en una sola pasada: una marca de tiempo, un bloque de secuencias,
+    una actualización de stats/versión y un evento por símbolo (el último tick del lote).
+    """
+    store = tick_data_iq if source == 'iq' else tick_data_mt5
+    now = time.time()
+    now_iso = datetime.fromtimestamp(now, tz=timezone.utc).isoformat()
+    last_by_symbol = {}
+    n = 0
+    with publish_seqs(len(raw_ticks)) as seq:
+        for raw in raw_ticks:
+            if not isinstance(raw, dict):
+                continue
+            symbol = normalize_symbol(raw.get('symbol','UNKNOWN'))
+            if source == 'iq':
+                price = raw.get('price')
+                tick = {
+                    "symbol": symbol,
+                    "price": _to_float(price),
+                    "bid": _to_float(raw.get('bid', price)),
+                    "ask": _to_float(raw.get('ask', price)),
+                    "timestamp_ms": int(raw.get('timestamp_ms', now*1000)),
+                    "received_at": now,
+                    "server_timestamp": now_iso,
+                    "source": "iq",
+                    "seq": seq + n,
+                }
+            else:
+                tick = raw
+                tick['symbol'] = symbol
+                tick['received_at'] = now
+                tick['server_timestamp'] = now_iso
+                tick['seq'] = seq + n
+            store[symbol].append(tick)
+            last_by_symbol[symbol] = tick
+            n += 1
+    if not n:
+        return 0
+    for symbol, tick in last_by_symbol.items():
+        events.publish('tick', tick, source, symbol, tick['seq'])
+    snapshots.bump(source)
+    stats['total_ticks'] += n
+    stats['last_activity'] = now
+    stats['active_symbols'].update(last_by_symbol)
+    return n
+
 @app.route('/api/mt5/candles', methods=['POST'])
 def receive_candles_mt5():
     try:
@@ -403,7 +582,10 @@ def receive_candles_mt5():
                     if prev_closed:
                         prev_closed['closed'] = True
                         out.append(prev_closed)
-                live_candle_mt5[symbol] = sc
+                with publish_seqs() as sc['seq']:
+                    live_candle_mt5[symbol] = sc
+                events.publish('live', sc, 'mt5', symbol, sc['seq'])
+                snapshots.bump('mt5')
             else:
                 out.append(sc)
                 if prev_live and prev_live.get('unix_time') == sc['unix_time']:
@@ -413,45 +595,215 @@ def receive_candles_mt5():
             stats['last_activity'] = time.time()
 
         if out:
-            upsert_candles_into_memory(candle_data_mt5, out)
+            accepted = []
+            upsert_candles_into_memory(candle_data_mt5, out, accepted)
             for sc in out:
                 if sc.get('closed'):
                     CSV_STORE.upsert_closed_candle(sc)
+            # Solo lo que quedó en memoria (una fuente de mayor prioridad puede haber rechazado la vela)
+            for sc, seq in accepted:
+                events.publish('candle', sc, 'mt5', sc['symbol'], seq)
 
         return jsonify({"status":"success","candles_processed": len(out)})
     except Exception as e:
         logger.error(f"/mt5/candles error: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/mt5/history', methods=['POST'])
+def receive_history_mt5():
+    """
+    Histórico inicial del EA en una sola petición (cuerpo opcionalmente gzip/deflate):
+    {"symbol","timeframe","t":[hora del bróker, epoch],"o":[...],"h":[...],"l":[...],"c":[...],"v":[...]}
+    o {"symbol","timeframe","candles":[{timestamp|unix_time, open, high, low, close, volume}, ...]};
+    varias series con {"series":[...]}. Se fusiona por símbolo con una pasada ordenada
+    (CandleSeries.merge_columns) y se persiste en CSV en segundo plano.
+    """
+    try:
+        try:
+            body = _request_body(HISTORY_BODY_MAX)
+        except zlib.error as e:
+            return jsonify({"error": f"cuerpo comprimido inválido: {e}"}), 400
+        if body is None:
+            return jsonify({"error": f"cuerpo mayor que {HISTORY_BODY_MAX} bytes descomprimido"}), 413
+        sig = request.headers.get('X-Signature', '')
+        if not verify_hmac_signature(body.decode('utf-8', 'replace'), sig, API_SECRET):
+            return jsonify({"error":"Invalid signature"}), 401
+        payload = json.loads(body)
+        series_list = payload.get('series', [payload]) if isinstance(payload, dict) else []
+        t0 = time.time()
+        # Todas las series se validan antes de fusionar ninguna: un 400 no deja importaciones a medias
+        parsed = [_history_columns(item) for item in series_list]
+        if any(cols is None for cols in parsed):
+            return jsonify({"error": f"serie inválida o mayor que {HISTORY_BATCH_MAX} velas"}), 400
+        result = {"received": 0, "inserted": 0, "replaced": 0, "skipped": 0, "series": []}
+        for symbol, timeframe, times, prices, received in parsed:
+            series = candle_data_mt5[symbol]
+            with series.lock:
+                inserted, replaced, skipped, written = series.merge_columns(
+                    times, prices, source_codes(['ea'])[0], 1, symbol=symbol, timeframe=timeframe, detailed=True)
+                seq = series.seq
+            skipped += received - len(times)
+            result['series'].append({"symbol": symbol, "timeframe": timeframe, "inserted": inserted,
+                                     "replaced": replaced, "skipped": skipped})
+            result['received'] += received
+            result['inserted'] += inserted
+            result['replaced'] += replaced
+            result['skipped'] += skipped
+            stats['active_symbols'].add(symbol)
+            if inserted or replaced:
+                # Solo se persiste lo que cambió: un reenvío idéntico no reescribe el CSV
+                mask = np.isin(times, written)
+                _persist_history_csv(symbol, timeframe, times[mask], {k: v[mask] for k, v in prices.items()})
+                # Un evento por serie en lugar de uno por vela: el cliente resincroniza con /api/data?since=
+                events.publish('history', {"symbol": symbol, "timeframe": timeframe, "inserted": inserted,
+                                           "replaced": replaced, "from": int(written.min()), "to": int(written.max()),
+                                           "seq": seq}, 'mt5', symbol, seq)
+        if result['inserted'] or result['replaced']:
+            stats['total_candles'] += result['inserted'] + result['replaced']
+            snapshots.bump('mt5')
+        stats['last_activity'] = time.time()
+        result.update({"status": "success", "elapsed_ms": round((time.time() - t0) * 1000, 1)})
+        return jsonify(result)
+    except Exception as e:
+        logger.error(f"/mt5/history error: {e}")
+        return jsonify({"error": str(e)}), 500
+
+def _request_body(max_bytes: int) -> bytes | None:
+    """
+    Cuerpo de la petición descomprimido según Content-Encoding (gzip, deflate zlib o deflate crudo);
+    None si pasa de max_bytes: se descomprime con tope de salida, nunca entero en memoria.
+    zlib.error si el cuerpo comprimido está corrupto, truncado o con bytes de sobra
+    """
+    data = request.get_data()
+    enc = (request.headers.get('Content-Encoding') or '').lower().strip()
+    if enc in ('gzip', 'x-gzip'):
+        return _inflate(data, 16 + zlib.MAX_WBITS, max_bytes)
+    if enc == 'deflate':
+        try:
+            return _inflate(data, zlib.MAX_WBITS, max_bytes)
+        except zlib.error:
+            return _inflate(data, -zlib.MAX_WBITS, max_bytes)
+    return data if len(data) <= max_bytes else None
+
+def _inflate(data: bytes, wbits: int, max_bytes: int) -> bytes | None:
+    """None si pasa de max_bytes; zlib.error si el flujo está truncado o lleva bytes de sobra detrás"""
+    d = zlib.decompressobj(wbits)
+    out = d.decompress(data, max_bytes)
+    if d.unconsumed_tail:
+        return None
+    if not d.eof or d.unused_data:
+        raise zlib.error("flujo comprimido truncado o con datos de sobra")
+    return out
+
+def _history_columns(item):
+    """
+    Serie del cuerpo de /api/mt5/history -> (symbol, timeframe, unix_times, precios, recibidas).
+    Velas sin open/close se descartan; high/low se corrigen como en sanitize_candle.
+    """
+    if not isinstance(item, dict):
+        return None
+    symbol = normalize_symbol(item.get('symbol', 'UNKNOWN'))
+    timeframe = str(item.get('timeframe', 'M5')).upper()
+    tfs = TF_MINUTES.get(timeframe, TIMEFRAME_MIN) * 60
+    off = BROKER_TZ_OFFSET_MINUTES * 60
+    rows = item.get('candles')
+    if isinstance(rows, list):
+        raw = {k: [r.get(name) if isinstance(r, dict) else None for r in rows]
+               for k, name in (('o','open'), ('h','high'), ('l','low'), ('c','close'), ('v','volume'))}
+        times = []
+        for r in rows:
+            r = r if isinstance(r, dict) else {}
+            if r.get('unix_time') is not None:
+                ut = int(r['unix_time'])
+                times.append(ut - (ut + off) % tfs)
+            else:
+                times.append(int(parse_mt5_timestamp_with_broker_tz(r.get('timestamp', ''), tfs // 60).timestamp()))
+        t = np.array(times, dtype=np.int64)
+    elif isinstance(item.get('t'), list):
+        raw = {k: item.get(k) for k in ('o', 'h', 'l', 'c', 'v')}
+        # t = datetime de MT5 (epoch en hora del bróker): se alinea al timeframe y se pasa a UTC
+        t = np.asarray(item['t'], dtype=np.int64)
+        t = t - t % tfs - off
+    else:
+        return None
+    n = len(t)
+    if n > HISTORY_BATCH_MAX:
+        return None
+
+    def col(key):
+        vals = raw.get(key)
+        if not isinstance(vals, list) or len(vals) != n:
+            return np.full(n, np.nan)
+        return np.array([np.nan if x is None else x for x in vals], dtype=np.float64)
+
+    o, h, l, c, v = col('o'), col('h'), col('l'), col('c'), col('v')
+    ok = ~np.isnan(o) & ~np.isnan(c)
+    with np.errstate(invalid='ignore'):
+        stack = np.vstack([o, c, h, l])[:, ok]
+        prices = {'open': o[ok], 'close': c[ok],
+                  'high': np.nanmax(stack, axis=0), 'low': np.nanmin(stack, axis=0),
+                  'volume': np.nan_to_num(v[ok])}
+    return symbol, timeframe, t[ok], prices, n
+
+_history_csv_queue = queue.Queue(maxsize=HISTORY_CSV_QUEUE_MAX)
+_history_csv_writer = None
+_history_csv_writer_lock = threading.Lock()
+
+def _persist_history_csv(symbol, timeframe, times, prices):
+    """
+    Encola la serie para escribirla en HISTORY_STORE (la memoria ya está actualizada). Un único hilo
+    escritor la vuelca con store_batch; con la cola llena la petición espera en lugar de crear hilos
+    """
+    global _history_csv_writer
+    with _history_csv_writer_lock:
+        if _history_csv_writer is None:
+            _history_csv_writer = threading.Thread(target=_history_csv_worker, name="history-csv", daemon=True)
+            _history_csv_writer.start()
+    _history_csv_queue.put((symbol, timeframe, times, prices))
+
+def _history_csv_worker():
+    while True:
+        symbol, timeframe, times, prices = _history_csv_queue.get()
+        try:
+            candles = [{"time": int(ut), "open": float(o), "high": float(h), "low": float(l),
+                        "close": float(c), "volume": float(v)}
+                       for ut, o, h, l, c, v in zip(times.tolist(), prices['open'].tolist(), prices['high'].tolist(),
+                                                    prices['low'].tolist(), prices['close'].tolist(),
+                                                    prices['volume'].tolist())]
+            HISTORY_STORE.store_batch(symbol, timeframe, candles)
+        except Exception as e:
+            logger.error(f"history CSV {symbol} {timeframe}: {e}")
+
+def load_history_csv(symbol: str, tf: str, limit: int = 500000) -> list:
+    """Histórico del EA persistido en HISTORY_STORE, como filas de bulk_upsert_into_memory"""
+    return [{"symbol": symbol, "timeframe": tf, "unix_time": c['time'], "open": c['open'], "high": c['high'],
+             "low": c['low'], "close": c['close'], "volume": c['volume'], "closed": True, "source": "ea"}
+            for c in HISTORY_STORE.read_last(symbol, tf, limit)]
+
 # ================= Endpoints IQ (data push desde WS externo) =================
 @app.route('/api/iq/tick', methods=['POST'])
 def receive_tick_iq():
     try:
         data = request.get_json(force=True, silent=False) or {}
-        symbol = normalize_symbol(data.get('symbol','UNKNOWN'))
-        price = data.get('price')
-        bid = data.get('bid', price)
-        ask = data.get('ask', price)
-        ts_ms = int(data.get('timestamp_ms', time.time()*1000))
-        tick = {
-            "symbol": symbol,
-            "price": _to_float(price),
-            "bid": _to_float(bid),
-            "ask": _to_float(ask),
-            "timestamp_ms": ts_ms,
-            "received_at": time.time(),
-            "server_timestamp": datetime.now(timezone.utc).isoformat(),
-            "source": "iq"
-        }
-        tick_data_iq[symbol].append(tick)
-        stats['total_ticks'] += 1
-        stats['last_activity'] = time.time()
-        stats['active_symbols'].add(symbol)
+        ingest_ticks('iq', [data])
         return jsonify({"status":"success"})
     except Exception as e:
         logger.error(f"/iq/tick error: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/iq/ticks', methods=['POST'])
+def receive_ticks_iq():
+    """Lote de ticks IQ: {"ticks":[{"symbol","price","bid","ask","timestamp_ms"}, ...]} o una lista"""
+    try:
+        ticks = _tick_batch(request.get_json(force=True, silent=False))
+        if ticks is None:
+            return jsonify({"error": f"lote vacío o mayor que {TICK_BATCH_MAX}"}), 400
+        n = ingest_ticks('iq', ticks)
+        return jsonify({"status":"success","ticks_processed": n})
+    except Exception as e:
+        logger.error(f"/iq/ticks error: {e}")
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/iq/candles', methods=['POST'])
 def receive_candles_iq():
     try:
@@ -500,12 +852,18 @@ def receive_candles_iq():
                 seq.sort(key=lambda x: x['unix_time'])
                 live_new = [x for x in seq if not x['closed']]
                 if live_new:
-                    live_candle_iq[sym] = live_new[-1]
+                    with publish_seqs() as live_new[-1]['seq']:
+                        live_candle_iq[sym] = live_new[-1]
+                    events.publish('live', live_new[-1], 'iq', sym, live_new[-1]['seq'])
+                    snapshots.bump('iq')
                 closed_new = [x for x in seq if x['closed']]
                 if closed_new:
-                    upsert_candles_into_memory(candle_data_iq, closed_new)
+                    accepted = []
+                    upsert_candles_into_memory(candle_data_iq, closed_new, accepted)
                     for sc in closed_new:
                         CSV_STORE.upsert_closed_candle(sc)
+                    for sc, seq in accepted:
+                        events.publish('candle', sc, 'iq', sym, seq)
                     pushed += len(closed_new)
             return jsonify({"status":"success","candles_processed": pushed})
         return jsonify({"status":"success","candles_processed": 0})
@@ -659,25 +1017,130 @@ def signals_endpoint():
     try:
         if request.method == 'POST':
             sig = request.get_json(force=True, silent=False) or {}
-            sig['id'] = stats['total_signals'] + 1
-            sig['created_at'] = datetime.now(timezone.utc).isoformat()
-            sig['created_unix'] = time.time()
-            signals_store.appendleft(sig)
-            stats['total_signals'] += 1
-            persist_signal(sig)
+            with signals_store.lock:
+                sig['id'] = stats['total_signals'] + 1
+                sig['created_at'] = datetime.now(timezone.utc).isoformat()
+                sig['created_unix'] = time.time()
+                sig['seq'] = next_seq()
+                signals_store.add(sig)
+                stats['total_signals'] += 1
+                # Bajo el mismo lock que asigna el id: el diario recibe los ids en orden
+                persist_signal(sig)
+            snapshots.bump('mt5', 'iq')
+            events.publish('signal', sig, None, normalize_symbol(sig.get('symbol', '')) if sig.get('symbol') else None, sig['seq'])
             return jsonify({"status":"success","signal": sig}), 201
-        limit = int(request.args.get('limit', 50))
-        return jsonify({"signals": list(signals_store)[:limit], "total_signals": stats['total_signals']})
+        # Paginación: ?limit=50&symbol=EURUSD&before=<id>&after=<id>&since=<unix>&until=<unix>
+        # next_cursor se pasa como ?before= para la página siguiente (más antigua)
+        args = request.args
+        opt = lambda name, cast: cast(args[name]) if args.get(name) not in (None, '') else None
+        page, cursor = signals_store.page(
+            limit=int(args.get('limit', 50)), before_id=opt('before', int), after_id=opt('after', int),
+            since=opt('since', float), until=opt('until', float), symbol=args.get('symbol') or None)
+        payload = {"signals": page, "next_cursor": cursor, "total_signals": stats['total_signals']}
+        fmt = api_encoding.negotiate(request)
+        return jsonify(payload) if fmt == 'json' else api_encoding.respond(payload, fmt)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/signals/history', methods=['GET'])
+def signals_history():
+    """Histórico desde el diario: ?id=<id> o ?since=<unix>&until=<unix>&after=<id>&limit=500"""
+    try:
+        args = request.args
+        if args.get('id'):
+            sig = SIGNALS_JOURNAL.get(int(args['id']))
+            if sig is None:
+                return jsonify({"error": "señal no encontrada"}), 404
+            return jsonify({"signal": sig})
+        opt = lambda name, cast: cast(args[name]) if args.get(name) not in (None, '') else None
+        limit = max(1, min(int(args.get('limit', 500)), 5000))
+        rows = SIGNALS_JOURNAL.range(since=opt('since', float), until=opt('until', float),
+                                     after_id=opt('after', int), limit=limit)
+        return jsonify({"signals": rows, "count": len(rows),
+                        "next_cursor": rows[-1].get('id') if len(rows) == limit else None})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 # ================= /api/data (dual fuente) =================
 @app.route('/api/data', methods=['GET'])
 def get_data():
+    """
+    Snapshot por símbolo (velas cerradas + viva, ticks recientes, señales).
+    Con ?since=<cursor> (y opcionalmente &epoch=) devuelve solo lo cambiado desde ese cursor:
+    mode="delta"; los símbolos en reset_symbols vienen completos (demasiados cambios).
+    Si el cursor no es válido, es de otra época o está demasiado atrasado: mode="full".
+    El snapshot completo sale de la caché versionada (ETag / If-None-Match -> 304).
+    Filtros: ?symbols=EURUSD,GBPUSD&timeframe=M5&limit=300&ticks=0&signals=0
+    Formato (api_encoding): ?format=columnar|msgpack o Accept; las velas van en columnas t,o,h,l,c,v.
+    """
     source = str(request.args.get('source', ACTIVE_SOURCE or 'mt5')).lower()
     if source not in ('mt5','iq'):
         source = 'mt5'
 
+    # El cursor se lee antes de recorrer: lo que cambie durante la respuesta se reenvía en la siguiente
+    cursor = committed_seq()
+    since = _parse_since(request.args.get('since'), request.args.get('epoch'), cursor)
+    flt = _data_filters(request.args)
+    fmt = flt['format'] = api_encoding.negotiate(request)
+    if since is not None:
+        payload = _data_payload(source, since, cursor, flt)
+        return jsonify(payload) if fmt == 'json' else api_encoding.respond(payload, fmt)
+
+    key = (source,) + tuple(flt[k] for k in ('symbols', 'timeframe', 'limit', 'ticks', 'signals', 'format'))
+    etag = snapshots.etag(source, key)
+    if etag.strip('"') in request.if_none_match:
+        return _not_modified(etag)
+    if fmt == 'json':
+        build = lambda: app.json.dumps(_data_payload(source, None, committed_seq(), flt)).encode('utf-8')
+    else:
+        build = lambda: api_encoding.encode(_data_payload(source, None, committed_seq(), flt), fmt)
+    snap = snapshots.get(source, key, build)
+    if snap.etag.strip('"') in request.if_none_match:
+        return _not_modified(snap.etag)
+    return _snapshot_response(snap, api_encoding.mimetype(fmt))
+
+def _not_modified(etag: str):
+    resp = Response(status=304)
+    resp.headers['ETag'] = etag
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp
+
+def _snapshot_response(snap, mimetype: str = 'application/json'):
+    body, encoding = snap.body, choose_encoding(request, len(snap.body))
+    if encoding:
+        body = snap.encoded(encoding)
+    resp = Response(body, mimetype=mimetype)
+    if encoding:
+        resp.headers['Content-Encoding'] = encoding
+    resp.headers['ETag'] = snap.etag
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.headers['Vary'] = 'Accept, Accept-Encoding'
+    return resp
+
+def _data_filters(args) -> dict:
+    """Filtros de /api/data; symbols es una tupla ordenada (o None = todos) para usarla como clave"""
+    syms = parse_filter(args.get('symbols') or args.get('symbol'), normalize_symbol)
+    tf = str(args.get('timeframe') or '').upper() or None
+    try:
+        limit = int(args.get('limit', FRONTEND_CLOSED_LIMIT))
+    except (TypeError, ValueError):
+        limit = FRONTEND_CLOSED_LIMIT
+    return {
+        'symbols': tuple(sorted(syms)) if syms else None,
+        'timeframe': tf,
+        'limit': max(0, min(limit, MAX_BUFFER_SIZE)),
+        'ticks': _arg_flag(args.get('ticks', args.get('include_ticks'))),
+        'signals': _arg_flag(args.get('signals', args.get('include_signals'))),
+        'format': 'json',
+    }
+
+def _arg_flag(v, default: bool = True) -> bool:
+    if v is None or v == '':
+        return default
+    return str(v).lower() not in ('0', 'false', 'no', 'off')
+
+def _data_payload(source: str, since, cursor: int, flt: dict) -> dict:
+    """Cuerpo de /api/data: completo (since=None) o delta desde `since`; los filtros se aplican antes de copiar"""
     if source == 'mt5':
         ticks_store = tick_data_mt5
         candles_store = candle_data_mt5
@@ -686,35 +1149,76 @@ def get_data():
         ticks_store = tick_data_iq
         candles_store = candle_data_iq
         live_store = live_candle_iq
+    delta = since is not None
 
     recent_ticks = {}
     recent_candles = {}
+    reset_symbols = []
     signals_by_symbol = defaultdict(list)
 
-    for sym, ticks in ticks_store.items():
-        recent_ticks[sym] = list(ticks)[-20:]
-
-    symbols = set(candles_store.keys()) | set(live_store.keys()) | set(stats['active_symbols'])
+    limit, tf = flt['limit'], flt['timeframe']
+    if flt['symbols'] is not None:
+        symbols = set(flt['symbols'])
+    else:
+        symbols = set(candles_store.keys()) | set(live_store.keys()) | set(stats['active_symbols'])
+    if tf:
+        symbols = {sym for sym in symbols if _symbol_timeframe(candles_store.get(sym), live_store.get(sym)) in (tf, None)}
+
+    if flt['ticks']:
+        for sym in symbols:
+            ticks = ticks_store.get(sym)
+            if not ticks:
+                continue
+            recent = list(islice(reversed(ticks), 20))[::-1]
+            if delta:
+                recent = [t for t in recent if t.get('seq', 0) > since]
+                if not recent:
+                    continue
+            recent_ticks[sym] = recent
 
+    # Formatos compactos: columnas t,o,h,l,c,v directamente desde CandleSeries (sin dicts por vela)
+    columnar = flt['format'] != 'json'
     for sym in symbols:
-        closed = sorted(list(candles_store.get(sym, [])), key=lambda x: x.get('unix_time', 0))
-        recent = closed[-FRONTEND_CLOSED_LIMIT:]
+        series = candles_store.get(sym)
+        recent = None
+        if series is not None:
+            with series.lock:
+                if delta:
+                    recent = series.changed_since(since, limit, columns=columnar)
+                    if recent is None:
+                        reset_symbols.append(sym)
+                if recent is None:
+                    recent = series.tail(limit, columns=columnar)
+        else:
+            recent = api_encoding.candle_columns([]) if columnar else []
         live = live_store.get(sym)
-        if live is not None:
-            if recent and recent[-1].get('unix_time') == live.get('unix_time'):
+        if live is not None and (not delta or sym in reset_symbols or live.get('seq', 0) > since):
+            if columnar:
+                api_encoding.merge_live(recent, live)
+            elif recent and recent[-1].get('unix_time') == live.get('unix_time'):
                 recent[-1] = live
             else:
                 recent = recent + [live]
+        if delta and not (recent['t'] if columnar else recent):
+            continue
         recent_candles[sym] = recent
 
-    for s in list(signals_store):
-        sym = s.get('symbol','UNKNOWN')
-        signals_by_symbol[sym].append(s)
-        if len(signals_by_symbol[sym]) > 200:
-            signals_by_symbol[sym] = signals_by_symbol[sym][:200]
+    if flt['signals']:
+        filtered = flt['symbols'] is not None or bool(tf)
+        if delta:
+            # Claves con el symbol tal como llegó (como siempre); el filtro compara el normalizado
+            for s in signals_store.after_seq(since):
+                sym = s.get('symbol', 'UNKNOWN')
+                if (not filtered or normalize_symbol(sym) in symbols) and len(signals_by_symbol[sym]) < signals_store.per_symbol:
+                    signals_by_symbol[sym].append(s)
+        else:
+            signals_by_symbol = signals_store.grouped(symbols if filtered else None)
 
-    return jsonify({
+    payload = {
         "source": source,
+        "mode": "delta" if delta else "full",
+        "cursor": cursor,
+        "epoch": SERVER_EPOCH,
         "ticks_by_symbol": recent_ticks,
         "candles_by_symbol": recent_candles,
         "signals_by_symbol": signals_by_symbol,
@@ -726,7 +1230,48 @@ def get_data():
             "total_candles": stats['total_candles'],
             "total_signals": stats['total_signals']
         }
-    })
+    }
+    if delta:
+        payload["since"] = since
+        payload["reset_symbols"] = reset_symbols
+    return payload
+
+def _symbol_timeframe(series, live):
+    if series is not None and series.timeframe:
+        return series.timeframe
+    return live.get('timeframe') if live else None
+
+def _parse_since(since_arg, epoch_arg, cursor: int):
+    """Cursor válido para delta, o None si corresponde snapshot completo"""
+    if since_arg in (None, ''):
+        return None
+    try:
+        since = int(since_arg)
+    except (TypeError, ValueError):
+        return None
+    if epoch_arg and epoch_arg != SERVER_EPOCH:
+        return None
+    if since < 0 or since > cursor or cursor - since > DELTA_MAX_LAG:
+        return None
+    return since
+
+# ================= /api/stream (Server-Sent Events) =================
+@app.route('/api/stream', methods=['GET'])
+def stream_events():
+    """
+    Canal push: ?symbols=EURUSD,GBPUSD&source=mt5|iq&events=tick,live,candle,history,signal (todos opcionales).
+    Cada evento lleva id = seq; tras un evento 'dropped' o 'history' (importación masiva de una serie)
+    conviene resincronizar con /api/data?since=.
+    """
+    sub = events.subscribe(
+        symbols=parse_filter(request.args.get('symbols'), normalize_symbol),
+        sources=parse_filter(request.args.get('source'), str.lower),
+        events=parse_filter(request.args.get('events'), str.lower),
+        maxlen=STREAM_QUEUE_SIZE,
+    )
+    hello = {"cursor": committed_seq(), "epoch": SERVER_EPOCH}
+    return Response(stream_with_context(events.sse(sub, hello)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 # ================= CSV/YF endpoints (sin cambios esenciales) =================
 @app.route('/api/csv/load', methods=['POST'])
@@ -739,9 +1284,9 @@ def csv_load_into_memory():
         rows = CSV_STORE.read_csv(symbol, timeframe, max_rows=max_rows)
         target = str(p.get('target','mt5')).lower()
         if target == 'iq':
-            loaded, skipped = upsert_candles_into_memory(candle_data_iq, rows)
+            loaded, skipped = bulk_upsert_into_memory(candle_data_iq, rows)
         else:
-            loaded, skipped = upsert_candles_into_memory(candle_data_mt5, rows)
+            loaded, skipped = bulk_upsert_into_memory(candle_data_mt5, rows)
         return jsonify({"status":"success","symbol":symbol,"timeframe":timeframe,"csv_rows_read":len(rows),"loaded_or_replaced":loaded,"skipped":skipped})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -759,7 +1304,7 @@ def csv_sync_from_yf():
         loaded_csv, skipped_csv, candles, err = CSV_STORE.sync_from_yfinance(symbol, timeframe, period=period, start_iso=start, end_iso=end, limit=limit)
         if err and loaded_csv == 0 and not candles:
             return jsonify({"error": err}), 400
-        loaded_mem, skipped_mem = upsert_candles_into_memory(candle_data_mt5, candles)
+        loaded_mem, skipped_mem = bulk_upsert_into_memory(candle_data_mt5, candles)
         return jsonify({"status":"success","symbol":symbol,"timeframe":timeframe,"loaded_to_csv":loaded_csv,"skipped_in_csv":skipped_csv,"loaded_or_replaced_in_memory":loaded_mem,"skipped_in_memory":skipped_mem})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -821,35 +1366,91 @@ def yf_history():
         return jsonify({"error": str(e)}), 500
 
 # ================= Bootstrap =================
-def bootstrap_load_and_sync():
-    for symbol, tf in BOOTSTRAP_PAIRS:
-        try:
-            rows = CSV_STORE.read_csv(symbol, tf, max_rows=500000)
-            upsert_candles_into_memory(candle_data_mt5, rows)
-            logger.info(f"CSV cargado: {symbol} {tf} -> {len(rows)} velas")
+def _bootstrap_update(key: str, **fields):
+    with _bootstrap_lock:
+        bootstrap_state['pairs'][key].update(fields)
+
+def bootstrap_pair(symbol: str, tf: str):
+    """Carga CSV + sync yfinance de un par; registra fase y tiempos en bootstrap_state"""
+    key = f"{symbol}_{tf}"
+    t0 = time.time()
+    try:
+        _bootstrap_update(key, state='csv', started_at=t0)
+        rows = CSV_STORE.read_csv(symbol, tf, max_rows=500000)
+        loaded, _ = bulk_upsert_into_memory(candle_data_mt5, rows)
+        # Histórico subido por el EA (/api/mt5/history)
+        history = load_history_csv(symbol, tf)
+        loaded += bulk_upsert_into_memory(candle_data_mt5, history)[0]
+        t1 = time.time()
+        _bootstrap_update(key, state='sync', csv_rows=len(rows), history_rows=len(history), csv_loaded=loaded, csv_seconds=round(t1 - t0, 3))
+        logger.info(f"CSV cargado: {symbol} {tf} -> {len(rows)} velas")
+
+        loaded_csv, skipped_csv, candles, err = CSV_STORE.sync_from_yfinance(symbol, tf, period='1mo', limit=0)
+        if err and loaded_csv == 0 and not candles:
+            logger.warning(f"YF sync {symbol} {tf} error: {err}")
+            _bootstrap_update(key, sync_error=str(err))
+        else:
+            bulk_upsert_into_memory(candle_data_mt5, candles)
+            logger.info(f"YF sync {symbol} {tf}: csv+{loaded_csv} (skip {skipped_csv}) | total mem {len(candle_data_mt5[symbol])}")
+        t2 = time.time()
+        _bootstrap_update(key, state='done', yf_loaded_to_csv=loaded_csv, yf_candles=len(candles or []),
+                          sync_seconds=round(t2 - t1, 3), total_seconds=round(t2 - t0, 3),
+                          memory_candles=len(candle_data_mt5[symbol]))
+    except Exception as e:
+        logger.warning(f"Bootstrap {symbol} {tf} fallo: {e}")
+        _bootstrap_update(key, state='error', error=str(e), total_seconds=round(time.time() - t0, 3))
 
-            loaded_csv, skipped_csv, candles, err = CSV_STORE.sync_from_yfinance(symbol, tf, period='1mo', limit=0)
-            if err and loaded_csv == 0 and not candles:
-                logger.warning(f"YF sync {symbol} {tf} error: {err}")
-            else:
-                upsert_candles_into_memory(candle_data_mt5, candles)
-                logger.info(f"YF sync {symbol} {tf}: csv+{loaded_csv} (skip {skipped_csv}) | total mem {len(candle_data_mt5[symbol])}")
-        except Exception as e:
-            logger.warning(f"Bootstrap {symbol} {tf} fallo: {e}")
+def bootstrap_load_and_sync():
+    """Bootstrap de todos los pares en un pool acotado (BOOTSTRAP_WORKERS); bloquea hasta terminar"""
+    from concurrent.futures import ThreadPoolExecutor
+    with _bootstrap_lock:
+        bootstrap_state.update(state='running', started_at=time.time(), finished_at=None)
+        bootstrap_state['pairs'] = {f"{s}_{tf}": {'symbol': s, 'timeframe': tf, 'state': 'pending'} for s, tf in BOOTSTRAP_PAIRS}
+    # Series creadas aquí: dos workers del mismo símbolo (distinto TF) no compiten en el defaultdict
+    for symbol, _ in BOOTSTRAP_PAIRS:
+        candle_data_mt5[symbol]
+    with ThreadPoolExecutor(max_workers=max(1, BOOTSTRAP_WORKERS), thread_name_prefix='bootstrap') as pool:
+        for symbol, tf in BOOTSTRAP_PAIRS:
+            pool.submit(bootstrap_pair, symbol, tf)
+    with _bootstrap_lock:
+        bootstrap_state.update(state='done', finished_at=time.time())
+    logger.info(f"Bootstrap completo: {len(BOOTSTRAP_PAIRS)} pares en {bootstrap_state['finished_at'] - bootstrap_state['started_at']:.2f}s")
+
+def start_bootstrap() -> threading.Thread:
+    """Lanza el bootstrap en segundo plano; el servidor sirve lo ya cargado mientras tanto"""
+    th = threading.Thread(target=bootstrap_load_and_sync, name='bootstrap', daemon=True)
+    th.start()
+    return th
+
+@app.route('/api/bootstrap/status', methods=['GET'])
+def bootstrap_status():
+    with _bootstrap_lock:
+        pairs = [dict(p) for p in bootstrap_state['pairs'].values()]
+        state = {k: v for k, v in bootstrap_state.items() if k != 'pairs'}
+    now = time.time()
+    for p in pairs:
+        if p['state'] in ('csv', 'sync') and p.get('started_at'):
+            p['elapsed_seconds'] = round(now - p['started_at'], 3)
+    end = state['finished_at'] or now
+    state['elapsed_seconds'] = round(end - state['started_at'], 3) if state['started_at'] else 0
+    state['done'] = sum(1 for p in pairs if p['state'] in ('done', 'error'))
+    state['total'] = len(pairs)
+    state['pairs'] = pairs
+    return jsonify(state)
 
 def run_https():
     from werkzeug.serving import make_server
     print("🔒 HTTPS 5001")
-    make_server('0.0.0.0', HTTPS_PORT, app, ssl_context='adhoc').serve_forever()
+    make_server('0.0.0.0', HTTPS_PORT, app, threaded=True, ssl_context='adhoc').serve_forever()
 
 def run_http():
     from werkzeug.serving import make_server
     print("🌐 HTTP 5002")
-    make_server('0.0.0.0', HTTP_PORT, app).serve_forever()
+    make_server('0.0.0.0', HTTP_PORT, app, threaded=True).serve_forever()
 
 if __name__ == '__main__':
     print("🚀 STC Server iniciando...")
     load_signals(max_rows=1000)
-    bootstrap_load_and_sync()
+    start_bootstrap()
     threading.Thread(target=run_http, daemon=True).start()
     run_https()
\ No newline at end of file
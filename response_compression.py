@@ -0,0 +1,96 @@
+"""
+STC Trading - Compresión de respuestas HTTP (gzip / deflate / brotli opcional)
+- init_compression(app): after_request que comprime según Accept-Encoding del cliente
+- solo tipos de texto/JSON (y msgpack) por encima de COMPRESS_MIN_BYTES; no toca streams (SSE) ni 304
+- memoiza los cuerpos comprimidos (clave: ETag o hash del cuerpo) para que los sondeos repetidos
+  no vuelvan a comprimir
+"""
+import gzip
+import hashlib
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Optional
+
+# Opcional: brotli
+try:
+    import brotli
+    _BROTLI_AVAILABLE = True
+except Exception:
+    _BROTLI_AVAILABLE = False
+
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', '1024'))
+COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', '6'))
+BROTLI_QUALITY = 5
+MEMO_ENTRIES = 128
+
+COMPRESSIBLE_TYPES = (
+    'text/', 'application/json', 'application/javascript', 'application/vnd.stc.columnar+json',
+    'application/msgpack', 'application/xml', 'image/svg+xml',
+)
+ENCODINGS = (('br', 'gzip', 'deflate') if _BROTLI_AVAILABLE else ('gzip', 'deflate'))
+
+_memo: "OrderedDict[tuple, bytes]" = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=COMPRESS_LEVEL)
+    if encoding == 'deflate':
+        return zlib.compress(body, COMPRESS_LEVEL)
+    return body
+
+
+def choose_encoding(req, size: int) -> Optional[str]:
+    """Mejor codificación aceptada por el cliente (None = sin comprimir / no compensa)"""
+    if size < COMPRESS_MIN_BYTES:
+        return None
+    return req.accept_encodings.best_match(ENCODINGS)
+
+
+def compressed(body: bytes, encoding: str, key: Optional[str] = None) -> bytes:
+    """compress() memoizado; key (p. ej. el ETag) evita tener que hashear el cuerpo"""
+    memo_key = (key or hashlib.blake2b(body, digest_size=16).digest(), encoding)
+    with _memo_lock:
+        out = _memo.get(memo_key)
+        if out is not None:
+            _memo.move_to_end(memo_key)
+            return out
+    out = compress(body, encoding)
+    with _memo_lock:
+        _memo[memo_key] = out
+        while len(_memo) > MEMO_ENTRIES:
+            _memo.popitem(last=False)
+    return out
+
+
+def init_compression(app):
+    """Registra la compresión en una app Flask; las respuestas ya codificadas se dejan tal cual"""
+    from flask import request
+
+    @app.after_request
+    def _compress_response(response):
+        if (response.status_code < 200 or response.status_code in (204, 206, 304)
+                or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers
+                or not (response.mimetype or '').startswith(COMPRESSIBLE_TYPES)):
+            return response
+        # La forma del cuerpo depende de Accept-Encoding aunque esta vez salga sin comprimir
+        # (cuerpo pequeño, cliente sin gzip): una caché intermedia no debe servirla a todos
+        response.vary.add('Accept-Encoding')
+        body = response.get_data()
+        encoding = choose_encoding(request, len(body))
+        if encoding is None:
+            return response
+        out = compressed(body, encoding, response.headers.get('ETag'))
+        if len(out) >= len(body):
+            return response
+        response.set_data(out)
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    return app
@@ -0,0 +1,165 @@
+"""
+STC Trading - Índice de señales en memoria
+- orden de llegada (id, seq y created_unix crecientes) en listas paralelas: búsqueda binaria
+  por id, cursor de secuencia o ventana de tiempo
+- cola acotada por símbolo (las más recientes) y mapa id -> señal
+- todo se actualiza al insertar; las consultas cuestan O(log n + k)
+"""
+import threading
+from bisect import bisect_left, bisect_right
+from collections import defaultdict, deque
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+SIGNALS_MAX = 1000
+SIGNALS_PER_SYMBOL = 200
+
+
+class SignalIndex:
+    def __init__(self, maxlen: int = SIGNALS_MAX, per_symbol: int = SIGNALS_PER_SYMBOL,
+                 key: Callable[[str], str] = lambda s: s):
+        self.maxlen = maxlen
+        self.per_symbol = per_symbol
+        self.key = key
+        self.lock = threading.RLock()
+        # Ventana viva: posiciones [_start, len) de las listas paralelas
+        self._start = 0
+        self._items: List[Dict] = []
+        self._ids: List[int] = []
+        self._seqs: List[int] = []
+        self._times: List[float] = []
+        self._by_id: Dict[int, Dict] = {}
+        self._by_symbol: Dict[str, deque] = defaultdict(lambda: deque(maxlen=self.per_symbol))
+
+    def __len__(self) -> int:
+        return len(self._items) - self._start
+
+    def __iter__(self) -> Iterator[Dict]:
+        """De la más nueva a la más antigua (mismo orden que el antiguo deque con appendleft)"""
+        with self.lock:
+            items = self._items[self._start:]
+        return reversed(items)
+
+    def add(self, sig: Dict):
+        with self.lock:
+            n = len(self._items)
+            # Los índices requieren orden no decreciente: una señal fuera de orden se indexa con el último valor
+            sid = max(int(sig.get('id') or 0), self._ids[-1] if n > self._start else 0)
+            seq = max(int(sig.get('seq') or 0), self._seqs[-1] if n > self._start else 0)
+            ts = max(float(sig.get('created_unix') or 0.0), self._times[-1] if n > self._start else 0.0)
+            self._items.append(sig)
+            self._ids.append(sid)
+            self._seqs.append(seq)
+            self._times.append(ts)
+            if sig.get('id') is not None:
+                self._by_id[int(sig['id'])] = sig
+            self._by_symbol[self.key(sig.get('symbol', 'UNKNOWN'))].append(sig)
+            if len(self) > self.maxlen:
+                self._evict()
+
+    def _evict(self):
+        old = self._items[self._start]
+        if old.get('id') is not None and self._by_id.get(int(old['id'])) is old:
+            del self._by_id[int(old['id'])]
+        k = self.key(old.get('symbol', 'UNKNOWN'))
+        dq = self._by_symbol.get(k)
+        if dq and dq[0] is old:
+            dq.popleft()
+            if not dq:
+                del self._by_symbol[k]
+        self._start += 1
+        # Compactación amortizada de las listas paralelas
+        if self._start > self.maxlen:
+            s = self._start
+            self._items, self._ids = self._items[s:], self._ids[s:]
+            self._seqs, self._times = self._seqs[s:], self._times[s:]
+            self._start = 0
+
+    def get(self, sig_id: int) -> Optional[Dict]:
+        return self._by_id.get(int(sig_id))
+
+    def latest(self, limit: int) -> List[Dict]:
+        with self.lock:
+            lo = max(self._start, len(self._items) - max(0, limit))
+            return self._items[lo:][::-1]
+
+    def by_symbol(self, symbol: str, limit: Optional[int] = None) -> List[Dict]:
+        with self.lock:
+            dq = self._by_symbol.get(self.key(symbol))
+            if not dq:
+                return []
+            out = list(dq)[::-1]
+        return out if limit is None else out[:limit]
+
+    def grouped(self, symbols: Optional[Iterable[str]] = None) -> Dict[str, List[Dict]]:
+        """
+        symbol tal como llegó en la señal -> señales (más nueva primero), acotado a per_symbol por
+        clave; `symbols` filtra por símbolo normalizado. Mismas claves que el antiguo /api/data
+        """
+        with self.lock:
+            keys = list(self._by_symbol.keys()) if symbols is None else {self.key(s) for s in symbols}
+            dqs = [list(self._by_symbol[k]) for k in keys if self._by_symbol.get(k)]
+        out: Dict[str, List[Dict]] = {}
+        for dq in dqs:
+            for sig in reversed(dq):
+                group = out.setdefault(sig.get('symbol', 'UNKNOWN'), [])
+                if len(group) < self.per_symbol:
+                    group.append(sig)
+        return out
+
+    def after_seq(self, seq: int) -> List[Dict]:
+        """Señales con seq > `seq` (más nueva primero)"""
+        with self.lock:
+            i = bisect_right(self._seqs, seq, lo=self._start)
+            return self._items[i:][::-1]
+
+    def page(self, limit: int = 50, before_id: Optional[int] = None, after_id: Optional[int] = None,
+             since: Optional[float] = None, until: Optional[float] = None,
+             symbol: Optional[str] = None) -> Tuple[List[Dict], Optional[int]]:
+        """
+        Página de señales, de la más nueva a la más antigua, con id < before_id / id > after_id
+        y created_unix en [since, until]. Devuelve (señales, cursor) con cursor = before_id de la
+        página siguiente, o None si no hay más.
+        """
+        limit = max(0, limit)
+        with self.lock:
+            lo, hi = self._start, len(self._items)
+            if after_id is not None:
+                lo = max(lo, bisect_right(self._ids, int(after_id), lo=self._start))
+            if since is not None:
+                lo = max(lo, bisect_left(self._times, float(since), lo=self._start))
+            if before_id is not None:
+                hi = min(hi, bisect_left(self._ids, int(before_id), lo=self._start))
+            if until is not None:
+                hi = min(hi, bisect_right(self._times, float(until), lo=self._start))
+            if symbol is None:
+                start = max(lo, hi - limit)
+                out = self._items[start:hi][::-1]
+                return out, (self._ids[start] if start > lo and out else None)
+
+            # Por símbolo: primero su cola (acotada a per_symbol)
+            key = self.key(symbol)
+            dq = self._by_symbol.get(key) or ()
+            out, done = [], len(dq) < self.per_symbol
+            for sig in reversed(dq):
+                sid, ts = int(sig.get('id') or 0), float(sig.get('created_unix') or 0.0)
+                if (before_id is not None and sid >= int(before_id)) or (until is not None and ts > float(until)):
+                    continue
+                if (after_id is not None and sid <= int(after_id)) or (since is not None and ts < float(since)):
+                    done = True
+                    break
+                if len(out) == limit:
+                    return out, int(out[-1].get('id') or 0) if out else None
+                out.append(sig)
+            if done:
+                return out, None
+            # Cola llena y agotada: puede haber señales más antiguas del símbolo en la ventana global
+            out, more = [], False
+            for i in range(hi - 1, lo - 1, -1):
+                sig = self._items[i]
+                if self.key(sig.get('symbol', 'UNKNOWN')) != key:
+                    continue
+                if len(out) == limit:
+                    more = True
+                    break
+                out.append(sig)
+        return out, (int(out[-1].get('id') or 0) if more and out else None)
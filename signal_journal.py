@@ -0,0 +1,327 @@
+"""
+STC Trading - Diario de señales (append-only, segmentado e indexado)
+- segmentos signals-NNNNNN.jsonl que rotan cada SEGMENT_RECORDS registros
+- índice lateral signals-NNNNNN.idx: (id, created_unix, offset) cada INDEX_EVERY registros
+- escritura agrupada: append() solo encola; un hilo escribe el lote, hace flush y un único fsync
+- arranque: tail(n) lee solo los últimos segmentos; get(id) / range() buscan por índice sin cargar todo
+"""
+import atexit
+import json
+import logging
+import os
+import re
+import struct
+import threading
+import time
+from bisect import bisect_right
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger("stc-server")
+
+SEGMENT_RECORDS = 10000
+INDEX_EVERY = 64
+FLUSH_INTERVAL = 0.2
+FSYNC = True
+
+_IDX = struct.Struct('<qdq')  # id, created_unix, offset del registro en el segmento
+_SEGMENT_RE = re.compile(r'^signals-(\d{6})\.jsonl$')
+
+
+class _Segment:
+    __slots__ = ('no', 'path', 'idx_path', 'index', 'records', 'size')
+
+    def __init__(self, directory: str, no: int):
+        self.no = no
+        self.path = os.path.join(directory, f"signals-{no:06d}.jsonl")
+        self.idx_path = os.path.join(directory, f"signals-{no:06d}.idx")
+        self.index: List[Tuple[int, float, int]] = []
+        self.records = 0
+        self.size = 0
+
+
+class SignalJournal:
+    def __init__(self, directory: str, legacy_file: Optional[str] = None,
+                 segment_records: int = SEGMENT_RECORDS, index_every: int = INDEX_EVERY,
+                 flush_interval: float = FLUSH_INTERVAL, fsync: bool = FSYNC):
+        self.directory = directory
+        self.segment_records = segment_records
+        self.index_every = index_every
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.RLock()         # estado de segmentos / escritura
+        self._cond = threading.Condition(threading.Lock())  # cola pendiente
+        self._pending: List[Dict] = []
+        self._segments: List[_Segment] = []
+        self._fh = None
+        self._idx_fh = None
+        self._closed = False
+        self._open_segments()
+        if legacy_file and os.path.isfile(legacy_file):
+            self._import_legacy(legacy_file)
+        self._thread = threading.Thread(target=self._writer, name='signal-journal', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # ---------- escritura ----------
+    def append(self, sig: Dict):
+        """Encola la señal; el hilo escritor la persiste en el siguiente commit de grupo"""
+        with self._cond:
+            self._pending.append(sig)
+            self._cond.notify()
+
+    def flush(self):
+        """Persiste ya todo lo pendiente (flush + fsync)"""
+        with self._lock:
+            with self._cond:
+                batch, self._pending = self._pending, []
+            if batch:
+                self._commit(batch)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        with self._cond:
+            self._cond.notify()
+        self.flush()
+        with self._lock:
+            for fh in (self._fh, self._idx_fh):
+                if fh is not None:
+                    fh.close()
+            self._fh = self._idx_fh = None
+
+    def _writer(self):
+        while not self._closed:
+            with self._cond:
+                if not self._pending:
+                    self._cond.wait()
+            # Ventana de agrupación: las señales que lleguen mientras tanto van en el mismo fsync
+            if self.flush_interval:
+                time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"signal journal: {e}")
+
+    def _commit(self, batch: List[Dict]):
+        with self._lock:
+            for sig in batch:
+                seg = self._segments[-1]
+                if seg.records >= self.segment_records:
+                    self._sync_files()
+                    seg = self._new_segment()
+                if self._fh is None:
+                    self._open_files(seg)
+                line = (json.dumps(sig, ensure_ascii=False) + "\n").encode('utf-8')
+                if seg.records % self.index_every == 0:
+                    entry = (int(sig.get('id') or 0), float(sig.get('created_unix') or 0.0), seg.size)
+                    seg.index.append(entry)
+                    self._idx_fh.write(_IDX.pack(*entry))
+                self._fh.write(line)
+                seg.size += len(line)
+                seg.records += 1
+            self._sync_files()
+
+    def _sync_files(self):
+        # Datos antes que índice: un índice nunca apunta más allá de lo escrito
+        for fh in (self._fh, self._idx_fh):
+            if fh is not None:
+                fh.flush()
+                if self.fsync:
+                    os.fsync(fh.fileno())
+
+    def _new_segment(self) -> _Segment:
+        for fh in (self._fh, self._idx_fh):
+            if fh is not None:
+                fh.close()
+        self._fh = self._idx_fh = None
+        seg = _Segment(self.directory, self._segments[-1].no + 1 if self._segments else 1)
+        self._segments.append(seg)
+        return seg
+
+    def _open_files(self, seg: _Segment):
+        self._fh = open(seg.path, 'ab')
+        self._idx_fh = open(seg.idx_path, 'ab')
+
+    # ---------- apertura / recuperación ----------
+    def _open_segments(self):
+        nos = sorted(int(m.group(1)) for m in (_SEGMENT_RE.match(f) for f in os.listdir(self.directory)) if m)
+        for no in nos:
+            seg = _Segment(self.directory, no)
+            seg.index = _read_index(seg.idx_path)
+            seg.size = os.path.getsize(seg.path)
+            if not seg.index and seg.size:
+                self._rebuild_index(seg)
+            else:
+                seg.records = self._count_records(seg)
+            self._segments.append(seg)
+        if not self._segments:
+            self._new_segment()
+            return
+        self._recover(self._segments[-1])
+
+    def _recover(self, seg: _Segment):
+        """Último segmento: corta una línea a medias y recuenta registros desde la última entrada del índice"""
+        # Entradas del índice por delante de los datos (caída entre escrituras) se descartan
+        valid = [e for e in seg.index if e[2] < seg.size]
+        with open(seg.path, 'rb+') as f:
+            start = valid[-1][2] if valid else 0
+            f.seek(start)
+            tail = f.read()
+            cut = tail.rfind(b'\n') + 1
+            if cut < len(tail):
+                f.truncate(start + cut)
+                seg.size = start + cut
+        valid = [e for e in valid if e[2] < seg.size]
+        if len(valid) != len(seg.index):
+            seg.index = valid
+            _rewrite_index(seg.idx_path, valid)
+        seg.records = self._count_records(seg)
+
+    def _count_records(self, seg: _Segment) -> int:
+        """Bloques completos indexados + registros legibles desde la última entrada del índice"""
+        start = seg.index[-1][2] if seg.index else 0
+        after = len(_read_lines(seg.path, start)) if seg.size else 0
+        return (len(seg.index) - 1) * self.index_every + after if seg.index else after
+
+    def _rebuild_index(self, seg: _Segment):
+        """Índice perdido: se regenera recorriendo el segmento una vez (las líneas ilegibles no cuentan)"""
+        offset, records, entries = 0, 0, []
+        with open(seg.path, 'rb') as f:
+            for ln in f:
+                try:
+                    sig = json.loads(ln)
+                except Exception:
+                    sig = None
+                if sig is not None:
+                    if records % self.index_every == 0:
+                        entries.append((int(sig.get('id') or 0), float(sig.get('created_unix') or 0.0), offset))
+                    records += 1
+                offset += len(ln)
+        seg.index = entries
+        seg.records = records
+        _rewrite_index(seg.idx_path, entries)
+
+    def _import_legacy(self, path: str):
+        """Migra el antiguo _signals.jsonl (una sola vez, en streaming) y lo renombra"""
+        n = 0
+        batch: List[Dict] = []
+        with open(path, 'r', encoding='utf-8') as f:
+            for ln in f:
+                try:
+                    batch.append(json.loads(ln))
+                except Exception:
+                    continue
+                if len(batch) >= 5000:
+                    self._commit(batch)
+                    n += len(batch)
+                    batch = []
+        if batch:
+            self._commit(batch)
+            n += len(batch)
+        os.replace(path, path + '.migrated')
+        logger.info(f"📦 Señales migradas al diario: {n}")
+
+    # ---------- lectura ----------
+    def tail(self, n: int) -> List[Dict]:
+        """Últimas n señales en orden de llegada; solo lee los segmentos necesarios desde el final"""
+        self.flush()
+        out: List[Dict] = []
+        with self._lock:
+            segs = list(self._segments)
+        for seg in reversed(segs):
+            if len(out) >= n:
+                break
+            need = n - len(out)
+            start = 0
+            if seg.records > need and seg.index:
+                # Salta al bloque indexado que contiene el registro records-need
+                k = min((seg.records - need) // self.index_every, len(seg.index) - 1)
+                start = seg.index[k][2]
+            rows = _read_lines(seg.path, start)
+            out = rows[-need:] + out
+        return out[-n:] if n else []
+
+    def get(self, sig_id: int) -> Optional[Dict]:
+        for sig in self._scan(key=0, value=int(sig_id)):
+            sid = int(sig.get('id') or 0)
+            if sid == sig_id:
+                return sig
+            if sid > sig_id:
+                break
+        return None
+
+    def range(self, since: Optional[float] = None, until: Optional[float] = None,
+              after_id: Optional[int] = None, limit: int = 500) -> List[Dict]:
+        """Señales con created_unix en [since, until] e id > after_id, en orden de llegada"""
+        out: List[Dict] = []
+        if after_id is not None:
+            it = self._scan(key=0, value=int(after_id))
+        else:
+            it = self._scan(key=1, value=float(since or 0.0))
+        for sig in it:
+            ts = float(sig.get('created_unix') or 0.0)
+            if until is not None and ts > until:
+                break
+            if (since is not None and ts < since) or (after_id is not None and int(sig.get('id') or 0) <= after_id):
+                continue
+            out.append(sig)
+            if len(out) >= limit:
+                break
+        return out
+
+    def _scan(self, key: int, value):
+        """Itera desde el bloque indexado anterior a `value` (key 0 = id, 1 = tiempo) hacia delante"""
+        self.flush()
+        with self._lock:
+            segs = [s for s in self._segments if s.index]
+        firsts = [s.index[0][key] for s in segs]
+        si = max(0, bisect_right(firsts, value) - 1)
+        for j, seg in enumerate(segs[si:]):
+            start = 0
+            if j == 0:
+                keys = [e[key] for e in seg.index]
+                k = max(0, bisect_right(keys, value) - 1)
+                start = seg.index[k][2]
+            with open(seg.path, 'rb') as f:
+                f.seek(start)
+                for ln in f:
+                    try:
+                        yield json.loads(ln)
+                    except Exception:
+                        continue
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"segments": len(self._segments), "records_last_segment": self._segments[-1].records,
+                    "pending": len(self._pending)}
+
+
+def _read_index(path: str) -> List[Tuple[int, float, int]]:
+    if not os.path.isfile(path):
+        return []
+    with open(path, 'rb') as f:
+        data = f.read()
+    usable = len(data) - len(data) % _IDX.size
+    return [_IDX.unpack_from(data, i) for i in range(0, usable, _IDX.size)]
+
+
+def _rewrite_index(path: str, entries: List[Tuple[int, float, int]]):
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        for e in entries:
+            f.write(_IDX.pack(*e))
+    os.replace(tmp, path)
+
+
+def _read_lines(path: str, start: int) -> List[Dict]:
+    out = []
+    with open(path, 'rb') as f:
+        f.seek(start)
+        for ln in f:
+            try:
+                out.append(json.loads(ln))
+            except Exception:
+                continue
+    return out
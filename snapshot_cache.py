@@ -0,0 +1,86 @@
+"""
+STC Trading - Caché de snapshots versionados (/api/data)
+- una versión por fuente (mt5 | iq), incrementada en cada ingesta (bump)
+- la entrada (fuente, símbolos, límite) guarda el cuerpo ya codificado y, bajo demanda, sus versiones
+  comprimidas (gzip / deflate / br, ver response_compression): una compresión por versión y codificación
+- ETag = época del servidor + versión + clave: un sondeo sin cambios responde 304 sin serializar nada
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable
+
+from response_compression import compress
+
+SNAPSHOT_CACHE_ENTRIES = 64
+
+
+class Snapshot:
+    __slots__ = ('etag', 'version', 'body', '_encoded', '_lock')
+
+    def __init__(self, etag: str, version: int, body: bytes):
+        self.etag = etag
+        self.version = version
+        self.body = body
+        self._encoded: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def encoded(self, encoding: str) -> bytes:
+        """Cuerpo comprimido con `encoding` (se comprime una sola vez por versión)"""
+        out = self._encoded.get(encoding)
+        if out is None:
+            with self._lock:
+                out = self._encoded.get(encoding)
+                if out is None:
+                    out = self._encoded[encoding] = compress(self.body, encoding)
+        return out
+
+
+class SnapshotCache:
+    def __init__(self, epoch: str, max_entries: int = SNAPSHOT_CACHE_ENTRIES):
+        self.epoch = epoch
+        self.max_entries = max_entries
+        self._versions: Dict[str, int] = {}
+        self._entries: "OrderedDict[Hashable, Snapshot]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def bump(self, *sources: str):
+        with self._lock:
+            for src in sources:
+                self._versions[src] = self._versions.get(src, 0) + 1
+
+    def version(self, source: str) -> int:
+        return self._versions.get(source, 0)
+
+    def etag(self, source: str, key: Hashable) -> str:
+        """ETag de la versión actual (para If-None-Match sin tocar la caché)"""
+        return self._etag(source, self.version(source), key)
+
+    def _etag(self, source: str, version: int, key: Hashable) -> str:
+        digest = hashlib.blake2s(repr(key).encode(), digest_size=6).hexdigest()
+        return f'"{self.epoch}-{source}-{version}-{digest}"'
+
+    def get(self, source: str, key: Hashable, build: Callable[[], bytes]) -> Snapshot:
+        """Snapshot vigente para la clave; si la versión cambió, lo reconstruye con build()"""
+        # La versión se lee antes de construir: una ingesta concurrente deja la entrada ya obsoleta
+        version = self.version(source)
+        with self._lock:
+            snap = self._entries.get(key)
+            if snap is not None and snap.version == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return snap
+            self.misses += 1
+        snap = Snapshot(self._etag(source, version, key), version, build())
+        with self._lock:
+            self._entries[key] = snap
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return snap
+
+    def stats(self) -> Dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                "versions": dict(self._versions)}
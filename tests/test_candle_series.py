@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Tests de CandleSeries: prioridad de fuentes, backfill, desalojo por capacidad, reenvíos idénticos
+y un modelo de referencia (dict) contra upsert / merge_columns aleatorios
+Uso: python -m pytest -q tests/test_candle_series.py
+"""
+import itertools
+import random
+
+import pytest
+
+from candle_series import CandleSeries, source_codes
+
+PRIORITY = {'ea': 4, 'mt5': 4, 'csv': 3, 'yfinance': 2, 'iq': 1}
+
+
+def priority(src):
+    return PRIORITY.get((src or '').lower(), 0)
+
+
+def make_series(capacity=100):
+    counter = itertools.count(1)
+    return CandleSeries(capacity, priority, lambda: next(counter))
+
+
+def bar(ut, price=1.0, source='ea', closed=True):
+    return {'unix_time': ut, 'open': price, 'high': price, 'low': price, 'close': price, 'volume': price,
+            'source': source, 'closed': closed}
+
+
+def merge(series, times, prices, sources, **kw):
+    return series.merge_columns(times, {col: prices for col in CandleSeries.PRICE_COLUMNS},
+                                source_codes(sources), **kw)
+
+
+def snapshot(series):
+    return [(c['unix_time'], c['close'], c['source']) for c in series.tail(len(series))]
+
+
+def test_priority_ties_keep_the_latest_write():
+    s = make_series()
+    assert s.upsert(bar(10, 1.0, 'ea'))
+    assert s.upsert(bar(10, 2.0, 'mt5'))          # misma prioridad: gana la última
+    assert not s.upsert(bar(10, 3.0, 'csv'))      # menor prioridad: se rechaza
+    assert snapshot(s) == [(10, 2.0, 'mt5')]
+    # Dentro de un lote: mayor prioridad y, a igualdad, la última del lote
+    assert merge(s, [20, 20, 20], [1.0, 2.0, 3.0], ['csv', 'ea', 'mt5'], detailed=True)[:3] == (1, 0, 2)
+    assert snapshot(s)[-1] == (20, 3.0, 'mt5')
+    assert merge(s, [10], [4.0], ['iq'], detailed=True)[:3] == (0, 0, 1)
+    assert snapshot(s)[0] == (10, 2.0, 'mt5')
+
+
+def test_backfill_shifts_the_tail_in_order():
+    s = make_series()
+    for ut in (10, 30, 40):
+        s.upsert(bar(ut))
+    seq = s.seq
+    assert s.upsert(bar(20, 5.0))
+    assert s.upsert(bar(5, 6.0))
+    assert [t for t, _, _ in snapshot(s)] == [5, 10, 20, 30, 40]
+    assert [c['unix_time'] for c in s.changed_since(seq, 10)] == [5, 20]
+
+
+def test_eviction_at_capacity_drops_the_oldest():
+    s = make_series(capacity=3)
+    for ut in range(1, 6):
+        s.upsert(bar(ut))
+    assert [t for t, _, _ in snapshot(s)] == [3, 4, 5]
+    s.upsert(bar(1))                                   # más antigua que la ventana llena: no queda
+    assert [t for t, _, _ in snapshot(s)] == [3, 4, 5]
+    merge(s, [2, 6, 7], [1.0] * 3, ['ea'] * 3)
+    assert [t for t, _, _ in snapshot(s)] == [5, 6, 7]
+
+
+def test_identical_resend_is_skipped_without_new_seq():
+    s = make_series()
+    merge(s, [1, 2, 3], [1.0, 1.0, 1.0], ['ea'] * 3)
+    seq = s.seq
+    inserted, replaced, skipped, written = merge(s, [1, 2, 3], [1.0, 1.0, 1.0], ['ea'] * 3, detailed=True)
+    assert (inserted, replaced, skipped, len(written)) == (0, 0, 3, 0)
+    assert s.seq == seq and s.changed_since(seq, 10) == []
+    # Mismo OHLCV pero otra fuente o estado: sí es un reemplazo
+    assert merge(s, [1, 2], [1.0, 1.0], ['mt5', 'ea'], closed=[1, 0], detailed=True)[:3] == (0, 2, 0)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_matches_dict_reference_model(seed):
+    rng = random.Random(seed)
+    sources = list(PRIORITY) + [None]
+    for _ in range(40):
+        capacity = rng.randint(1, 40)
+        s = make_series(capacity)
+        ref = {}  # unix_time -> (close, source)
+        for _ in range(60):
+            if rng.random() < 0.5:
+                ut, src, p = rng.randint(0, 80), rng.choice(sources), float(rng.randint(0, 3))
+                s.upsert(bar(ut, p, src))
+                if ut not in ref or priority(src) >= priority(ref[ut][1]):
+                    ref[ut] = (p, (src or '').lower())
+            else:
+                n = rng.randint(1, 10)
+                batch = [(rng.randint(0, 80), rng.choice(sources[:-1]), float(rng.randint(0, 3))) for _ in range(n)]
+                merge(s, [b[0] for b in batch], [b[2] for b in batch], [b[1] for b in batch])
+                best = {}
+                for ut, src, p in batch:
+                    if ut not in best or priority(src) >= priority(best[ut][1]):
+                        best[ut] = (p, src)
+                for ut, (p, src) in best.items():
+                    if ut not in ref or priority(src) >= priority(ref[ut][1]):
+                        ref[ut] = (p, src)
+            for ut in sorted(ref)[:-capacity]:
+                del ref[ut]
+            assert snapshot(s) == [(ut, ref[ut][0], ref[ut][1]) for ut in sorted(ref)]
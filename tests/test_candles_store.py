@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Tests de CandlesStore: deduplicación, relleno de huecos, reapertura y compactación
+Uso: python -m pytest -q tests/test_candles_store.py
+"""
+import csv
+import threading
+
+import pytest
+
+import candles_store
+from candles_store import CandlesStore
+
+H1 = 3600
+T0 = 1577836800  # 2020-01-01 00:00 UTC
+
+
+def bar(i, close=1.0):
+    return {'time': T0 + i * H1, 'open': 1.0, 'high': 2.0, 'low': 0.5, 'close': close, 'volume': 10}
+
+
+def csv_times(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return [int(rec['timestamp']) for rec in csv.DictReader(f)]
+
+
+@pytest.fixture(autouse=True)
+def write_through(monkeypatch):
+    monkeypatch.setattr(candles_store, 'FLUSH_INTERVAL', 0)
+
+
+def test_gap_inside_window_is_inserted_in_order(tmp_path):
+    store = CandlesStore(str(tmp_path), partition=None)
+    store.store_batch('EURUSD', 'H1', [bar(i) for i in (0, 1, 2, 4, 5)])
+    info = store.store_batch('EURUSD', 'H1', [bar(3)])
+    assert (info['inserted'], info['replaced'], info['skipped']) == (1, 0, 0)
+    assert csv_times(store.get_csv_filename('EURUSD', 'H1')) == [T0 + i * H1 for i in range(6)]
+    assert [c['time'] for c in store.read_last('EURUSD', 'H1', 10)] == [T0 + i * H1 for i in range(6)]
+
+
+def test_replace_and_identical_rows(tmp_path):
+    store = CandlesStore(str(tmp_path), partition=None)
+    store.store_batch('EURUSD', 'H1', [bar(i) for i in range(5)])
+    info = store.store_batch('EURUSD', 'H1', [bar(3, close=1.5), bar(4), bar(5)])
+    assert (info['inserted'], info['replaced'], info['skipped']) == (1, 1, 1)
+    candles = store.read_last('EURUSD', 'H1', 10)
+    assert [c['time'] for c in candles] == [T0 + i * H1 for i in range(6)]
+    assert candles[3]['close'] == 1.5
+    info = store.store_batch('EURUSD', 'H1', [bar(i) for i in range(3)])
+    assert (info['inserted'], info['replaced'], info['skipped'], info['csv_written']) == (0, 0, 3, False)
+
+
+def test_gap_older_than_window_rewrites_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(candles_store, 'RECENT_INDEX_ROWS', 3)
+    store = CandlesStore(str(tmp_path), partition=None)
+    store.store_batch('EURUSD', 'H1', [bar(i) for i in range(10) if i != 2])
+    info = store.store_batch('EURUSD', 'H1', [bar(2), bar(8, close=3.0)])
+    assert (info['inserted'], info['replaced']) == (1, 1)
+    assert csv_times(store.get_csv_filename('EURUSD', 'H1')) == [T0 + i * H1 for i in range(10)]
+    assert store.read_last('EURUSD', 'H1', 2)[0]['close'] == 3.0
+
+
+def test_reopen_deduplicates_against_file(tmp_path):
+    store = CandlesStore(str(tmp_path), partition=None)
+    store.store_batch('EURUSD', 'H1', [bar(i) for i in range(5)])
+    store.close()
+    reopened = CandlesStore(str(tmp_path), partition=None)
+    info = reopened.store_batch('EURUSD', 'H1', [bar(i) for i in range(3, 7)])
+    assert (info['inserted'], info['skipped']) == (2, 2)
+    reopened.close()
+    assert csv_times(reopened.get_csv_filename('EURUSD', 'H1')) == [T0 + i * H1 for i in range(7)]
+
+
+def test_compaction_keeps_rows_readable(tmp_path):
+    store = CandlesStore(str(tmp_path), partition='day')
+    store.store_batch('EURUSD', 'H1', [bar(i) for i in range(48)])
+    info = store.compact('EURUSD', 'H1', older_than_days=1)
+    assert info['compacted'] == ['2020-01-01', '2020-01-02']
+    assert len(store.read_range('EURUSD', 'H1', T0, T0 + 48 * H1)) == 48
+    assert [c['time'] for c in store.read_last('EURUSD', 'H1', 30)] == [T0 + i * H1 for i in range(18, 48)]
+    store.close()
+    reopened = CandlesStore(str(tmp_path), partition='day')
+    assert len(reopened.read_range('EURUSD', 'H1', T0, T0 + 48 * H1)) == 48
+
+
+def test_second_writer_rows_survive_in_place_replace(tmp_path):
+    a = CandlesStore(str(tmp_path), partition=None)
+    b = CandlesStore(str(tmp_path), partition=None)
+    a.store_batch('EURUSD', 'H1', [bar(i) for i in range(5)])
+    b.store_batch('EURUSD', 'H1', [bar(i) for i in range(5, 8)])
+    info = a.store_batch('EURUSD', 'H1', [bar(3, close=1.5)])
+    assert info['replaced'] == 1
+    a.close()
+    b.close()
+    assert csv_times(a.get_csv_filename('EURUSD', 'H1')) == [T0 + i * H1 for i in range(8)]
+
+
+def test_pending_rows_follow_a_rewritten_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(candles_store, 'RECENT_INDEX_ROWS', 3)
+    a = CandlesStore(str(tmp_path), partition=None)
+    b = CandlesStore(str(tmp_path), partition=None)
+    a.store_batch('EURUSD', 'H1', [bar(i) for i in range(10) if i != 1])
+    b.store_batch('EURUSD', 'H1', [bar(1)])  # reescritura completa (os.replace)
+    a.store_batch('EURUSD', 'H1', [bar(10)])
+    a.close()
+    b.close()
+    assert csv_times(a.get_csv_filename('EURUSD', 'H1')) == [T0 + i * H1 for i in range(11)]
+
+
+def test_external_compaction_is_seen_by_running_store(tmp_path):
+    server = CandlesStore(str(tmp_path), partition='day')
+    bars = [bar(i) for i in range(12, 60)]  # 48 velas H1 repartidas en 3 días
+    server.store_batch('EURUSD', 'H1', bars)
+    assert len(server.read_range('EURUSD', 'H1', T0, T0 + 60 * H1)) == 48
+
+    job = CandlesStore(str(tmp_path), partition='day')  # python candles_store.py en otro proceso
+    assert job.compact('EURUSD', 'H1', older_than_days=1)['compacted'] == ['2020-01-01', '2020-01-02', '2020-01-03']
+    job.close()
+
+    assert len(server.read_range('EURUSD', 'H1', T0, T0 + 60 * H1)) == 48
+    info = server.store_batch('EURUSD', 'H1', [bar(12, close=1.5), bar(60)])
+    assert (info['inserted'], info['replaced']) == (1, 1)
+    server.close()
+
+    series_dir = server.get_series_dir('EURUSD', 'H1')
+    assert sorted(p.name for p in tmp_path.joinpath(series_dir).iterdir()) == [
+        '2020-01-01.cbk', '2020-01-02.cbk', '2020-01-03.cbk', 'manifest.json']
+    reader = CandlesStore(str(tmp_path), partition='day')
+    candles = reader.read_range('EURUSD', 'H1', T0, T0 + 61 * H1)
+    assert [c['time'] for c in candles] == [T0 + i * H1 for i in range(12, 61)]
+    assert candles[0]['close'] == 1.5
+    assert reader.store_batch('EURUSD', 'H1', [bar(12, close=1.5)])['skipped'] == 1
+
+
+def test_binary_backend_matches_csv_result_keys(tmp_path):
+    pytest.importorskip('numpy')
+    store = candles_store.BinaryCandlesStore(str(tmp_path / 'bin'))
+    assert store.store_batch('EURUSD', 'H1', [bar(i) for i in (0, 1, 2, 4)]) == {
+        'inserted': 4, 'replaced': 0, 'skipped': 0, 'size': 4, 'csv_written': True}
+    info = store.store_batch('EURUSD', 'H1', [bar(1), bar(2, close=1.5), bar(3)])
+    assert (info['inserted'], info['replaced'], info['skipped'], info['csv_written']) == (1, 1, 1, True)
+    info = store.store_batch('EURUSD', 'H1', [bar(0), bar(1)])
+    assert (info['inserted'], info['replaced'], info['skipped'], info['csv_written']) == (0, 0, 2, False)
+    candles = store.read_last('EURUSD', 'H1', 10)
+    assert [c['time'] for c in candles] == [T0 + i * H1 for i in range(5)]
+    assert candles[2]['close'] == 1.5
+
+
+def test_binary_concurrent_writers_keep_columns_aligned(tmp_path):
+    pytest.importorskip('numpy')
+    stores = [candles_store.BinaryCandlesStore(str(tmp_path / 'bin')) for _ in range(2)]
+
+    def writer(k):
+        for i in range(k, 200, 2):
+            stores[k].store_batch('EURUSD', 'H1', [bar(i, close=float(i)), bar(max(0, i - 3), close=float(i))])
+
+    threads = [threading.Thread(target=writer, args=(k,)) for k in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    series_dir = tmp_path / 'bin' / 'EURUSD_H1'
+    assert {(series_dir / f'{col}.bin').stat().st_size for col, _ in candles_store.BINARY_COLUMNS} == {200 * 8}
+    assert [c['time'] for c in stores[0].read_range('EURUSD', 'H1', T0, T0 + 300 * H1)] == [T0 + i * H1 for i in range(200)]
+
+
+def test_get_store_binary_backend_imports_csv(tmp_path):
+    pytest.importorskip('numpy')
+    CandlesStore(str(tmp_path), partition=None).store_batch('EURUSD', 'H1', [bar(i) for i in range(3)])
+    store = candles_store.get_store(str(tmp_path), backend='binary')
+    assert isinstance(store, candles_store.BinaryCandlesStore)
+    assert candles_store.get_store(str(tmp_path), backend='binary') is store
+    assert [c['time'] for c in store.read_last('EURUSD', 'H1', 10)] == [T0 + i * H1 for i in range(3)]
+    assert store.store_batch('EURUSD', 'H1', [bar(2), bar(3)])['inserted'] == 1
+    with pytest.raises(ValueError):
+        candles_store.get_store(str(tmp_path), backend='parquet')
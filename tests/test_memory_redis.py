@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Tests de memory_redis_server por socket: servidor RESP en un puerto efímero, cliente redis-py
+y socket crudo (parser RESP2/RESP3, pipelining, BLPOP/BRPOP, pub/sub, TTL y barrendero)
+Uso: python -m pytest -q tests/test_memory_redis.py
+"""
+import asyncio
+import contextlib
+import os
+import socket
+import threading
+import time
+
+import pytest
+import redis
+
+from memory_redis_server import MemoryRedis, RespConnection, RespParser
+
+
+@pytest.fixture
+def server():
+    """(db, puerto) de un servidor RESP con su propio espacio de claves, en un hilo aparte"""
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        db = MemoryRedis(stripes=4)
+    loop = asyncio.new_event_loop()
+    srv = loop.run_until_complete(loop.create_server(lambda: RespConnection(db, loop), "127.0.0.1", 0))
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield db, srv.sockets[0].getsockname()[1]
+    loop.call_soon_threadsafe(srv.close)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+
+
+@pytest.fixture(params=[2, 3], ids=["resp2", "resp3"])
+def client(request, server):
+    r = redis.Redis(port=server[1], decode_responses=True, protocol=request.param)
+    yield r
+    r.close()
+
+
+def test_pipeline_runs_as_transaction(client):
+    pipe = client.pipeline()
+    pipe.set("a", "1").get("a").rpush("q", "x", "y").lpop("q").blpop(["empty"], 1).delete("a")
+    assert pipe.execute() == [True, "1", 2, "x", None, 1]
+    assert client.lpop("q") == "y"
+
+
+def test_transaction_is_atomic(server, client):
+    db = server[0]
+    stop = threading.Event()
+
+    def writer():
+        while not stop.is_set():
+            db.set("a", "w")
+            db.set("b", "w")
+
+    t = threading.Thread(target=writer, daemon=True)
+    t.start()
+    try:
+        for _ in range(200):
+            pipe = client.pipeline()
+            pipe.set("a", "t").set("b", "t").get("a").get("b")
+            assert pipe.execute()[2:] == ["t", "t"]
+    finally:
+        stop.set()
+        t.join(5)
+
+
+def test_queued_error_aborts_and_runtime_error_does_not(client):
+    pipe = client.pipeline()
+    pipe.set("x", "1").execute_command("NOPE")
+    with pytest.raises(redis.ResponseError):
+        pipe.execute()
+    assert client.get("x") is None
+
+    client.set("s", "str")
+    pipe = client.pipeline()
+    pipe.execute_command("SETEX", "s", 0, "v").set("y", "1")
+    with pytest.raises(redis.ResponseError):
+        pipe.execute()  # el error va en su posición; SET y sí se aplica
+    assert client.get("y") == "1"
+
+
+def test_discard_and_exec_without_multi(client):
+    conn = client.connection_pool.get_connection()
+    try:
+        conn.send_command("MULTI")
+        assert conn.read_response() in (b"OK", "OK", True)
+        conn.send_command("SET", "d", "1")
+        assert conn.read_response() in (b"QUEUED", "QUEUED")
+        conn.send_command("DISCARD")
+        assert conn.read_response() in (b"OK", "OK", True)
+        conn.send_command("EXEC")
+        with pytest.raises(redis.ResponseError, match="EXEC without MULTI"):
+            conn.read_response()
+    finally:
+        client.connection_pool.release(conn)
+    assert client.get("d") is None
+
+
+def test_watch_aborts_when_key_changes(client, server):
+    with client.pipeline() as pipe:
+        pipe.watch("w")
+        pipe.multi()
+        pipe.set("w", "mine")
+        server[0].set("w", "theirs")
+        with pytest.raises(redis.WatchError):
+            pipe.execute()
+    assert client.get("w") == "theirs"
+
+    def incr(pipe):
+        value = int(pipe.get("n") or 0)
+        pipe.multi()
+        pipe.set("n", value + 1)
+
+    for _ in range(3):
+        client.transaction(incr, "n")
+    assert client.get("n") == "3"
+
+
+def test_scan_cursor_is_bounded_for_long_keys(client):
+    prefix = "k" * 4000
+    for i in range(50):
+        client.set(f"{prefix}:{i:02d}", "v")
+    seen, cursor, calls = set(), 0, 0
+    while True:
+        cursor, keys = client.scan(cursor, match=f"{prefix}:*", count=7)
+        assert 0 <= cursor < 1 << 63
+        seen.update(keys)
+        calls += 1
+        client.set(f"{prefix}:new{calls}", "v")  # el índice cambia en cada llamada
+        client.delete(f"{prefix}:{calls + 40:02d}")
+        if not cursor:
+            break
+    assert {f"{prefix}:{i:02d}" for i in range(41)} <= seen
+    with pytest.raises(redis.ResponseError, match="invalid cursor"):
+        client.scan("9" * 5000)
+
+
+@pytest.fixture
+def raw(server):
+    """Socket crudo contra el servidor: raw(b"...") envía y devuelve la conexión"""
+    socks = []
+
+    def connect():
+        sock = socket.create_connection(("127.0.0.1", server[1]), timeout=5)
+        socks.append(sock)
+        return sock
+
+    yield connect
+    for sock in socks:
+        sock.close()
+
+
+def expect(sock, data):
+    """Lee exactamente len(data) bytes y comprueba que son data"""
+    got = b""
+    while len(got) < len(data):
+        chunk = sock.recv(len(data) - len(got))
+        assert chunk, f"conexión cerrada tras {got!r}"
+        got += chunk
+    assert got == data
+
+
+def test_parser_waits_for_complete_frames():
+    parser = RespParser()
+    frames = b"*2\r\n$3\r\nGET\r\n$5\r\nk\r\nx!\r\nPING  hola\r\n\r\n*1\r\n$4\r\nPING\r\n"
+    ends = [frames.index(b"PING") - 1, frames.index(b"\r\n\r\n") + 1, len(frames) - 1]
+    out = []
+    for i in range(len(frames)):
+        parser.feed(frames[i:i + 1])
+        out.extend(parser.commands())
+        assert len(out) == sum(i >= end for end in ends)  # cada comando aparece con su último byte
+    assert out == [["GET", "k\r\nx!"], ["PING", "hola"], ["PING"]]
+
+
+def read_until(sock, tail):
+    """Lee hasta que lo recibido termina en tail; devuelve todo lo leído"""
+    got = b""
+    while not got.endswith(tail):
+        chunk = sock.recv(4096)
+        assert chunk, f"conexión cerrada tras {got!r}"
+        got += chunk
+    return got
+
+
+def test_pipelined_commands_answer_in_order(raw):
+    sock = raw()
+    sock.sendall(b"SET a 1\r\n*2\r\n$3\r\nGET\r\n$1\r\na\r\nPING\r\nNOPE\r\nGET missing\r\n")
+    expect(sock, b"+OK\r\n$1\r\n1\r\n+PONG\r\n-ERR unknown command 'NOPE'\r\n$-1\r\n")
+    sock.sendall(b"*1\r\n$x\r\n")  # longitud inválida: -ERR y el servidor cierra la conexión
+    got = b""
+    while chunk := sock.recv(4096):
+        got += chunk
+    assert got.startswith(b"-ERR ")
+
+
+def test_resp3_after_hello(raw):
+    sock = raw()
+    sock.sendall(b"HELLO 3\r\nPING\r\n")
+    assert read_until(sock, b"+PONG\r\n").startswith(b"%7\r\n$6\r\nserver\r\n$5\r\nredis\r\n")
+    sock.sendall(b"GET missing\r\nHGETALL\r\nHELLO 4\r\n")
+    expect(sock, b"_\r\n-ERR unknown command 'HGETALL'\r\n-NOPROTO unsupported protocol version\r\n")
+    sock.sendall(b"HELLO 2\r\nPING\r\n")
+    assert read_until(sock, b"+PONG\r\n").startswith(b"*14\r\n")
+    sock.sendall(b"GET missing\r\n")
+    expect(sock, b"$-1\r\n")
+
+
+@pytest.mark.parametrize("proto, null", [(2, b"*-1\r\n"), (3, b"_\r\n")], ids=["resp2", "resp3"])
+def test_bpop_timeout_replies_null_and_keeps_order(raw, proto, null):
+    sock = raw()
+    sock.sendall(b"HELLO %d\r\nPING\r\n" % proto)
+    read_until(sock, b"+PONG\r\n")
+    start = time.monotonic()
+    sock.sendall(b"BLPOP q1 q2 0.2\r\nPING\r\n")  # el PING espera a que venza el BLPOP
+    expect(sock, null + b"+PONG\r\n")
+    assert time.monotonic() - start >= 0.15
+    sock.sendall(b"BRPOP q 0.05\r\nBLPOP q x\r\nBRPOP q\r\n")
+    expect(sock, null + b"-ERR timeout is not a float or out of range\r\n"
+                 b"-ERR wrong number of arguments for 'brpop' command\r\n")
+
+
+def test_bpop_wakes_on_push_from_other_client(raw, client):
+    left, right = raw(), raw()
+    left.sendall(b"BLPOP q 5\r\nPING\r\n")
+    right.sendall(b"BRPOP r q 5\r\n")
+    time.sleep(0.1)
+    client.rpush("q", "a")  # el primero en bloquearse se lleva el valor
+    expect(left, b"*2\r\n$1\r\nq\r\n$1\r\na\r\n+PONG\r\n")
+    client.rpush("r", "b", "c")
+    expect(right, b"*2\r\n$1\r\nr\r\n$1\r\nc\r\n")
+    assert client.lpop("r") == "b"
+    right.sendall(b"BLPOP q 5\r\n")
+    time.sleep(0.1)
+    right.close()
+    time.sleep(0.1)
+    client.rpush("q", "z")  # el cliente cerrado ya no espera: el valor queda en la lista
+    assert client.lpop("q") == "z"
+
+
+def test_pubsub(client):
+    pubsub = client.pubsub()
+    pubsub.subscribe("ch")
+    assert pubsub.get_message(timeout=2)["type"] == "subscribe"
+    assert client.publish("ch", "hola") == 1
+    assert client.publish("otro", "nada") == 0
+    msg = pubsub.get_message(timeout=2)
+    assert (msg["type"], msg["channel"], msg["data"]) == ("message", "ch", "hola")
+    pubsub.unsubscribe("ch")
+    assert pubsub.get_message(timeout=2)["type"] == "unsubscribe"
+    assert client.publish("ch", "tarde") == 0
+    pubsub.close()
+
+
+def test_subscribed_resp2_connection_only_accepts_pubsub(raw, client):
+    sock = raw()
+    sock.sendall(b"SUBSCRIBE a b\r\nGET k\r\nPING\r\n")
+    got = read_until(sock, b"*2\r\n$4\r\npong\r\n$0\r\n\r\n")
+    assert b"-ERR Can't execute 'get'" in got
+    client.publish("b", "m")
+    expect(sock, b"*3\r\n$7\r\nmessage\r\n$1\r\nb\r\n$1\r\nm\r\n")
+    sock.sendall(b"UNSUBSCRIBE\r\nGET k\r\n")
+    expect(sock, b"*3\r\n$11\r\nunsubscribe\r\n$1\r\na\r\n:1\r\n"
+                 b"*3\r\n$11\r\nunsubscribe\r\n$1\r\nb\r\n:0\r\n$-1\r\n")
+
+
+def test_ttl_expiry_and_sweeper(server, client):
+    db = server[0]
+    client.set("short", "v", px=150)
+    client.set("renewed", "v", ex=1)
+    client.set("kept", "v", ex=1)
+    assert 0 < client.pttl("short") <= 150
+    assert client.expire("renewed", 60) and client.persist("kept")
+    assert client.ttl("kept") == -1 and client.ttl("missing") == -2
+    time.sleep(0.4)
+    # El barrendero borra "short" sin que nadie la lea (sin pasar por la comprobación perezosa)
+    sh = db._shard("short")
+    with sh.lock:
+        assert "short" not in sh.data and "short" not in sh.expires
+    assert client.get("short") is None and client.exists("short") == 0
+    time.sleep(0.8)
+    assert client.get("renewed") == "v" and client.get("kept") == "v"
+    assert 55 <= client.ttl("renewed") <= 60
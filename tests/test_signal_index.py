@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Tests de SignalIndex: agrupación por símbolo y paginación
+Uso: python -m pytest -q tests/test_signal_index.py
+"""
+from signal_index import SignalIndex
+
+
+def make_index(n, symbols=('EURUSD',), **kw):
+    index = SignalIndex(key=lambda s: s.upper().replace('/', ''), **kw)
+    for i in range(1, n + 1):
+        index.add({'id': i, 'seq': i, 'created_unix': 1000.0 + i, 'symbol': symbols[i % len(symbols)]})
+    return index
+
+
+def test_grouped_keeps_raw_symbol_keys():
+    index = make_index(6, symbols=('EURUSD', 'eur/usd', 'GBPUSD'))
+    groups = index.grouped()
+    assert sorted(groups) == ['EURUSD', 'GBPUSD', 'eur/usd']
+    assert [s['id'] for s in groups['eur/usd']] == [4, 1]
+    assert sorted(index.grouped(['EURUSD'])) == ['EURUSD', 'eur/usd']
+
+
+def test_symbol_paging_continues_past_per_symbol_queue():
+    index = make_index(100, symbols=('EURUSD', 'GBPUSD'), maxlen=1000, per_symbol=10)
+    ids, cursor = [], None
+    while True:
+        page, cursor = index.page(limit=7, before_id=cursor, symbol='eurusd')
+        ids += [s['id'] for s in page]
+        if cursor is None:
+            break
+    assert ids == list(range(100, 0, -2))
+    page, cursor = index.page(limit=5, symbol='EURUSD', after_id=90)
+    assert ([s['id'] for s in page], cursor) == ([100, 98, 96, 94, 92], None)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Tests de SignalJournal: rotación de segmentos, recuperación tras corte, índice perdido,
+migración del formato antiguo y lecturas que cruzan segmentos
+Uso: python -m pytest -q tests/test_signal_journal.py
+"""
+import json
+import os
+
+import pytest
+
+from signal_journal import SignalJournal, _IDX, _read_index
+
+
+def sig(i):
+    return {'id': i, 'created_unix': 1000.0 + i, 'symbol': 'EURUSD', 'direction': 'CALL'}
+
+
+def open_journal(path, **kw):
+    kw.setdefault('segment_records', 5)
+    kw.setdefault('index_every', 2)
+    return SignalJournal(str(path), flush_interval=0, fsync=False, **kw)
+
+
+def ids(rows):
+    return [r['id'] for r in rows]
+
+
+@pytest.fixture
+def journal(tmp_path):
+    j = open_journal(tmp_path)
+    for i in range(1, 24):
+        j.append(sig(i))
+    j.flush()
+    yield j
+    j.close()
+
+
+def test_segments_rotate_every_segment_records(journal, tmp_path):
+    names = sorted(f for f in os.listdir(tmp_path) if f.endswith('.jsonl'))
+    assert names == [f"signals-{n:06d}.jsonl" for n in range(1, 6)]
+    assert journal.stats()['segments'] == 5
+    assert journal.stats()['records_last_segment'] == 3
+    # Una entrada de índice cada index_every registros: 5 registros -> offsets de los registros 0, 2 y 4
+    assert [e[0] for e in _read_index(str(tmp_path / 'signals-000002.idx'))] == [6, 8, 10]
+
+
+def test_reads_cross_segment_boundaries(journal):
+    assert ids(journal.tail(7)) == list(range(17, 24))
+    assert ids(journal.tail(100)) == list(range(1, 24))
+    assert journal.get(13)['id'] == 13
+    assert journal.get(99) is None
+    assert ids(journal.range(after_id=4, limit=4)) == [5, 6, 7, 8]
+    assert ids(journal.range(since=1009.0, until=1016.0)) == list(range(9, 17))
+
+
+def test_reopen_continues_the_last_segment(journal, tmp_path):
+    journal.close()
+    j = open_journal(tmp_path)
+    assert j.stats()['records_last_segment'] == 3
+    for i in range(24, 28):
+        j.append(sig(i))
+    j.flush()
+    assert j.stats()['segments'] == 6
+    assert ids(j.tail(6)) == list(range(22, 28))
+    j.close()
+
+
+def test_recover_cuts_torn_line_and_stale_index(journal, tmp_path):
+    journal.close()
+    last = tmp_path / 'signals-000005.jsonl'
+    data = last.read_bytes()
+    last.write_bytes(data[:-10])  # corte a mitad de la última línea
+    with open(tmp_path / 'signals-000005.idx', 'ab') as f:
+        f.write(_IDX.pack(99, 2000.0, len(data) + 100))  # entrada por delante de los datos
+    j = open_journal(tmp_path)
+    assert ids(j.tail(3)) == [20, 21, 22]
+    assert j.stats()['records_last_segment'] == 2
+    assert all(e[2] < last.stat().st_size for e in _read_index(str(tmp_path / 'signals-000005.idx')))
+    j.append(sig(23))
+    j.flush()
+    assert ids(j.tail(3)) == [21, 22, 23]
+    assert json.loads(last.read_bytes().splitlines()[-1])['id'] == 23
+    j.close()
+
+
+def test_lost_index_is_rebuilt(journal, tmp_path):
+    journal.close()
+    os.remove(tmp_path / 'signals-000002.idx')
+    j = open_journal(tmp_path)
+    assert [e[0] for e in _read_index(str(tmp_path / 'signals-000002.idx'))] == [6, 8, 10]
+    assert j.get(9)['id'] == 9
+    assert ids(j.range(after_id=5, limit=3)) == [6, 7, 8]
+    j.close()
+
+
+def test_legacy_file_is_imported_once(tmp_path):
+    legacy = tmp_path / '_signals.jsonl'
+    lines = [json.dumps(sig(i)) for i in range(1, 8)]
+    legacy.write_text('\n'.join(lines[:3] + ['{roto'] + lines[3:]) + '\n', encoding='utf-8')
+    j = open_journal(tmp_path / 'signals', legacy_file=str(legacy))
+    assert ids(j.tail(10)) == list(range(1, 8))
+    assert j.stats()['segments'] == 2
+    assert not legacy.exists() and (tmp_path / '_signals.jsonl.migrated').exists()
+    j.close()
+    j = open_journal(tmp_path / 'signals', legacy_file=str(legacy))
+    assert ids(j.tail(10)) == list(range(1, 8))
+    j.close()